@@ -1,10 +1,9 @@
-import os
 from io import TextIOWrapper
 from csv import DictReader
 
-from django.contrib import admin
-from django.http import HttpRequest, HttpResponse
-from django.shortcuts import render, redirect
+from django.contrib import admin, messages
+from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404, render, redirect
 from django.urls import path
 
 from .models import (
@@ -19,10 +18,93 @@ from .models import (
     ProductSale,
     OrderProduct,
     Order,
+    CatalogImport,
 )
 from .forms import ImagesForm, CSVForm
-from myshop.management.commands.upload_categories_to_db import create_category
-from myshop.management.commands.upload_products_to_db import create_product
+from .images import register_uploaded_images
+from .imports import run_import
+from myshop.management.commands.upload_sales_to_db import (
+    SaleImportError,
+    create_sales,
+)
+
+
+class CatalogImportMixin:
+    """
+    Загрузка файла CSV с каталогом через административную панель.
+
+    Файл сохраняется в хранилище (CatalogImport), после чего страница
+    прогресса отправляет запросы, каждый из которых загружает одну порцию
+    строк (run_import) и возвращает прогресс. Запрос к серверу не зависит
+    от размера файла, закрытая страница продолжает загрузку с места остановки.
+    """
+
+    import_kind = None
+    import_url_name = None
+
+    def import_csv(self, request: HttpRequest) -> HttpResponse:
+        if request.method == "GET":
+            form = CSVForm()
+            context = {
+                "form": form
+            }
+            return render(request, "admin/csv_form.html", context=context)
+        form = CSVForm(request.POST, request.FILES)
+        if form.is_valid():
+            job = CatalogImport.objects.create(
+                kind=self.import_kind,
+                file=form.cleaned_data['csv_file'],
+            )
+            return redirect(f"{job.id}/")
+        return render(request, "admin/csv_form.html", context={"form": form})
+
+    def import_progress(self, request: HttpRequest, job_id: int) -> HttpResponse:
+        job = get_object_or_404(CatalogImport, id=job_id, kind=self.import_kind)
+        context = {
+            "job": job,
+            "title": f"Загрузка файла {job.file.name}",
+        }
+        return render(request, "admin/import_progress.html", context=context)
+
+    def import_status(self, request: HttpRequest, job_id: int) -> JsonResponse:
+        """GET - прогресс загрузки, POST - загрузка следующей порции строк."""
+        job = get_object_or_404(CatalogImport, id=job_id, kind=self.import_kind)
+        if request.method == "POST" and not job.is_done:
+            try:
+                run_import(job, max_chunks=1)
+            except Exception:
+                # ошибка записана в журнал и сохранена в загрузке
+                # (статус failed, job.error); данные отмененной порции
+                # перечитываются из БД:
+                job.refresh_from_db()
+        return JsonResponse({
+            "status": job.status,
+            "rows_done": job.rows_done,
+            "total_rows": job.total_rows,
+            "error": job.error,
+            "unmatched": job.unmatched,
+        })
+
+    def get_urls(self):
+        urls = super().get_urls()
+        new_urls = [
+            path(
+                "import-csv/",
+                self.import_csv,
+                name=self.import_url_name,
+            ),
+            path(
+                "import-csv/<int:job_id>/",
+                self.import_progress,
+                name=f"{self.import_url_name}_progress",
+            ),
+            path(
+                "import-csv/<int:job_id>/status/",
+                self.import_status,
+                name=f"{self.import_url_name}_status",
+            ),
+        ]
+        return new_urls + urls
 
 
 # ОБЩИЕ МОДЕЛИ:
@@ -44,14 +126,25 @@ class ImageAdmin(admin.ModelAdmin):
         form = ImagesForm(request.POST, request.FILES)
         if form.is_valid():
             files = form.cleaned_data["file_field"]
-            directory_images = os.getenv("IMAGES_DIRECTORY", 'images')
-            for file in files:
-                Image.objects.create(
-                    src=f'{directory_images}/{file.name}',
-                    alt=os.path.splitext(file.name)[0],
+            if not isinstance(files, list):
+                files = [files]
+            result = register_uploaded_images(files)
+            self.message_user(
+                request,
+                f"Изображения успешно загружены в БД: "
+                f"добавлено {result['created']}, "
+                f"пропущено {result['skipped']}. "
+                f"Уменьшенные копии создаются командой generate_thumbnails.",
+            )
+            if result['conflicts']:
+                self.message_user(
+                    request,
+                    f"Не загружены (имя занято другим изображением): "
+                    f"{', '.join(result['conflicts'])}",
+                    level=messages.WARNING,
                 )
-            self.message_user(request, "Изображения успешно загружены в БД.")
             return redirect("..")
+        return render(request, "admin/images_form.html", context={"form": form})
 
     def get_urls(self):
         urls = super().get_urls()
@@ -95,7 +188,7 @@ class SubcategoryInline(admin.TabularInline):
 
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(CatalogImportMixin, admin.ModelAdmin):
     """Модель, представляющая категорию товара."""
 
     list_display = 'id', 'title', 'image'
@@ -104,32 +197,8 @@ class CategoryAdmin(admin.ModelAdmin):
         SubcategoryInline,
     ]
     change_list_template = "myshop/csv_categories_changelist.html"
-
-    def import_csv(self, request: HttpRequest) -> HttpResponse:
-        if request.method == "GET":
-            form = CSVForm()
-            context = {
-                "form": form
-            }
-            return render(request, "admin/csv_form.html", context=context)
-        form = CSVForm(request.POST, request.FILES)
-        if form.is_valid():
-            csv_file = TextIOWrapper(
-                form.files['csv_file'].file,
-                encoding=request.encoding,
-            )
-            reader = DictReader(csv_file)
-            create_category(reader)
-
-            self.message_user(request, "Данные файла успешно загружены в БД.")
-            return redirect("..")
-
-    def get_urls(self):
-        urls = super().get_urls()
-        new_urls = [
-            path("import-category-csv/", self.import_csv, name="import_category_csv")
-        ]
-        return new_urls + urls
+    import_kind = CatalogImport.KIND_CATEGORIES
+    import_url_name = "import_category_csv"
 
 
 # МОДЕЛИ ДЛЯ ОПИСАНИЯ ТОВАРА И ЕГО ПАРАМЕТРОВ:
@@ -163,15 +232,28 @@ class ReviewInline(admin.TabularInline):
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(CatalogImportMixin, admin.ModelAdmin):
     """Модель, представляющая товар."""
 
     list_display = 'id', 'title', 'category'
     list_display_links = 'id', 'title'
+    # обновляются сигналами при изменении отзывов:
+    readonly_fields = 'reviews_count', 'rating_sum'
     inlines = [
         ReviewInline,
     ]
     change_list_template = "myshop/csv_products_changelist.html"
+    import_kind = CatalogImport.KIND_PRODUCTS
+    import_url_name = "import_product_csv"
+
+
+@admin.register(ProductSale)
+class ProductSaleAdmin(admin.ModelAdmin):
+    """Модель, представляющая товар, участвующий в распродаже."""
+
+    list_display = 'id', 'salePrice', 'dateFrom', 'dateTo'
+    list_select_related = 'id',
+    change_list_template = "myshop/csv_sales_changelist.html"
 
     def import_csv(self, request: HttpRequest) -> HttpResponse:
         if request.method == "GET":
@@ -188,7 +270,16 @@ class ProductAdmin(admin.ModelAdmin):
             )
             reader = DictReader(csv_file)
 
-            create_product(reader)
+            try:
+                create_sales(reader)
+            except SaleImportError as error:
+                for row_error in error.errors:
+                    self.message_user(
+                        request,
+                        f"Ошибка в файле: {row_error}",
+                        level=messages.ERROR,
+                    )
+                return redirect(".")
 
             self.message_user(request, "Данные файла успешно загружены в БД.")
             return redirect("..")
@@ -196,34 +287,11 @@ class ProductAdmin(admin.ModelAdmin):
     def get_urls(self):
         urls = super().get_urls()
         new_urls = [
-            path("import-product-csv/", self.import_csv, name="import_product_csv")
+            path("import-sale-csv/", self.import_csv, name="import_sale_csv")
         ]
         return new_urls + urls
 
 
-@admin.register(ProductSale)
-class ProductSaleAdmin(admin.ModelAdmin):
-    """Модель, представляющая товар, участвующий в распродаже."""
-
-    list_display = 'id', 'title'
-
-    def save_related(self, request, form, formsets, change):
-        # Дополнение метода.
-        # После сохранения экземпляра модели через административную панель
-        # изменяется поле images(m2m) нужными значениями.
-        super(ProductSaleAdmin, self).save_related(
-            request, form, formsets, change
-        )
-
-        images = (
-            Product.objects
-            .prefetch_related('images')
-            .get(id=form.instance.id.id)
-            .images.all()
-        )
-        form.instance.images.set(images)
-
-
 # МОДЕЛИ ДЛЯ ОПИСАНИЯ ЗАКАЗОВ:
 
 @admin.register(OrderProduct)
@@ -239,3 +307,22 @@ class OrderAdmin(admin.ModelAdmin):
 
     list_display = 'id', 'fullName', 'address'
     list_display_links = 'id', 'fullName'
+
+
+# МОДЕЛИ ДЛЯ ЗАГРУЗКИ ДАННЫХ:
+
+@admin.register(CatalogImport)
+class CatalogImportAdmin(admin.ModelAdmin):
+    """Модель, представляющая загрузку файла CSV с каталогом."""
+
+    list_display = 'id', 'kind', 'status', 'rows_done', 'total_rows', 'created_at'
+    list_display_links = 'id', 'kind'
+    list_filter = 'kind', 'status'
+    readonly_fields = (
+        'rows_done',
+        'total_rows',
+        'error',
+        'unmatched',
+        'created_at',
+        'updated_at',
+    )
@@ -0,0 +1,220 @@
+import json
+import uuid
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpRequest, HttpResponse
+from django.utils.module_loading import import_string
+
+
+class Basket:
+    """
+    Корзина пользователя.
+
+    Хранит товары в словаре {id товара: количество}:
+    добавление и удаление товара выполняются за O(1).
+    """
+
+    def __init__(self, items: Optional[Dict[int, int]] = None):
+        self.items = dict(items or {})
+
+    @classmethod
+    def from_data(cls, data) -> "Basket":
+        """
+        Создает корзину из сохраненных данных.
+
+        Поддерживается и прежний формат - список
+        словарей вида {'id': ..., 'count': ...}.
+        """
+        if isinstance(data, list):
+            data = {position['id']: position['count'] for position in data}
+        return cls({
+            int(product_id): int(count)
+            for product_id, count in (data or {}).items()
+        })
+
+    def to_data(self) -> Dict[str, int]:
+        # ключи - строки, чтобы данные одинаково сохранялись в JSON:
+        return {
+            str(product_id): count
+            for product_id, count in self.items.items()
+        }
+
+    def add(self, product_id: int, count: int) -> None:
+        self.items[product_id] = self.items.get(product_id, 0) + count
+
+    def remove(self, product_id: int, count: int) -> None:
+        count = self.items.get(product_id, 0) - count
+        if count > 0:
+            self.items[product_id] = count
+        else:
+            self.items.pop(product_id, None)
+
+    def get(self, product_id: int) -> int:
+        return self.items.get(product_id, 0)
+
+    def product_ids(self) -> List[int]:
+        return list(self.items)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.items)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+class BasketStorage(ABC):
+    """Базовый класс хранилища корзины."""
+
+    key = 'basket'
+
+    @abstractmethod
+    def load(self, request: HttpRequest) -> Basket:
+        """Загружает корзину пользователя."""
+
+    @abstractmethod
+    def save(
+            self,
+            request: HttpRequest,
+            response: HttpResponse,
+            basket: Basket,
+    ) -> None:
+        """Сохраняет корзину пользователя (в ответе или на сервере)."""
+
+    def load_session_data(self, request: HttpRequest):
+        """
+        Данные корзины, сохраненной в сессии (SessionBasketStorage).
+
+        Хранилища без сессии читают ее, пока корзина не сохранена
+        в новом хранилище, после этого удаляют (forget_session_data).
+        """
+        return request.session.get(self.key)
+
+    def forget_session_data(self, request: HttpRequest) -> None:
+        # сессия сохраняется только при первом переносе корзины:
+        if self.key in request.session:
+            del request.session[self.key]
+
+
+class SessionBasketStorage(BasketStorage):
+    """
+    Хранение корзины в сессии.
+
+    Каждое изменение корзины сохраняет сессию
+    (при сессиях в БД - запись в таблицу django_session).
+    """
+
+    def load(self, request: HttpRequest) -> Basket:
+        return Basket.from_data(request.session.get(self.key))
+
+    def save(
+            self,
+            request: HttpRequest,
+            response: HttpResponse,
+            basket: Basket,
+    ) -> None:
+        request.session[self.key] = basket.to_data()
+
+
+class CacheBasketStorage(BasketStorage):
+    """
+    Хранение корзины в кэше.
+
+    Корзина привязана к собственной cookie со случайным идентификатором
+    (а не к ключу сессии, который меняется при входе пользователя),
+    изменения корзины не затрагивают таблицу django_session.
+
+    Кэш BASKET_CACHE_ALIAS не должен вытеснять записи (файловый кэш
+    и кэш в памяти при переполнении удаляют случайные записи).
+    Корзина, сохраненная в сессии (SessionBasketStorage), читается
+    из сессии и переносится в кэш при первом изменении.
+    """
+
+    cookie_name = 'basket_id'
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'BASKET_CACHE_ALIAS', 'default')]
+        self.timeout = settings.SESSION_COOKIE_AGE
+
+    def get_cache_key(self, basket_id: str) -> str:
+        return f'{self.key}:{basket_id}'
+
+    def load(self, request: HttpRequest) -> Basket:
+        basket_id = request.COOKIES.get(self.cookie_name)
+        data = None
+        if basket_id:
+            data = self.cache.get(self.get_cache_key(basket_id))
+        if data is None:
+            data = self.load_session_data(request)
+        return Basket.from_data(data)
+
+    def save(
+            self,
+            request: HttpRequest,
+            response: HttpResponse,
+            basket: Basket,
+    ) -> None:
+        basket_id = request.COOKIES.get(self.cookie_name) or uuid.uuid4().hex
+        self.cache.set(
+            self.get_cache_key(basket_id),
+            basket.to_data(),
+            timeout=self.timeout,
+        )
+        self.forget_session_data(request)
+        response.set_cookie(
+            self.cookie_name,
+            basket_id,
+            max_age=self.timeout,
+            httponly=True,
+            samesite='Lax',
+        )
+
+
+class SignedCookieBasketStorage(BasketStorage):
+    """
+    Хранение корзины в подписанной cookie (хранилище по умолчанию).
+
+    На сервере корзина не хранится совсем, изменения корзины
+    не затрагивают таблицу django_session и не вытесняются из кэша;
+    размер корзины ограничен размером cookie (около 4 Кб).
+    Корзина, сохраненная в сессии (SessionBasketStorage), читается
+    из сессии и переносится в cookie при первом изменении.
+    """
+
+    salt = 'myshop.basket'
+
+    def load(self, request: HttpRequest) -> Basket:
+        data = request.get_signed_cookie(self.key, default=None, salt=self.salt)
+        try:
+            data = json.loads(data) if data else self.load_session_data(request)
+            return Basket.from_data(data)
+        except (TypeError, ValueError, AttributeError):
+            return Basket()
+
+    def save(
+            self,
+            request: HttpRequest,
+            response: HttpResponse,
+            basket: Basket,
+    ) -> None:
+        response.set_signed_cookie(
+            self.key,
+            json.dumps(basket.to_data(), separators=(',', ':')),
+            salt=self.salt,
+            max_age=settings.SESSION_COOKIE_AGE,
+            httponly=True,
+            samesite='Lax',
+        )
+        self.forget_session_data(request)
+
+
+def get_basket_storage() -> BasketStorage:
+    """Возвращает хранилище корзины, указанное в настройке BASKET_STORAGE."""
+    storage_class = getattr(
+        settings,
+        'BASKET_STORAGE',
+        'myshop.basket.SignedCookieBasketStorage',
+    )
+    return import_string(storage_class)()
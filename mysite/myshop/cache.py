@@ -0,0 +1,146 @@
+import hashlib
+import json
+import time
+from typing import Callable, Iterable, Optional
+
+from django.core.cache import cache
+from django.db import transaction
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework import status
+
+CACHE_PREFIX = 'myshop'
+
+# названия кэшируемых данных:
+CATEGORIES_MENU = 'categories'
+TAG_FACETS = 'tags'
+PRODUCT_DETAIL = 'product'
+BANNER_POOL = 'banners'
+PRODUCT_RAILS = 'rails'
+
+
+def get_version_key(name: str) -> str:
+    return f'{CACHE_PREFIX}:version:{name}'
+
+
+def get_initial_version() -> int:
+    """
+    Начальная версия кэшируемых данных - текущее время в микросекундах.
+
+    Если счетчик версии удален из кэша (вытеснен или кэш очищен),
+    новая версия больше всех прежних: записи, сохраненные
+    под старыми версиями, не будут прочитаны как актуальные.
+    """
+    return time.time_ns() // 1000
+
+
+def get_cache_version(name: str) -> int:
+    """Возвращает текущую версию кэшируемых данных."""
+    return cache.get_or_set(
+        get_version_key(name),
+        get_initial_version,
+        timeout=None,
+    )
+
+
+def bump_cache_version(name: str) -> None:
+    """
+    Увеличивает версию кэшируемых данных.
+
+    Записи со старой версией больше не читаются
+    и удаляются из кэша по истечении времени хранения.
+    """
+    try:
+        cache.incr(get_version_key(name))
+    except ValueError:
+        cache.set(get_version_key(name), get_initial_version(), timeout=None)
+
+
+def bump_cache_version_on_commit(*names: str, using: Optional[str] = None) -> None:
+    """Увеличивает версии кэшируемых данных после фиксации транзакции."""
+
+    def bump() -> None:
+        for name in names:
+            bump_cache_version(name)
+
+    transaction.on_commit(bump, using=using)
+
+
+def get_product_cache_name(product_id: int) -> str:
+    """Название кэша информации о товаре (у каждого товара своя версия)."""
+    return f'{PRODUCT_DETAIL}:{product_id}'
+
+
+def bump_products_cache_version(
+        product_ids: Iterable[int],
+        using: Optional[str] = None,
+) -> None:
+    """
+    Сбрасывает кэш информации о товарах после фиксации транзакции.
+
+    Если сбросить кэш до фиксации, параллельный запрос может
+    закэшировать еще не измененные данные под новой версией.
+    """
+    product_ids = set(product_ids)
+
+    def bump() -> None:
+        for product_id in product_ids:
+            bump_cache_version(get_product_cache_name(product_id))
+
+    if product_ids:
+        transaction.on_commit(bump, using=using)
+
+
+def get_cached_payload(
+        name: str,
+        key: str,
+        build: Callable[[], object],
+        timeout: int = 60 * 60,
+) -> dict:
+    """
+    Возвращает закэшированные данные ответа.
+
+    Если в кэше нет данных текущей версии, они формируются функцией build.
+    Вместе с данными хранятся ETag и время формирования (Last-Modified).
+    """
+    cache_key = f'{CACHE_PREFIX}:{name}:{get_cache_version(name)}:{key}'
+    payload = cache.get(cache_key)
+    if payload is None:
+        data = build()
+        content = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+        payload = {
+            'data': data,
+            'etag': hashlib.md5(content.encode()).hexdigest(),
+            'last_modified': int(timezone.now().timestamp()),
+        }
+        cache.set(cache_key, payload, timeout=timeout)
+    return payload
+
+
+def get_conditional_cached_response(request: Request, payload: dict) -> Response:
+    """
+    Формирует ответ с заголовками ETag и Last-Modified.
+
+    Если данные у клиента не изменились (If-None-Match/If-Modified-Since),
+    возвращается ответ 304 без тела.
+    """
+    etag = quote_etag(payload['etag'])
+    conditional_response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=payload['last_modified'],
+    )
+    if conditional_response is not None:
+        response = Response(status=conditional_response.status_code)
+    else:
+        response = Response(payload['data'], status=status.HTTP_200_OK)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(payload['last_modified'])
+    # браузер может хранить ответ, но должен проверять его актуальность:
+    patch_cache_control(response, no_cache=True)
+    return response
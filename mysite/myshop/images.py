@@ -0,0 +1,190 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.files import File
+
+from .models import Image, image_directory_path
+
+# количество изображений, добавляемых в БД одним запросом:
+CHUNK_SIZE = 1000
+
+
+def normalize_image_name(name: str) -> str:
+    """
+    Приводит название товара, категории или файла изображения к ключу
+    для поиска изображения: '-' и '_' заменяются пробелами,
+    буквы переводятся в нижний регистр.
+
+    'Диван_Avanti' и 'Диван Avanti' -> 'диван avanti',
+    'Шкафы-купе' -> 'шкафы купе'.
+    """
+    return ' '.join(name.replace('-', ' ').replace('_', ' ').split()).lower()
+
+
+def build_image_index(
+        images: Iterable[Image],
+        prefix: str = '',
+) -> Dict[str, Image]:
+    """
+    Строит словарь {ключ названия: Image} для поиска изображения за O(1).
+
+    Если задан prefix, в словарь попадают только изображения, имя файла
+    которых начинается с него ('Категория_кровати' -> 'кровати' при
+    prefix='Категория'). При совпадении ключей используется первое
+    изображение.
+    """
+    prefix = normalize_image_name(prefix)
+    index = dict()
+    for image in images:
+        key = normalize_image_name(image.get_filename())
+        if prefix:
+            if not key.startswith(f'{prefix} '):
+                continue
+            key = key[len(prefix) + 1:]
+        index.setdefault(key, image)
+    return index
+
+
+def get_image_key(path: str) -> str:
+    """
+    Ключ изображения для поиска по названию (build_image_index):
+    нормализованное имя файла без каталога и расширения.
+    """
+    return normalize_image_name(os.path.splitext(os.path.basename(path))[0])
+
+
+def get_file_checksum(file: File) -> str:
+    """
+    SHA-256 содержимого файла.
+
+    Файл читается порциями (File.chunks), после чтения
+    указатель возвращается в начало файла.
+    """
+    checksum = hashlib.sha256()
+    for chunk in file.chunks():
+        checksum.update(chunk)
+    file.seek(0)
+    return checksum.hexdigest()
+
+
+def get_alt(filename: str) -> str:
+    """Описание изображения по умолчанию - имя файла без расширения."""
+    max_length = Image._meta.get_field('alt').max_length
+    return os.path.splitext(filename)[0][:max_length]
+
+
+class ImageRegistry:
+    """
+    Добавление изображений в БД пакетами.
+
+    Пути и контрольные суммы зарегистрированных изображений загружаются
+    из БД одним запросом: уже загруженные файлы (с тем же путем или
+    тем же содержимым) пропускаются, в том числе повторы внутри пакета.
+    Файлы с другим содержимым, имя которых совпадает с именем
+    зарегистрированного изображения (get_image_key), не добавляются
+    и собираются в conflicts: товар или категория с этим названием
+    нашли бы только одно из изображений.
+    Новые записи добавляются запросами INSERT по CHUNK_SIZE строк.
+    """
+
+    def __init__(self):
+        self.paths = set()
+        self.keys = set()
+        self.checksums = set()
+        for src, checksum in Image.objects.values_list('src', 'checksum'):
+            if src:
+                self.paths.add(src)
+                self.keys.add(get_image_key(src))
+            if checksum:
+                self.checksums.add(checksum)
+        self.images = list()
+        self.skipped = 0
+        self.conflicts = list()
+
+    def is_registered(
+            self,
+            src: Optional[str] = None,
+            checksum: Optional[str] = None,
+    ) -> bool:
+        return src in self.paths or checksum in self.checksums
+
+    def is_name_taken(self, filename: str) -> bool:
+        return get_image_key(filename) in self.keys
+
+    def add(self, src: str, checksum: str, alt: str) -> None:
+        self.paths.add(src)
+        self.keys.add(get_image_key(src))
+        self.checksums.add(checksum)
+        self.images.append(Image(src=src, alt=alt, checksum=checksum))
+
+    def save(self) -> dict:
+        Image.objects.bulk_create(self.images, batch_size=CHUNK_SIZE)
+        return {
+            'created': len(self.images),
+            'skipped': self.skipped,
+            'conflicts': self.conflicts,
+        }
+
+
+def register_directory_images(directory: Optional[str] = None) -> dict:
+    """
+    Регистрирует в БД изображения, уже лежащие в MEDIA_ROOT/directory.
+
+    Каталог просматривается через os.scandir, содержимое читается
+    только у файлов с новым путем (для проверки контрольной суммы).
+    Уменьшенные копии создаются командой generate_thumbnails.
+    Возвращает количество добавленных и пропущенных файлов
+    и имена файлов, совпадающие с именами других изображений.
+    """
+    directory = directory or os.path.dirname(image_directory_path(None, ''))
+    registry = ImageRegistry()
+    with os.scandir(Path(settings.MEDIA_ROOT) / directory) as entries:
+        for entry in sorted(entries, key=lambda entry: entry.name):
+            if not entry.is_file():
+                continue
+            src = f'{directory}/{entry.name}'
+            if registry.is_registered(src=src):
+                registry.skipped += 1
+                continue
+            with open(entry.path, 'rb') as file:
+                checksum = get_file_checksum(File(file))
+            if registry.is_registered(checksum=checksum):
+                registry.skipped += 1
+                continue
+            if registry.is_name_taken(entry.name):
+                registry.conflicts.append(entry.name)
+                continue
+            registry.add(src, checksum, get_alt(entry.name))
+    return registry.save()
+
+
+def register_uploaded_images(files: Iterable[File]) -> dict:
+    """
+    Сохраняет загруженные файлы в хранилище и регистрирует их в БД.
+
+    Файлы, содержимое которых уже загружено, пропускаются.
+    Файлы с новым содержимым и уже занятым именем (в БД или хранилище)
+    не сохраняются, а возвращаются в conflicts: хранилище сохранило бы
+    их под другим именем, и загрузка товаров не нашла бы изображение
+    по названию. Файлы записываются в хранилище порциями (File.chunks),
+    без чтения в память целиком.
+    Уменьшенные копии создаются командой generate_thumbnails
+    (до этого выводится исходное изображение).
+    """
+    storage = Image._meta.get_field('src').storage
+    registry = ImageRegistry()
+    for file in files:
+        checksum = get_file_checksum(file)
+        if registry.is_registered(checksum=checksum):
+            registry.skipped += 1
+            continue
+        path = image_directory_path(None, file.name)
+        if registry.is_name_taken(file.name) or storage.exists(path):
+            registry.conflicts.append(file.name)
+            continue
+        src = storage.save(path, file)
+        registry.add(src, checksum, get_alt(file.name))
+    return registry.save()
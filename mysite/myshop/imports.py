@@ -0,0 +1,160 @@
+import logging
+from csv import DictReader
+from itertools import islice
+from typing import Callable, Iterator, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CatalogImport
+from myshop.management.commands.upload_categories_to_db import CategoryImporter
+from myshop.management.commands.upload_products_to_db import (
+    CHUNK_SIZE,
+    ProductImporter,
+)
+
+logger = logging.getLogger(__name__)
+
+IMPORTERS = {
+    CatalogImport.KIND_PRODUCTS: ProductImporter,
+    CatalogImport.KIND_CATEGORIES: CategoryImporter,
+}
+
+
+class ImportConflict(Exception):
+    """Порцию строк уже загрузил другой процесс."""
+
+
+def read_lines(file) -> Iterator[str]:
+    # строки читаются из двоичного файла, чтобы file.tell()
+    # возвращал позицию после прочитанной строки:
+    encoding = 'utf-8-sig'
+    for line in iter(file.readline, b''):
+        yield line.decode(encoding)
+        encoding = 'utf-8'
+
+
+def read_rows(job: CatalogImport, offset: int = 0) -> Iterator[Tuple[dict, int]]:
+    """
+    Построчное чтение файла загрузки начиная с позиции offset (в байтах).
+
+    Возвращает пары (строка, позиция в файле после строки).
+    Заголовок читается с начала файла, затем файл перематывается
+    к offset. В памяти хранится только текущая строка файла.
+    """
+    with job.file.open('rb') as file:
+        reader = DictReader(read_lines(file))
+        if reader.fieldnames is None:
+            return
+        if offset:
+            file.seek(offset)
+        for row in reader:
+            yield row, file.tell()
+
+
+def count_rows(job: CatalogImport) -> int:
+    """Количество строк с данными в файле загрузки."""
+    return sum(1 for _ in read_rows(job))
+
+
+def save_checkpoint(job: CatalogImport, rows_count: int, offset: int) -> None:
+    """
+    Сохраняет позицию в файле и количество загруженных строк.
+
+    Запрос UPDATE с условием на прежнее значение rows_done:
+    если ту же порцию уже загрузил другой процесс,
+    выбрасывается ImportConflict и транзакция порции отменяется.
+    """
+    updated = (
+        CatalogImport.objects
+        .filter(id=job.id, rows_done=job.rows_done)
+        .update(
+            rows_done=F('rows_done') + rows_count,
+            offset=offset,
+            updated_at=timezone.now(),
+        )
+    )
+    if not updated:
+        raise ImportConflict(f'Import #{job.id} was advanced concurrently.')
+
+
+def set_status(job: CatalogImport, status: str, error: str = '') -> None:
+    job.status = status
+    job.error = error
+    job.save(update_fields=['status', 'error', 'updated_at'])
+
+
+def run_import(
+        job: CatalogImport,
+        chunk_size: int = CHUNK_SIZE,
+        max_chunks: Optional[int] = None,
+        progress: Optional[Callable[[CatalogImport], None]] = None,
+) -> CatalogImport:
+    """
+    Загружает файл CSV порциями по chunk_size строк.
+
+    Каждая порция сохраняется в отдельной транзакции вместе с позицией
+    в файле (offset) и количеством загруженных строк (rows_done),
+    поэтому после сбоя загрузка продолжается со следующей порции,
+    без повторов и пропусков. Файл читается потоково с сохраненной
+    позиции, в памяти хранится не больше одной порции.
+
+    Строки, для которых не найдено изображение, сохраняются в unmatched.
+
+    max_chunks ограничивает количество порций за один вызов
+    (административная панель загружает файл по одной порции на запрос).
+    После каждой порции вызывается progress(job).
+    Ошибка записывается в журнал и в загрузку (статус failed),
+    повторный вызов продолжает загрузку с последней сохраненной порции.
+    """
+    if job.status == CatalogImport.STATUS_DONE:
+        return job
+
+    set_status(job, CatalogImport.STATUS_RUNNING)
+    chunks_done = 0
+    reader = read_rows(job, job.offset)
+    rows = reader
+    if job.rows_done and not job.offset:
+        # загрузка прервана до сохранения позиции в файле:
+        rows = islice(reader, job.rows_done, None)
+    try:
+        if job.total_rows is None:
+            job.total_rows = count_rows(job)
+            job.save(update_fields=['total_rows', 'updated_at'])
+        importer = IMPORTERS[job.kind]()
+        while max_chunks is None or chunks_done < max_chunks:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                set_status(job, CatalogImport.STATUS_DONE)
+                break
+            offset = chunk[-1][1]
+            unmatched_count = len(importer.unmatched)
+            with transaction.atomic():
+                save_checkpoint(job, len(chunk), offset)
+                importer.import_rows([row for row, _ in chunk])
+                unmatched = importer.unmatched[unmatched_count:]
+                if unmatched:
+                    job.unmatched = job.unmatched + unmatched
+                    CatalogImport.objects.filter(id=job.id).update(
+                        unmatched=job.unmatched,
+                    )
+            job.rows_done += len(chunk)
+            job.offset = offset
+            chunks_done += 1
+            if progress is not None:
+                progress(job)
+        else:
+            # файл закончился ровно на последней порции:
+            if job.rows_done >= job.total_rows:
+                set_status(job, CatalogImport.STATUS_DONE)
+    except ImportConflict:
+        job.refresh_from_db()
+    except Exception as error:
+        logger.exception('Import #%s failed after %s rows', job.id, job.rows_done)
+        set_status(job, CatalogImport.STATUS_FAILED, str(error) or repr(error))
+        raise
+    finally:
+        # файл закрывается и при загрузке не до конца (max_chunks):
+        reader.close()
+    return job
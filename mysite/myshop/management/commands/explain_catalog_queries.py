@@ -0,0 +1,106 @@
+from django.core.management import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from myshop.models import Product, Subcategory, Tag
+from myshop.views import CatalogView
+
+
+def get_catalog_queryset(params):
+    """
+    Вспомогательная функция.
+
+    Возвращает queryset первой страницы каталога так же,
+    как его формирует представление CatalogView.
+    """
+    request = Request(RequestFactory().get('/api/catalog', params))
+    view = CatalogView(request=request, format_kwarg=None)
+    queryset = view.get_queryset()
+    return queryset[:int(params['limit'])]
+
+
+class Command(BaseCommand):
+    """
+    Команда для вывода планов выполнения (EXPLAIN) запросов каталога.
+
+    Позволяет проверить, какие индексы используются
+    при фильтрации и сортировке товаров в SQLite и Postgres.
+    """
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '--category',
+            type=int,
+            help='id подкатегории (по умолчанию - первая подкатегория в БД)',
+        )
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='выполнить EXPLAIN ANALYZE (только Postgres)',
+        )
+
+    def handle(self, *args, **options) -> None:
+        category = options['category']
+        if category is None:
+            category = (
+                Subcategory.objects
+                .order_by('id')
+                .values_list('id', flat=True)
+                .first()
+            )
+        tag = Tag.objects.order_by('id').values_list('id', flat=True).first()
+        max_price = max(
+            Product.objects.order_by('-current_price')
+            .values_list('current_price', flat=True)
+            .first() or 0,
+            1,
+        )
+
+        base_params = {
+            'filter[name]': '',
+            'filter[minPrice]': 0,
+            'filter[maxPrice]': max_price,
+            'filter[freeDelivery]': 'false',
+            'filter[available]': 'false',
+            'currentPage': 1,
+            'category': category or '',
+            'sort': 'price',
+            'sortType': 'inc',
+            'limit': 20,
+        }
+        scenarios = [
+            ('Подкатегория, сортировка по цене', {}),
+            ('Подкатегория, сортировка по рейтингу', {'sort': 'rating'}),
+            ('Подкатегория, сортировка по дате', {'sort': 'date'}),
+            ('Подкатегория, сортировка по отзывам', {'sort': 'reviews'}),
+            ('Весь каталог, сортировка по цене', {'category': ''}),
+            ('Весь каталог, сортировка по рейтингу', {
+                'category': '',
+                'sort': 'rating',
+            }),
+            ('Поиск по названию', {'filter[name]': 'диван'}),
+            ('Товары в наличии с бесплатной доставкой', {
+                'filter[available]': 'true',
+                'filter[freeDelivery]': 'true',
+            }),
+            ('Курсор, сортировка по цене', {'cursor': ''}),
+            ('Курсор, сортировка по рейтингу', {
+                'cursor': '',
+                'sort': 'rating',
+            }),
+        ]
+        if tag:
+            scenarios.append(('Фильтр по тегу', {'tags[]': tag}))
+
+        explain_options = {}
+        if options['analyze']:
+            explain_options['analyze'] = True
+
+        self.stdout.write(f'БД: {connection.vendor}')
+        for title, params in scenarios:
+            queryset = get_catalog_queryset({**base_params, **params})
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n{title}:'))
+            self.stdout.write(str(queryset.query))
+            self.stdout.write(self.style.SUCCESS('План:'))
+            self.stdout.write(queryset.explain(**explain_options))
@@ -0,0 +1,41 @@
+from django.core.management import BaseCommand
+
+from myshop.thumbnails import CHUNK_SIZE, generate_missing_thumbnails
+
+
+class Command(BaseCommand):
+    """
+    Команда для создания уменьшенных копий изображений
+    (карточка товара, меню категорий, страница товара) и их версий WebP.
+
+    Изображения обрабатываются в пуле процессов.
+    """
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='пересоздать копии всех изображений',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='количество процессов (по умолчанию - количество ядер)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help=f'количество изображений в порции (по умолчанию {CHUNK_SIZE})',
+        )
+
+    def handle(self, *args, **options) -> None:
+        result = generate_missing_thumbnails(
+            force=options['all'],
+            workers=options['workers'],
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Обработано изображений: {result['created']}, "
+            f"ошибок: {result['failed']}"
+        ))
@@ -0,0 +1,82 @@
+from pathlib import Path
+
+from django.core.files import File
+from django.core.management import BaseCommand, CommandError
+
+from myshop.imports import run_import
+from myshop.models import CatalogImport
+from myshop.management.commands.upload_products_to_db import CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    """
+    Команда для загрузки каталога (товаров или категорий) из файла CSV.
+
+    Файл загружается порциями строк с сохранением прогресса:
+    прерванную загрузку можно продолжить параметром --resume.
+    """
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            'kind',
+            nargs='?',
+            choices=[kind for kind, _ in CatalogImport.KIND_CHOICES],
+            help='тип данных в файле',
+        )
+        parser.add_argument('csv_file', nargs='?', help='путь к файлу CSV')
+        parser.add_argument(
+            '--resume',
+            type=int,
+            metavar='ID',
+            help='продолжить прерванную загрузку с указанным id',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help=f'количество строк в порции (по умолчанию {CHUNK_SIZE})',
+        )
+
+    def get_job(self, options) -> CatalogImport:
+        if options['resume'] is not None:
+            try:
+                return CatalogImport.objects.get(id=options['resume'])
+            except CatalogImport.DoesNotExist:
+                raise CommandError(f'Import #{options["resume"]} not found.')
+
+        if not options['kind'] or not options['csv_file']:
+            raise CommandError('Specify kind and csv_file or --resume ID.')
+        path = Path(options['csv_file'])
+        job = CatalogImport(kind=options['kind'])
+        with path.open('rb') as csv_file:
+            job.file.save(path.name, File(csv_file))
+        return job
+
+    def print_progress(self, job: CatalogImport) -> None:
+        self.stdout.write(f'Загрузка #{job.id}: {job.rows_done}/{job.total_rows}')
+
+    def handle(self, *args, **options) -> None:
+        job = self.get_job(options)
+        try:
+            run_import(
+                job,
+                chunk_size=options['chunk_size'],
+                progress=self.print_progress,
+            )
+        except Exception as error:
+            raise CommandError(
+                f'Import #{job.id} failed after {job.rows_done} rows: {error}. '
+                f'Resume with --resume {job.id}.'
+            )
+
+        if job.status != CatalogImport.STATUS_DONE:
+            raise CommandError(
+                f'Import #{job.id} is being processed by another process.'
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f'Загружено строк: {job.rows_done}')
+        )
+        if job.unmatched:
+            self.stdout.write(self.style.WARNING(
+                f"Не найдены изображения: {', '.join(job.unmatched)}"
+            ))
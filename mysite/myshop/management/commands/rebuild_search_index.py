@@ -0,0 +1,48 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from myshop.models import Product
+from myshop.search import get_search_backend
+
+
+class Command(BaseCommand):
+    """
+    Команда для полного перестроения поискового индекса товаров.
+
+    Нужна после массовых операций, которые не вызывают сигналы
+    (bulk_create, update), и при переносе БД.
+    """
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='количество товаров, индексируемых за один раз',
+        )
+
+    def handle(self, *args, **options) -> None:
+        chunk_size = options['chunk_size']
+        backend = get_search_backend()
+        products = (
+            Product.objects
+            .order_by('id')
+            .prefetch_related('tags', 'specifications')
+            .iterator(chunk_size=chunk_size)
+        )
+
+        indexed = 0
+        with transaction.atomic():
+            backend.create_table()
+            backend.clear()
+            chunk = list()
+            for product in products:
+                chunk.append(product)
+                if len(chunk) == chunk_size:
+                    indexed += backend.index(chunk)
+                    chunk = list()
+            indexed += backend.index(chunk)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Проиндексировано товаров: {indexed}')
+        )
@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from myshop.showcase import rebuild_showcase
+
+
+class Command(BaseCommand):
+    """
+    Команда для пересчета данных главной страницы:
+    пула товаров для баннеров и подборок популярных товаров
+    и товаров ограниченного тиража.
+
+    Можно запускать по расписанию (cron), чтобы данные обновлялись
+    чаще, чем раз в SHOWCASE_CACHE_TIMEOUT секунд.
+    """
+
+    def handle(self, *args, **options) -> None:
+        sizes = rebuild_showcase()
+        for name, size in sizes.items():
+            self.stdout.write(self.style.SUCCESS(f'{name}: {size}'))
@@ -0,0 +1,31 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from myshop.cache import (
+    PRODUCT_RAILS,
+    bump_cache_version_on_commit,
+    bump_products_cache_version,
+)
+from myshop.models import Product
+
+
+class Command(BaseCommand):
+    """
+    Команда для пересчета рейтинга и количества отзывов всех товаров.
+
+    Нужна после изменения отзывов без сигналов
+    (массовые операции update/bulk_create) и при переносе БД.
+    """
+
+    def handle(self, *args, **options) -> None:
+        with transaction.atomic():
+            updated = Product.objects.recompute_ratings()
+            # массовое обновление не вызывает сигналы:
+            bump_products_cache_version(
+                Product.objects.values_list('id', flat=True)
+            )
+            bump_cache_version_on_commit(PRODUCT_RAILS)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересчитан рейтинг товаров: {updated}')
+        )
@@ -0,0 +1,23 @@
+from django.core.management import BaseCommand
+
+from myshop.sales import update_sales
+
+
+class Command(BaseCommand):
+    """
+    Команда для начала и окончания распродаж.
+
+    Запускается по расписанию (cron), например раз в минуту:
+    обновляет цену в каталоге и сбрасывает кэш товаров, распродажа
+    которых началась или закончилась. Закончившиеся распродажи
+    сохраняются.
+    """
+
+    def handle(self, *args, **options) -> None:
+        result = update_sales()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Изменено распродаж: {result['changed']}, "
+                f"закончившихся: {result['expired']}"
+            )
+        )
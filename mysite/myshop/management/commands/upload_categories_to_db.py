@@ -1,67 +1,70 @@
+from typing import Optional
+
 from django.core.management import BaseCommand
 
+from myshop.images import build_image_index, normalize_image_name
 from myshop.models import Category, Subcategory, Image
 
 
-def get_image_index(category_name, category_list):
+class CategoryImporter:
     """
-    Вспомогательная функция.
+    Загрузка категорий и подкатегорий товаров порциями строк.
 
-    В списке названий изображений находит нужное
-    (в соответствии с названием категории товара).
-    Возвращает индекс элемента в списке
-    (для последующего получения объекта Image из queryset).
+    Изображения категорий ('Категория_...') и подкатегорий
+    ('Подкатегория_...') загружаются из БД одним запросом в словари.
+    Названия категорий и подкатегорий без изображения собираются в unmatched.
     """
-    for i_image_name in range(len(category_list)):
-        if ' '.join(category_name.split("-")).lower() in category_list[i_image_name]:
-            return i_image_name
 
+    def __init__(self):
+        images = list(Image.objects.order_by('id'))
+        self.category_images = build_image_index(images, prefix='Категория')
+        self.subcategory_images = build_image_index(
+            images,
+            prefix='Подкатегория',
+        )
+        self.unmatched = list()
+
+    def get_image(self, title: str, images: dict) -> Optional[Image]:
+        image = images.get(normalize_image_name(title))
+        if image is None:
+            self.unmatched.append(title)
+        return image
+
+    def import_rows(self, rows) -> None:
+        for items in rows:
+            # создаем категорию и добавляем к ней изображение:
+            category_obj = Category.objects.create(
+                title=items['category'],
+                image=self.get_image(items['category'], self.category_images),
+            )
+
+            # создаем подкатегории и добавляем к ним изображения:
+            subcategories = items['subcategories']
+            if isinstance(subcategories, str):
+                subcategories = subcategories.split(',')
 
-def create_category(context):
+            for subcategory in subcategories:
+                Subcategory.objects.create(
+                    title=subcategory,
+                    categories=category_obj,
+                    image=self.get_image(subcategory, self.subcategory_images),
+                )
+
+
+def create_category(context) -> dict:
     """
     Функция для заполнения БД категориями и подкатегориями товаров.
 
     Создание сущностей Category и Subcategory.
     Вынесено в отдельную функцию для использования и командой,
     и через административную панель.
-    """
 
-    category_images = Image.objects.filter(src__icontains='Категория')
-    category_images_name = [
-        ' '.join(image.get_filename().split('_')).lower()
-        for image in category_images
-    ]
-
-    subcategory_images = Image.objects.filter(src__icontains='Подкатегория')
-    subcategory_images_name = [
-        ' '.join(image.get_filename().split('_')).lower()
-        for image in subcategory_images
-    ]
-
-    for items in context:
-        # создаем категорию и добавляем к ней изображение:
-        category_obj = Category.objects.create(
-            title=items['category']
-        )
-        category_image_index = get_image_index(items['category'], category_images_name)
-        image_obj = category_images[category_image_index]
-        category_obj.image = image_obj
-        category_obj.save()
-
-        # создаем подкатегории и добавляем к ним изображения:
-        subcategories = items['subcategories']
-        if isinstance(subcategories, str):
-            subcategories = subcategories.split(',')
-
-        for subcategory in subcategories:
-            subcategory_obj = Subcategory.objects.create(
-                title=subcategory,
-                categories=category_obj,
-            )
-            subcategory_image_index = get_image_index(subcategory, subcategory_images_name)
-            image_obj = subcategory_images[subcategory_image_index]
-            subcategory_obj.image = image_obj
-            subcategory_obj.save()
+    Возвращает названия категорий и подкатегорий,
+    для которых не найдено изображение.
+    """
+    importer = CategoryImporter()
+    importer.import_rows(context)
+    return {'unmatched': importer.unmatched}
 
 
 class Command(BaseCommand):
@@ -113,4 +116,8 @@ class Command(BaseCommand):
                 ]
             },
         ]
-        create_category(context)
+        result = create_category(context)
+        if result['unmatched']:
+            self.stdout.write(self.style.WARNING(
+                f"Не найдены изображения: {', '.join(result['unmatched'])}"
+            ))
@@ -1,25 +1,32 @@
-import os
-
 from django.core.management import BaseCommand
 
-from mysite.settings import MEDIA_ROOT
-from myshop.models import Image
+from myshop.images import register_directory_images
 
 
 class Command(BaseCommand):
     """
     Заполнение БД имеющимися изображениями.
 
-    Команда для создания сущностей Image.
+    Команда для создания сущностей Image. Уже зарегистрированные
+    изображения (с тем же путем или содержимым) пропускаются,
+    поэтому команду можно запускать повторно.
     """
 
-    def handle(self, *args, **options) -> None:
-        # путь до директории, в которой лежат изображения:
-        directory_images = os.getenv("IMAGES_DIRECTORY", 'images')
-        path_images = MEDIA_ROOT / directory_images
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '--directory',
+            help='каталог с изображениями внутри MEDIA_ROOT '
+                 '(по умолчанию - IMAGES_DIRECTORY или images)',
+        )
 
-        for filename in os.listdir(path_images):
-            Image.objects.create(
-                src=f'{directory_images}/{filename}',
-                alt=os.path.splitext(filename)[0],
-            )
+    def handle(self, *args, **options) -> None:
+        result = register_directory_images(options['directory'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Добавлено изображений: {result['created']}, "
+            f"пропущено: {result['skipped']}"
+        ))
+        if result['conflicts']:
+            self.stdout.write(self.style.WARNING(
+                f"Имя занято другим изображением: "
+                f"{', '.join(result['conflicts'])}"
+            ))
@@ -1,5 +1,15 @@
+import time
+from itertools import islice
+
 from django.core.management import BaseCommand
+from django.db import connection, transaction
 
+from myshop.cache import (
+    TAG_FACETS,
+    BANNER_POOL,
+    PRODUCT_RAILS,
+    bump_cache_version_on_commit,
+)
 from myshop.models import (
     Subcategory,
     Image,
@@ -7,95 +17,223 @@ from myshop.models import (
     Tag,
     Specification
 )
+from myshop.images import build_image_index, normalize_image_name
+from myshop.search import index_products
+
+# количество товаров, добавляемых в БД одним запросом:
+CHUNK_SIZE = 1000
+
+
+def parse_tags(tags) -> list:
+    """Вспомогательная функция. Теги товара: список или строка 'тег,тег'."""
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    return [str(tag) for tag in tags]
 
 
-def get_image_index(name, list):
+def parse_specifications(specifications) -> list:
     """
     Вспомогательная функция.
 
-    В списке названий изображений находит нужное
-    (в соответствии с названием товара).
-    Возвращает индекс элемента в списке
-    (для последующего получения объекта Image из queryset).
+    Характеристики товара: словарь или строка 'название-значение,...'.
+    Возвращает список пар (название, значение).
     """
-    for i_image_name in range(len(list)):
-        if ' '.join(name.split("-")).lower() in list[i_image_name]:
-            return i_image_name
+    if isinstance(specifications, str):
+        specifications = {
+            specification.split('-')[0]: specification.split('-')[1]
+            for specification in specifications.split(',')
+        }
+    return [(name, str(value)) for name, value in specifications.items()]
 
 
-def create_product(context):
+def get_or_create_tags(names: set, tags: dict) -> None:
     """
-    Функция для заполнения БД товарами.
+    Вспомогательная функция.
 
-    Создание сущностей Product.
-    Вынесено в отдельную функцию для использования и командой,
-    и через административную панель.
+    Дополняет словарь tags ({название: id}) тегами из БД
+    и добавляет в БД одним запросом теги, которых там еще нет.
     """
-    categories_queryset = Subcategory.objects.all()
-    images_queryset = Image.objects.all()
-    images_name = [
-        ' '.join(image.get_filename().split('_')).lower()
-        for image in images_queryset
-    ]
-    tags_queryset = Tag.objects.all()
-    specifications_queryset = Specification.objects.all()
-
-    for product in context:
-        category = categories_queryset.get(title=product['category'])
-        image_index = get_image_index(product['title'], images_name)
-        image_obj = images_queryset[image_index]
-
-        product_obj = Product.objects.create(
-            category=category,
-            price=product['price'],
-            count=product['count'],
-            title=product['title'],
-            description=product['description'],
-            fullDescription=product['fullDescription'],
-            freeDelivery=product['freeDelivery'],
-            rating=product['rating'],
-        )
+    new_names = names - set(tags)
+    if not new_names:
+        return
+    tags.update(
+        Tag.objects.filter(name__in=new_names).values_list('name', 'id')
+    )
+    new_names -= set(tags)
+    if not new_names:
+        return
+    Tag.objects.bulk_create([Tag(name=name) for name in new_names])
+    tags.update(
+        Tag.objects.filter(name__in=new_names).values_list('name', 'id')
+    )
 
-        product_obj.images.add(image_obj)
 
-        # теги и характеристики разных товаров могут повторяться
-        # поэтому либо добавляем товару имеющиеся в БД тег/характеристику
-        # либо создаем новые тег/характеристику и добавляем к товару:
+def get_or_create_specifications(pairs: set, specifications: dict) -> None:
+    """
+    Вспомогательная функция.
 
-        tags = product['tags']
-        if isinstance(tags, str):
-            tags = tags.split(',')
+    Дополняет словарь specifications ({(название, значение): id})
+    характеристиками из БД и добавляет в БД одним запросом
+    характеристики, которых там еще нет.
+    """
+    new_pairs = pairs - set(specifications)
+    if not new_pairs:
+        return
+    load_specifications(new_pairs, specifications)
+    new_pairs -= set(specifications)
+    if not new_pairs:
+        return
+    Specification.objects.bulk_create([
+        Specification(name=name, value=value) for name, value in new_pairs
+    ])
+    load_specifications(new_pairs, specifications)
 
-        for tag in tags:
-            if tags_queryset.filter(name=tag).exists():
-                tag_obj = tags_queryset.filter(name=tag)[0]
-            else:
-                tag_obj = Tag.objects.create(name=tag)
 
-            product_obj.tags.add(tag_obj)
+def load_specifications(pairs: set, specifications: dict) -> None:
+    """Вспомогательная функция. Дополняет словарь id характеристик из БД."""
+    for specification in Specification.objects.filter(
+            name__in={name for name, _ in pairs},
+            value__in={value for _, value in pairs},
+    ):
+        pair = (specification.name, specification.value)
+        if pair in pairs:
+            specifications.setdefault(pair, specification.id)
+
+
+class ProductImporter:
+    """
+    Загрузка товаров порциями строк.
+
+    Подкатегории и изображения загружаются из БД один раз в словари.
+    Теги и характеристики загружаются только для строк порции
+    (get_or_create_tags, get_or_create_specifications) и запоминаются
+    для следующих порций. Названия товаров без изображения
+    собираются в unmatched.
+    """
 
-        specifications = product['specifications']
-        if isinstance(specifications, str):
-            specifications = {
-                specification.split('-')[0]: specification.split('-')[1]
-                for specification in specifications.split(',')
-            }
+    def __init__(self):
+        self.categories = dict(Subcategory.objects.values_list('title', 'id'))
+        self.images = build_image_index(Image.objects.order_by('id'))
+        # названия товаров, для которых не найдено изображение:
+        self.unmatched = list()
+        self.tags = dict()
+        self.specifications = dict()
 
-        for name, value in specifications.items():
-            if specifications_queryset.filter(name=name, value=value).exists():
-                specification_obj = specifications_queryset.filter(
-                    name=name,
-                    value=value,
-                )[0]
+    def import_rows(self, rows: list) -> list:
+        """
+        Добавляет в БД товары одной порции строк и их связи с изображениями,
+        тегами и характеристиками (по одному запросу INSERT на таблицу).
 
+        Массовые операции не вызывают сигналы, поэтому поисковый индекс
+        и кэш обновляются здесь же. Возвращает id добавленных товаров.
+        """
+        rows_tags = [parse_tags(row['tags']) for row in rows]
+        rows_specifications = [
+            parse_specifications(row['specifications']) for row in rows
+        ]
+        get_or_create_tags(
+            {tag for row_tags in rows_tags for tag in row_tags},
+            self.tags,
+        )
+        get_or_create_specifications(
+            {pair for row_pairs in rows_specifications for pair in row_pairs},
+            self.specifications,
+        )
+
+        products = [
+            Product(
+                category_id=self.categories[row['category']],
+                price=row['price'],
+                # bulk_create не вызывает Product.save:
+                current_price=row['price'],
+                count=row['count'],
+                title=row['title'],
+                description=row['description'],
+                fullDescription=row['fullDescription'],
+                freeDelivery=row['freeDelivery'],
+                rating=row['rating'],
+            )
+            for row in rows
+        ]
+        if connection.features.can_return_rows_from_bulk_insert:
+            Product.objects.bulk_create(products)
+        else:
+            # СУБД не возвращает id добавленных строк:
+            for product in products:
+                product.save()
+
+        product_images = list()
+        product_tags = set()
+        product_specifications = set()
+        for row, product, row_tags, row_pairs in zip(
+                rows, products, rows_tags, rows_specifications
+        ):
+            image = self.images.get(normalize_image_name(row['title']))
+            if image is None:
+                self.unmatched.append(row['title'])
             else:
-                specification_obj = Specification.objects.create(
-                    name=name,
-                    value=value,
+                product_images.append(
+                    Product.images.through(
+                        product_id=product.id,
+                        image_id=image.id,
+                    )
                 )
-            product_obj.specifications.add(specification_obj)
+            product_tags.update(
+                (product.id, self.tags[tag]) for tag in row_tags
+            )
+            product_specifications.update(
+                (product.id, self.specifications[pair]) for pair in row_pairs
+            )
+
+        Product.images.through.objects.bulk_create(product_images)
+        Product.tags.through.objects.bulk_create([
+            Product.tags.through(product_id=product_id, tag_id=tag_id)
+            for product_id, tag_id in product_tags
+        ])
+        Product.specifications.through.objects.bulk_create([
+            Product.specifications.through(
+                product_id=product_id,
+                specification_id=specification_id,
+            )
+            for product_id, specification_id in product_specifications
+        ])
+
+        product_ids = [product.id for product in products]
+        index_products(product_ids)
+        bump_cache_version_on_commit(TAG_FACETS, BANNER_POOL, PRODUCT_RAILS)
+        return product_ids
+
+
+def create_product(context, chunk_size: int = CHUNK_SIZE) -> dict:
+    """
+    Функция для заполнения БД товарами.
+
+    Создание сущностей Product.
+    Вынесено в отдельную функцию для использования и командой,
+    и через административную панель.
+
+    Товары добавляются порциями по chunk_size строк (ProductImporter)
+    в одной транзакции.
+    Возвращает количество строк, скорость загрузки (строк в секунду)
+    и названия товаров, для которых не найдено изображение.
+    """
+    started = time.monotonic()
+    importer = ProductImporter()
+
+    rows_count = 0
+    rows = iter(context)
+    with transaction.atomic():
+        while chunk := list(islice(rows, chunk_size)):
+            importer.import_rows(chunk)
+            rows_count += len(chunk)
 
-        product_obj.save()
+    seconds = time.monotonic() - started
+    return {
+        'rows': rows_count,
+        'seconds': seconds,
+        'rows_per_second': rows_count / seconds if seconds else rows_count,
+        'unmatched': importer.unmatched,
+    }
 
 
 class Command(BaseCommand):
@@ -147,4 +285,13 @@ class Command(BaseCommand):
                 "rating": 4.5
             },
         ]
-        create_product(context)
+        result = create_product(context)
+        self.stdout.write(self.style.SUCCESS(
+            f"Загружено товаров: {result['rows']} "
+            f"({result['rows_per_second']:.0f} строк/с)"
+        ))
+        if result['unmatched']:
+            self.stdout.write(self.style.WARNING(
+                f"Не найдены изображения товаров: "
+                f"{', '.join(result['unmatched'])}"
+            ))
@@ -0,0 +1,140 @@
+from csv import DictReader
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+from typing import List
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from myshop.cache import bump_products_cache_version
+from myshop.models import Product, ProductSale
+
+
+def parse_sale_date(value: str) -> datetime:
+    """
+    Вспомогательная функция.
+
+    Преобразует дату распродажи из CSV ('2024-05-01' или '2024-05-01 10:00').
+    """
+    date = parse_datetime(value)
+    if date is None:
+        date = parse_date(value)
+        if date is None:
+            raise ValueError(f'Invalid date: {value!r}')
+        date = datetime.combine(date, time.min)
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+class SaleImportError(ValueError):
+    """Ошибки в строках файла распродаж."""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__('; '.join(errors))
+
+
+def parse_sale(row: dict) -> ProductSale:
+    """
+    Вспомогательная функция.
+
+    Преобразует строку файла в распродажу и проверяет
+    цену (больше 0) и даты (dateFrom <= dateTo).
+    """
+    try:
+        sale_price = Decimal(row['salePrice'])
+    except (InvalidOperation, TypeError):
+        raise ValueError(f'Invalid salePrice: {row["salePrice"]!r}')
+    if not sale_price.is_finite() or sale_price <= 0:
+        raise ValueError(f'salePrice must be positive: {row["salePrice"]!r}')
+
+    sale = ProductSale(
+        id_id=int(row['id']),
+        salePrice=sale_price,
+        dateFrom=parse_sale_date(row['dateFrom']),
+        dateTo=parse_sale_date(row['dateTo']),
+    )
+    if sale.dateFrom > sale.dateTo:
+        raise ValueError('dateFrom is later than dateTo')
+    return sale
+
+
+def create_sales(context) -> int:
+    """
+    Функция для заполнения БД распродажами.
+
+    Создание сущностей ProductSale (колонки: id товара, salePrice,
+    dateFrom, dateTo) одним запросом INSERT; распродажи товаров,
+    которые уже участвуют в распродаже, обновляются.
+    Вынесено в отдельную функцию для использования и командой,
+    и через административную панель.
+
+    Массовое добавление не выполняет проверки модели, поэтому
+    все строки проверяются заранее (товар существует, цена распродажи
+    больше 0 и меньше цены товара, dateFrom <= dateTo). Если есть
+    ошибки, распродажи не сохраняются, а выбрасывается SaleImportError
+    с ошибками по номерам строк.
+    """
+    sales = dict()
+    errors = list()
+    for number, row in enumerate(context, start=1):
+        try:
+            sale = parse_sale(row)
+        except KeyError as error:
+            errors.append(f'Row {number}: missing column {error}')
+        except ValueError as error:
+            errors.append(f'Row {number}: {error}')
+        else:
+            sales[sale.id_id] = (number, sale)
+
+    # все товары проверяются одним запросом:
+    prices = dict(
+        Product.objects
+        .filter(id__in=list(sales))
+        .values_list('id', 'price')
+    )
+    for product_id, (number, sale) in sales.items():
+        if product_id not in prices:
+            errors.append(f'Row {number}: product {product_id} not found')
+        elif sale.salePrice >= prices[product_id]:
+            errors.append(
+                f'Row {number}: salePrice {sale.salePrice} is not lower '
+                f'than price {prices[product_id]}'
+            )
+    if errors:
+        raise SaleImportError(errors)
+
+    with transaction.atomic():
+        ProductSale.objects.bulk_create(
+            [sale for _, sale in sales.values()],
+            update_conflicts=True,
+            unique_fields=['id'],
+            update_fields=['salePrice', 'dateFrom', 'dateTo'],
+        )
+        # массовое добавление не вызывает сигналы:
+        Product.objects.filter(id__in=list(sales)).update_current_price()
+        bump_products_cache_version(sales)
+    return len(sales)
+
+
+class Command(BaseCommand):
+    """
+    Команда для заполнения БД распродажами из файла CSV.
+    """
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument('csv_file', help='путь к файлу CSV')
+
+    def handle(self, *args, **options) -> None:
+        with open(options['csv_file'], encoding='utf-8') as csv_file:
+            try:
+                created = create_sales(DictReader(csv_file))
+            except SaleImportError as error:
+                raise CommandError('\n'.join(error.errors))
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Загружено распродаж: {created}')
+        )
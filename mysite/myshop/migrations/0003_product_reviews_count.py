@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:28
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_reviews_count(apps, schema_editor):
+    Product = apps.get_model('myshop', 'Product')
+    Review = apps.get_model('myshop', 'Review')
+    reviews_count = (
+        Review.objects
+        .filter(product=OuterRef('pk'))
+        .values('product')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    Product.objects.update(
+        reviews_count=Coalesce(Subquery(reviews_count), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myshop', '0002_product_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='reviews_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_reviews_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'reviews_count', 'id'], name='product_category_reviews_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['reviews_count', 'id'], name='product_reviews_idx'),
+        ),
+    ]
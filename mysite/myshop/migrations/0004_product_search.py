@@ -0,0 +1,106 @@
+import re
+
+import snowballstemmer
+from django.db import migrations
+
+# SQL и подготовка текста зафиксированы на момент миграции
+# (не зависят от последующих изменений myshop.search):
+
+SQLITE_CREATE_SQL = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS myshop_product_search '
+    "USING fts5(title, body, tokenize='unicode61 remove_diacritics 2')"
+)
+SQLITE_INSERT_SQL = (
+    'INSERT INTO myshop_product_search (rowid, title, body) '
+    'VALUES (%s, %s, %s)'
+)
+
+POSTGRES_CREATE_SQL = [
+    'CREATE TABLE IF NOT EXISTS myshop_product_search ('
+    'product_id bigint PRIMARY KEY '
+    'REFERENCES myshop_product (id) ON DELETE CASCADE, '
+    'document tsvector NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS myshop_product_search_document_idx '
+    'ON myshop_product_search USING GIN (document)',
+]
+POSTGRES_INSERT_SQL = (
+    'INSERT INTO myshop_product_search (product_id, document) '
+    "VALUES (%s, setweight(to_tsvector('russian', %s), 'A') "
+    "|| setweight(to_tsvector('russian', %s), 'B')) "
+    'ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document'
+)
+
+DROP_SQL = 'DROP TABLE IF EXISTS myshop_product_search'
+
+WORD_PATTERN = re.compile(r'\w+')
+CYRILLIC_PATTERN = re.compile(r'[а-яё]')
+
+
+def stem_text(text: str) -> str:
+    """Слова текста в нижнем регистре, приведенные к основе."""
+    russian_stemmer = snowballstemmer.stemmer('russian')
+    english_stemmer = snowballstemmer.stemmer('english')
+    return ' '.join(
+        russian_stemmer.stemWord(word)
+        if CYRILLIC_PATTERN.search(word)
+        else english_stemmer.stemWord(word)
+        for word in WORD_PATTERN.findall((text or '').lower())
+    )
+
+
+def get_product_documents(product) -> tuple:
+    body = [
+        product.description,
+        product.fullDescription or '',
+        *(tag.name for tag in product.tags.all()),
+        *(
+            specification.value
+            for specification in product.specifications.all()
+        ),
+    ]
+    return product.title, ' '.join(body)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        create_sql, insert_sql = [SQLITE_CREATE_SQL], SQLITE_INSERT_SQL
+    elif vendor == 'postgresql':
+        create_sql, insert_sql = POSTGRES_CREATE_SQL, POSTGRES_INSERT_SQL
+    else:
+        return
+
+    Product = apps.get_model('myshop', 'Product')
+    rows = list()
+    for product in (
+            Product.objects
+            .using(schema_editor.connection.alias)
+            .prefetch_related('tags', 'specifications')
+    ):
+        title, body = get_product_documents(product)
+        if vendor == 'sqlite':
+            title, body = stem_text(title), stem_text(body)
+        rows.append((product.id, title, body))
+
+    with schema_editor.connection.cursor() as cursor:
+        for sql in create_sql:
+            cursor.execute(sql)
+        if rows:
+            cursor.executemany(insert_sql, rows)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myshop', '0003_product_reviews_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
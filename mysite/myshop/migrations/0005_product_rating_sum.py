@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:38
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, Round
+
+
+def fill_rating_sum(apps, schema_editor):
+    Product = apps.get_model('myshop', 'Product')
+    Review = apps.get_model('myshop', 'Review')
+    db_alias = schema_editor.connection.alias
+    rating_sum = (
+        Review.objects
+        .using(db_alias)
+        .filter(product=OuterRef('pk'))
+        .values('product')
+        .annotate(total=Sum('rate'))
+        .values('total')
+    )
+    products = Product.objects.using(db_alias)
+    products.update(rating_sum=Coalesce(Subquery(rating_sum), 0))
+    # рейтинг товаров с отзывами вычисляется из оценок,
+    # товары без отзывов сохраняют прежний рейтинг:
+    products.filter(reviews_count__gt=0).update(
+        rating=Round(
+            Cast('rating_sum', models.FloatField()) / models.F('reviews_count'),
+            1,
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myshop', '0004_product_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_rating_sum, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myshop', '0005_product_rating_sum'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'date', 'id'], name='review_product_date_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:44
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def restore_base_prices(apps, schema_editor):
+    # раньше при создании распродажи цена товара заменялась
+    # ценой со скидкой, а исходная цена сохранялась в ProductSale.price:
+    Product = apps.get_model('myshop', 'Product')
+    ProductSale = apps.get_model('myshop', 'ProductSale')
+    db_alias = schema_editor.connection.alias
+    base_price = (
+        ProductSale.objects
+        .using(db_alias)
+        .filter(id=OuterRef('pk'))
+        .values('price')[:1]
+    )
+    (
+        Product.objects
+        .using(db_alias)
+        .filter(productsale__isnull=False)
+        .update(price=Subquery(base_price))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myshop', '0006_review_product_date_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productsale',
+            index=models.Index(fields=['dateFrom', 'dateTo'], name='product_sale_dates_idx'),
+        ),
+        migrations.RunPython(restore_base_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:46
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myshop', '0007_product_sale_dates_index'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='productsale',
+            name='images',
+        ),
+        migrations.RemoveField(
+            model_name='productsale',
+            name='price',
+        ),
+        migrations.RemoveField(
+            model_name='productsale',
+            name='title',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myshop', '0009_catalog_import'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogimport',
+            name='unmatched',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:53
+
+import hashlib
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def fill_checksum(apps, schema_editor):
+    Image = apps.get_model('myshop', 'Image')
+    images = list(
+        Image.objects
+        .using(schema_editor.connection.alias)
+        .exclude(src__isnull=True)
+        .exclude(src='')
+    )
+    for image in images:
+        # записи без файла в хранилище остаются без контрольной суммы:
+        if not default_storage.exists(image.src.name):
+            continue
+        checksum = hashlib.sha256()
+        with default_storage.open(image.src.name, 'rb') as file:
+            for chunk in file.chunks():
+                checksum.update(chunk)
+        image.checksum = checksum.hexdigest()
+    Image.objects.using(schema_editor.connection.alias).bulk_update(
+        [image for image in images if image.checksum],
+        ['checksum'],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myshop', '0010_catalog_import_unmatched'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='checksum',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.RunPython(fill_checksum, migrations.RunPython.noop),
+    ]
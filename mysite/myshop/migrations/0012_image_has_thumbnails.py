@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myshop', '0011_image_checksum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='has_thumbnails',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:40
+
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def refill_reviews_count(apps, schema_editor):
+    # 0003_product_reviews_count заполняет reviews_count только
+    # в БД default; количество отзывов пересчитывается в той БД,
+    # к которой применяются миграции (например, вторая БД
+    # нагрузочного теста резервирования товаров):
+    Product = apps.get_model('myshop', 'Product')
+    Review = apps.get_model('myshop', 'Review')
+    db_alias = schema_editor.connection.alias
+    reviews_count = (
+        Review.objects
+        .using(db_alias)
+        .filter(product=OuterRef('pk'))
+        .values('product')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    Product.objects.using(db_alias).update(
+        reviews_count=Coalesce(Subquery(reviews_count), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myshop', '0012_image_has_thumbnails'),
+    ]
+
+    operations = [
+        migrations.RunPython(refill_reviews_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:20
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def fill_current_price(apps, schema_editor):
+    Product = apps.get_model('myshop', 'Product')
+    ProductSale = apps.get_model('myshop', 'ProductSale')
+    db_alias = schema_editor.connection.alias
+    now = timezone.now()
+    sale_price = (
+        ProductSale.objects
+        .using(db_alias)
+        .filter(id=OuterRef('pk'), dateFrom__lte=now, dateTo__gte=now)
+        .values('salePrice')[:1]
+    )
+    Product.objects.using(db_alias).update(
+        current_price=Coalesce(
+            Subquery(sale_price),
+            F('price'),
+            output_field=models.DecimalField(max_digits=15, decimal_places=2),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myshop', '0013_refill_product_reviews_count'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_category_price_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_price_idx',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='current_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=15),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_current_price, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'current_price', 'id'], name='product_category_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['current_price', 'id'], name='product_price_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myshop', '0014_product_current_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogimport',
+            name='offset',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
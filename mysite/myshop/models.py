@@ -1,7 +1,21 @@
 import os
+from decimal import Decimal, ROUND_HALF_UP
 
 from django.db import models
+from django.db.models import (
+    Case,
+    Count,
+    F,
+    FloatField,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Sum,
+    When,
+)
+from django.db.models.functions import Cast, Coalesce, Round
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.core.validators import (
     MinValueValidator,
     MaxValueValidator
@@ -28,6 +42,10 @@ class Image(models.Model):
         blank=True,
         max_length=40
     )
+    # SHA-256 содержимого файла (поиск уже загруженных изображений):
+    checksum = models.CharField(max_length=64, blank=True, db_index=True)
+    # созданы ли уменьшенные копии (myshop.thumbnails):
+    has_thumbnails = models.BooleanField(default=False)
 
     def __str__(self):
         return f'{self.src}'
@@ -112,15 +130,158 @@ class Specification(models.Model):
         return f'{self.name}: {self.value}'
 
 
+def get_sale_price(at=None) -> models.QuerySet:
+    """Подзапрос цены распродажи товара, действующей в момент at."""
+    return (
+        ProductSale.objects
+        .active(at)
+        .filter(id=OuterRef('pk'))
+        .values('salePrice')[:1]
+    )
+
+
+class ProductQuerySet(models.QuerySet):
+    """Набор запросов для модели Product."""
+
+    def with_short_info(self) -> "ProductQuerySet":
+        """
+        Предзагрузка данных для сериализатора ProductShortSerializer.
+
+        Изображения, теги и характеристики загружаются дополнительными
+        запросами на всю выборку (количество отзывов хранится в самом
+        товаре) - число запросов не зависит от количества товаров.
+        Цена со скидкой вычисляется в том же запросе (with_sale_price).
+        """
+        return (
+            self
+            .with_sale_price()
+            .prefetch_related('images', 'tags', 'specifications')
+        )
+
+    def with_sale_price(self, at=None) -> "ProductQuerySet":
+        """
+        Добавляет цену действующей распродажи (active_sale_price).
+
+        Цена выбирается подзапросом по первичному ключу ProductSale
+        в том же запросе, что и товары; если распродажи нет - None.
+        """
+        return self.annotate(active_sale_price=Subquery(get_sale_price(at)))
+
+    def update_current_price(self, at=None) -> int:
+        """
+        Сохраняет в current_price цену товаров с учетом распродажи,
+        действующей в момент at (по умолчанию - сейчас), одним запросом.
+        """
+        return self.update(
+            current_price=Coalesce(
+                Subquery(get_sale_price(at)),
+                F('price'),
+                output_field=models.DecimalField(
+                    max_digits=15,
+                    decimal_places=2,
+                ),
+            )
+        )
+
+    def add_review(self, rate: int) -> int:
+        """
+        Учитывает новый отзыв в рейтинге товаров одним запросом UPDATE.
+
+        Сумма оценок и количество отзывов увеличиваются выражениями F()
+        на стороне БД, поэтому одновременные отзывы не теряются;
+        рейтинг вычисляется из тех же (прежних) значений столбцов.
+        """
+        return self.update_rating(rate, 1)
+
+    def remove_review(self, rate: int) -> int:
+        """Исключает удаленный отзыв из рейтинга товаров (см. add_review)."""
+        return self.filter(reviews_count__gt=0).update_rating(-rate, -1)
+
+    def update_rating(self, rate: int, count: int) -> int:
+        """
+        Изменяет сумму оценок на rate и количество отзывов на count.
+
+        Рейтинг - средняя оценка отзывов. Рейтинг, загруженный из файла
+        (upload_products_to_db), в среднее не входит: он выводится,
+        пока у товара нет отзывов, и заменяется средней оценкой
+        после первого отзыва. После удаления последнего отзыва
+        рейтинг не меняется.
+        """
+        rating_sum = F('rating_sum') + rate
+        reviews_count = F('reviews_count') + count
+        return self.update(
+            rating_sum=rating_sum,
+            reviews_count=reviews_count,
+            rating=Case(
+                When(
+                    reviews_count__gt=-count,
+                    then=Round(
+                        Cast(rating_sum, FloatField()) / reviews_count,
+                        1,
+                    ),
+                ),
+                default=F('rating'),
+                output_field=models.DecimalField(
+                    max_digits=3,
+                    decimal_places=1,
+                ),
+            ),
+        )
+
+    def recompute_ratings(self) -> int:
+        """
+        Пересчитывает количество отзывов, сумму оценок и рейтинг товаров.
+
+        Данные отзывов выбираются одним запросом с группировкой по товару.
+        Товары без отзывов сохраняют свой рейтинг.
+        """
+        aggregates = (
+            Review.objects
+            .filter(product__in=self.values('id'))
+            .values('product')
+            .annotate(count=Count('id'), total=Sum('rate'))
+            .order_by()
+        )
+        products = [
+            Product(
+                id=row['product'],
+                reviews_count=row['count'],
+                rating_sum=row['total'],
+                rating=(Decimal(row['total']) / row['count']).quantize(
+                    Decimal('0.1'),
+                    rounding=ROUND_HALF_UP,
+                ),
+            )
+            for row in aggregates
+        ]
+        self.filter(reviews__isnull=True).update(reviews_count=0, rating_sum=0)
+        self.model.objects.bulk_update(
+            products,
+            ['reviews_count', 'rating_sum', 'rating'],
+            batch_size=500,
+        )
+        return len(products)
+
+
 class Product(models.Model):
     """Модель, представляющая товар."""
 
+    objects = ProductQuerySet.as_manager()
+
     category = models.ForeignKey(Subcategory, on_delete=models.CASCADE)
     price = models.DecimalField(
         max_digits=15,
         decimal_places=2,
         validators=[MinValueValidator(0.01)]
     )
+    # цена с учетом действующей распродажи (по ней фильтруется
+    # и сортируется каталог), обновляется при сохранении товара
+    # и распродажи и задачей update_sales (начало и окончание распродаж):
+    current_price = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        editable=False,
+    )
     count = models.PositiveSmallIntegerField(default=0)
     date = models.DateTimeField(auto_now_add=True)
     title = models.CharField(max_length=20)
@@ -146,10 +307,92 @@ class Product(models.Model):
         max_digits=3,
         validators=[MinValueValidator(0), MaxValueValidator(5)]
     )
+    # количество отзывов о товаре (дублирует Review, чтобы сортировать
+    # каталог по отзывам без соединения таблиц и агрегации),
+    # обновляется сигналами при добавлении, изменении и удалении отзыва:
+    reviews_count = models.PositiveIntegerField(default=0)
+    # сумма оценок из отзывов: рейтинг = rating_sum / reviews_count
+    # (обновляется вместе с reviews_count,
+    # пересчитывается командой recompute_ratings):
+    rating_sum = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # индексы подобраны под фильтры и сортировки каталога (CatalogView):
+        # товары подкатегории сортируются по цене, рейтингу, дате;
+        # id в конце индекса - для стабильного порядка товаров
+        # с одинаковым значением ключа сортировки.
+        indexes = [
+            models.Index(
+                fields=['category', 'current_price', 'id'],
+                name='product_category_price_idx',
+            ),
+            models.Index(
+                fields=['category', 'rating', 'id'],
+                name='product_category_rating_idx',
+            ),
+            models.Index(
+                fields=['category', 'date', 'id'],
+                name='product_category_date_idx',
+            ),
+            models.Index(
+                fields=['category', 'reviews_count', 'id'],
+                name='product_category_reviews_idx',
+            ),
+            models.Index(
+                fields=['current_price', 'id'],
+                name='product_price_idx',
+            ),
+            models.Index(
+                fields=['rating', 'id'],
+                name='product_rating_idx',
+            ),
+            models.Index(
+                fields=['date', 'id'],
+                name='product_date_idx',
+            ),
+            models.Index(
+                fields=['reviews_count', 'id'],
+                name='product_reviews_idx',
+            ),
+            models.Index(
+                fields=['count'],
+                name='product_count_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'Товар #{self.id} {self.title}'
 
+    def save(self, *args, **kwargs):
+        # у нового товара распродажи еще нет:
+        self.current_price = (
+            self.price if self._state.adding else self.effective_price
+        )
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'price' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'current_price'}
+        super().save(*args, **kwargs)
+
+    @property
+    def effective_price(self):
+        """
+        Цена товара с учетом действующей распродажи.
+
+        Цена распродажи берется из аннотации with_sale_price,
+        без нее выполняется отдельный запрос.
+        """
+        if hasattr(self, 'active_sale_price'):
+            sale_price = self.active_sale_price
+        else:
+            sale_price = (
+                ProductSale.objects
+                .active()
+                .filter(id=self.id)
+                .values_list('salePrice', flat=True)
+                .first()
+            )
+        return self.price if sale_price is None else sale_price
+
 
 class Review(models.Model):
     """Модель, представляющая отзыв о товаре."""
@@ -167,22 +410,53 @@ class Review(models.Model):
         related_name='reviews',
     )
 
+    class Meta:
+        # отзывы товара выводятся от новых к старым (ProductView, ReviewView):
+        indexes = [
+            models.Index(
+                fields=['product', 'date', 'id'],
+                name='review_product_date_idx',
+            ),
+        ]
+
     def __str__(self):
         return f'Отзыв #{self.id}, товар {self.product!r}'
 
 
+class ProductSaleQuerySet(models.QuerySet):
+    """Набор запросов для модели ProductSale."""
+
+    def active(self, at=None) -> "ProductSaleQuerySet":
+        """Распродажи, действующие в момент at (по умолчанию - сейчас)."""
+        at = at or timezone.now()
+        return self.filter(dateFrom__lte=at, dateTo__gte=at)
+
+    def with_product(self) -> "ProductSaleQuerySet":
+        """
+        Загрузка товара (цена, название) в том же запросе
+        и изображений товара одним дополнительным запросом.
+        """
+        return self.select_related('id').prefetch_related('id__images')
+
+
 class ProductSale(models.Model):
-    """Модель, представляющая товар, участвующий в распродаже."""
+    """
+    Модель, представляющая товар, участвующий в распродаже.
+
+    Цена товара (Product.price) при распродаже не меняется:
+    цена со скидкой применяется при чтении, пока распродажа действует
+    (ProductQuerySet.with_sale_price, Product.effective_price),
+    и сохраняется в Product.current_price для каталога.
+    Исходная цена, название и изображения не копируются,
+    а берутся из товара (ProductSaleQuerySet.with_product).
+    """
+
+    objects = ProductSaleQuerySet.as_manager()
 
     id = models.OneToOneField(
         Product,
         primary_key=True,
         on_delete=models.CASCADE)
-    price = models.DecimalField(
-        max_digits=15,
-        decimal_places=1,
-        validators=[MinValueValidator(0.01)]
-    )
     salePrice = models.DecimalField(
         max_digits=15,
         decimal_places=1,
@@ -190,37 +464,18 @@ class ProductSale(models.Model):
     )
     dateFrom = models.DateTimeField()
     dateTo = models.DateTimeField()
-    title = models.CharField(max_length=20)
-    images = models.ManyToManyField(
-        Image,
-        related_name="product_sale_image",
-        blank=True,
-    )
-
-    def save(self, *args, **kwargs) -> None:
-        # При создании товара, участвующего в распродаже,
-        # данные берутся из модели Product: цена, название и изображения.
-        # В модели Product цена меняется на новую сниженную.
-        product = (
-            Product.objects
-            .prefetch_related('images')
-            .get(id=self.id.id)
-        )
-
-        self.price = product.price
-        self.title = product.title
 
-        new_price = self.salePrice
-        product.price = new_price
-        product.save()
-
-        super(ProductSale, self).save(*args, **kwargs)
-
-        images = product.images.all()
-        self.images.set(images)
+    class Meta:
+        # поиск действующих распродаж: dateFrom <= сейчас <= dateTo
+        indexes = [
+            models.Index(
+                fields=['dateFrom', 'dateTo'],
+                name='product_sale_dates_idx',
+            ),
+        ]
 
     def __str__(self):
-        return f'SALE Товар #{self.id} {self.title}'
+        return f'SALE {self.id}'
 
 
 # МОДЕЛИ ДЛЯ ОПИСАНИЯ ЗАКАЗОВ:
@@ -238,9 +493,30 @@ class OrderProduct(models.Model):
         return f'Товар {self.product!r} - заказ #{self.id}'
 
 
+class OrderQuerySet(models.QuerySet):
+    """Набор запросов для модели Order."""
+
+    def with_products(self) -> "OrderQuerySet":
+        """
+        Предзагрузка товаров заказов вместе с данными
+        для сериализатора ProductShortSerializer.
+
+        Число запросов не зависит ни от количества заказов,
+        ни от количества товаров в них.
+        """
+        return self.prefetch_related(
+            Prefetch(
+                'products__product',
+                queryset=Product.objects.with_short_info(),
+            )
+        )
+
+
 class Order(models.Model):
     """Модель, представляющая заказ."""
 
+    objects = OrderQuerySet.as_manager()
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, default=1)
     createdAt = models.DateTimeField(auto_now_add=True)
     fullName = models.CharField(max_length=20, null=True, blank=True)
@@ -263,3 +539,60 @@ class Order(models.Model):
 
     def __str__(self):
         return f'Заказ #{self.id} - пользователь {self.user!r}'
+
+
+# МОДЕЛИ ДЛЯ ЗАГРУЗКИ ДАННЫХ:
+
+class CatalogImport(models.Model):
+    """
+    Модель, представляющая загрузку файла CSV с каталогом.
+
+    Файл обрабатывается порциями строк (myshop.imports.run_import),
+    после каждой порции сохраняется позиция в файле (offset):
+    прерванная загрузка продолжается с этого места без повторного
+    чтения файла с начала. rows_done - количество загруженных строк
+    для вывода прогресса.
+    """
+
+    KIND_PRODUCTS = 'products'
+    KIND_CATEGORIES = 'categories'
+    KIND_CHOICES = [
+        (KIND_PRODUCTS, 'Товары'),
+        (KIND_CATEGORIES, 'Категории'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Ожидает'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Завершена'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    file = models.FileField(upload_to='imports/')
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+    )
+    rows_done = models.PositiveIntegerField(default=0)
+    # позиция в файле (в байтах) после последней загруженной строки:
+    offset = models.PositiveBigIntegerField(default=0)
+    total_rows = models.PositiveIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    # строки, для которых не найдено изображение:
+    unmatched = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Загрузка #{self.id} ({self.kind}) - {self.status}'
+
+    @property
+    def is_done(self) -> bool:
+        # загрузка с ошибкой продолжается с сохраненного места:
+        return self.status == self.STATUS_DONE
@@ -0,0 +1,220 @@
+import base64
+import binascii
+import json
+import math
+from typing import Any, List, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Q, Window
+from django.db.models.query import QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework import status
+
+
+class CurrentPagePagination(BasePagination):
+    """
+    Постраничный вывод в формате {items, currentPage, lastPage}.
+
+    Общее количество объектов считается оконной функцией COUNT(*) OVER ()
+    в том же запросе, которым выбирается страница, - отдельный запрос
+    COUNT к БД не выполняется.
+    Отдельный запрос выполняется, только если страница пуста
+    (запрошена страница за пределами выборки) или если в запросе
+    есть DISTINCT без группировки (оконная функция посчитала бы
+    повторяющиеся строки).
+    """
+
+    page_query_param = 'currentPage'
+    page_size_query_param = 'limit'
+    page_size = 20
+    total_count_annotation = 'pagination_total_count'
+
+    def get_page_size(self, request: Request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return page_size if page_size > 0 else self.page_size
+
+    def get_current_page(self, request: Request) -> int:
+        try:
+            current_page = int(request.query_params[self.page_query_param])
+        except (KeyError, ValueError):
+            return 1
+        return current_page if current_page > 0 else 1
+
+    def can_count_in_window(self, queryset: QuerySet) -> bool:
+        query = queryset.query
+        return not query.distinct or query.group_by is not None
+
+    def paginate_queryset(
+            self,
+            queryset: QuerySet,
+            request: Request,
+            view=None,
+    ) -> Optional[List]:
+        self.limit = self.get_page_size(request)
+        self.current_page = self.get_current_page(request)
+        offset = self.limit * (self.current_page - 1)
+
+        if not self.can_count_in_window(queryset):
+            page = list(queryset[offset:offset + self.limit])
+            total_count = queryset.count()
+        else:
+            page = list(
+                queryset.annotate(
+                    **{self.total_count_annotation: Window(Count('*'))}
+                )
+                [offset:offset + self.limit]
+            )
+            if page:
+                total_count = getattr(page[0], self.total_count_annotation)
+            elif offset:
+                total_count = queryset.count()
+            else:
+                total_count = 0
+
+        self.last_page = math.ceil(total_count / self.limit)
+        return page
+
+    def get_paginated_response(self, data) -> Response:
+        return Response(
+            {
+                'items': data,
+                'currentPage': self.current_page,
+                'lastPage': self.last_page,
+            },
+            status=status.HTTP_200_OK
+        )
+
+    def get_paginated_response_schema(self, schema: dict) -> dict:
+        return {
+            'type': 'object',
+            'properties': {
+                'items': schema,
+                'currentPage': {'type': 'integer', 'example': 1},
+                'lastPage': {'type': 'integer', 'example': 10},
+            },
+        }
+
+
+class ProductSalePagination(CurrentPagePagination):
+    """Постраничный вывод товаров, участвующих в распродаже."""
+
+    page_size_query_param = None
+    page_size = 5
+
+    def get_page_size(self, request: Request) -> int:
+        return self.page_size
+
+
+class KeysetPagination(BasePagination):
+    """
+    Постраничный вывод по курсору (keyset pagination).
+
+    Порядок вывода берется из queryset: order_by должен содержать
+    ровно два поля - ключ сортировки и первичный ключ
+    (например, ('-price', '-id')), направления должны совпадать.
+    Курсор хранит пару (значение ключа, id) последнего объекта страницы,
+    следующая страница выбирается условием по этой паре, а не через OFFSET,
+    поэтому время выборки не зависит от номера страницы.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = 20
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request: Request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return page_size if page_size > 0 else self.page_size
+
+    def get_ordering(self, queryset: QuerySet) -> Tuple[str, bool]:
+        """Возвращает название ключа сортировки и признак убывания."""
+        sort_field, pk_field = queryset.query.order_by
+        descending = sort_field.startswith('-')
+        if (
+                pk_field.lstrip('-') not in ('id', 'pk')
+                or pk_field.startswith('-') != descending
+        ):
+            raise ValueError(
+                'KeysetPagination requires ordering by (sort key, id) '
+                'in the same direction.'
+            )
+        return sort_field.lstrip('-'), descending
+
+    def encode_cursor(self, value, pk: int) -> str:
+        data = json.dumps([value, pk], default=str)
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def decode_cursor(self, cursor: str) -> Tuple[Any, int]:
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return value, int(pk)
+        except (TypeError, ValueError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(
+            self,
+            queryset: QuerySet,
+            request: Request,
+            view=None,
+    ) -> Optional[List]:
+        self.limit = self.get_page_size(request)
+        sort_field, descending = self.get_ordering(queryset)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            value, pk = self.decode_cursor(cursor)
+            lookup = 'lt' if descending else 'gt'
+            try:
+                queryset = queryset.filter(
+                    Q(**{f'{sort_field}__{lookup}': value})
+                    | Q(**{sort_field: value, f'pk__{lookup}': pk})
+                )
+            except (TypeError, ValueError, ValidationError):
+                # значение ключа в курсоре не подходит к полю сортировки:
+                raise NotFound(self.invalid_cursor_message)
+
+        # выбираем на один объект больше, чтобы узнать,
+        # есть ли следующая страница:
+        page = list(queryset[:self.limit + 1])
+        self.next_cursor = None
+        if len(page) > self.limit:
+            page = page[:self.limit]
+            last = page[-1]
+            self.next_cursor = self.encode_cursor(
+                getattr(last, sort_field),
+                last.pk,
+            )
+        return page
+
+    def get_paginated_response(self, data) -> Response:
+        return Response(
+            {
+                'items': data,
+                'nextCursor': self.next_cursor,
+            },
+            status=status.HTTP_200_OK
+        )
+
+    def get_paginated_response_schema(self, schema: dict) -> dict:
+        return {
+            'type': 'object',
+            'properties': {
+                'items': schema,
+                'nextCursor': {'type': 'string', 'nullable': True},
+            },
+        }
+
+
+class ReviewPagination(KeysetPagination):
+    """Постраничный вывод отзывов о товаре по курсору (date, id)."""
+
+    page_size = 10
@@ -0,0 +1,64 @@
+from datetime import datetime
+from typing import List, Optional
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import CACHE_PREFIX, bump_products_cache_version
+from .models import Product, ProductSale
+
+# время последнего запуска update_sales:
+LAST_RUN_KEY = f'{CACHE_PREFIX}:sales:last_run'
+
+
+def get_changed_sales(since: Optional[datetime], now: datetime) -> List[int]:
+    """
+    Возвращает id товаров, распродажа которых началась
+    или закончилась в промежутке (since, now].
+
+    Если since не задан, возвращаются все действующие распродажи.
+    """
+    if since is None:
+        return list(
+            ProductSale.objects.active(now).values_list('id', flat=True)
+        )
+    return list(
+        ProductSale.objects
+        .filter(
+            Q(dateFrom__gt=since, dateFrom__lte=now)
+            | Q(dateTo__gte=since, dateTo__lt=now)
+        )
+        .values_list('id', flat=True)
+    )
+
+
+def update_sales(now: Optional[datetime] = None) -> dict:
+    """
+    Пакетное начало и окончание распродаж (запускается по расписанию).
+
+    Цена товара при распродаже не меняется, цена со скидкой
+    применяется при чтении. Для товаров, распродажа которых началась
+    или закончилась с прошлого запуска, задача обновляет цену
+    для каталога (Product.current_price) и сбрасывает кэш информации
+    о товаре; при первом запуске цена обновляется у всех товаров.
+    Закончившиеся распродажи не удаляются (история распродаж),
+    при чтении они исключаются условием ProductSaleQuerySet.active.
+    """
+    now = now or timezone.now()
+    since = cache.get(LAST_RUN_KEY)
+    changed = get_changed_sales(since, now)
+
+    products = Product.objects.all()
+    if since is not None:
+        products = products.filter(id__in=changed)
+    with transaction.atomic():
+        products.update_current_price(now)
+        bump_products_cache_version(changed)
+
+    cache.set(LAST_RUN_KEY, now, timeout=None)
+    return {
+        'changed': len(changed),
+        'expired': ProductSale.objects.filter(dateTo__lt=now).count(),
+    }
@@ -0,0 +1,314 @@
+import re
+from typing import Iterable, List, Optional
+
+import snowballstemmer
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db import connection as default_connection
+from django.db.models import Q, Value, FloatField
+from django.db.models.expressions import RawSQL
+from django.db.models.query import QuerySet
+
+from .models import Product
+
+SEARCH_TABLE = 'myshop_product_search'
+
+WORD_PATTERN = re.compile(r'\w+')
+CYRILLIC_PATTERN = re.compile(r'[а-яё]')
+
+russian_stemmer = snowballstemmer.stemmer('russian')
+english_stemmer = snowballstemmer.stemmer('english')
+
+
+def get_words(text: str) -> List[str]:
+    """Разбивает текст на слова в нижнем регистре."""
+    return WORD_PATTERN.findall((text or '').lower())
+
+
+def stem_words(words: List[str]) -> List[str]:
+    """Приводит слова к основе (русские и английские слова)."""
+    return [
+        russian_stemmer.stemWord(word)
+        if CYRILLIC_PATTERN.search(word)
+        else english_stemmer.stemWord(word)
+        for word in words
+    ]
+
+
+def get_product_documents(product) -> tuple:
+    """
+    Возвращает текст товара для индексации: (название, остальной текст).
+
+    Теги и характеристики должны быть предзагружены (prefetch_related).
+    """
+    body = [
+        product.description,
+        product.fullDescription or '',
+        *(tag.name for tag in product.tags.all()),
+        *(
+            specification.value
+            for specification in product.specifications.all()
+        ),
+    ]
+    return product.title, ' '.join(body)
+
+
+class SearchBackend:
+    """
+    Базовый поисковый бэкенд: поиск через icontains.
+
+    Используется для СУБД без поддерживаемого полнотекстового поиска.
+    Бэкенды SQLite и Postgres хранят поисковый индекс в отдельной
+    таблице myshop_product_search; в индекс попадают название,
+    описания, теги и значения характеристик товара,
+    название имеет больший вес при ранжировании.
+    """
+
+    def __init__(self, connection=default_connection):
+        self.connection = connection
+
+    def create_table(self) -> None:
+        pass
+
+    def drop_table(self) -> None:
+        pass
+
+    def index(self, products: Iterable) -> int:
+        return 0
+
+    def remove(self, product_ids: Iterable[int]) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def search(self, queryset: QuerySet, text: str) -> QuerySet:
+        """
+        Фильтрует товары по поисковой строке.
+
+        Добавляет аннотацию search_rank - чем больше, тем выше релевантность.
+        """
+        words = get_words(text)
+        if not words:
+            return queryset
+
+        for word in words:
+            queryset = queryset.filter(
+                Q(title__icontains=word)
+                | Q(description__icontains=word)
+                | Q(fullDescription__icontains=word)
+            )
+        return queryset.annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    Поиск через виртуальную таблицу FTS5 SQLite (rowid = id товара).
+
+    FTS5 не умеет приводить русские слова к основе, поэтому слова
+    обрабатываются стеммером Snowball перед индексацией и поиском.
+    """
+
+    # веса колонок title и body для функции bm25:
+    rank_expression = f'bm25({SEARCH_TABLE}, 10.0, 1.0)'
+
+    def create_table(self) -> None:
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} '
+                f"USING fts5(title, body, tokenize='unicode61 remove_diacritics 2')"
+            )
+
+    def drop_table(self) -> None:
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def prepare_text(self, text: str) -> str:
+        return ' '.join(stem_words(get_words(text)))
+
+    def index(self, products: Iterable) -> int:
+        rows = list()
+        for product in products:
+            title, body = get_product_documents(product)
+            rows.append(
+                (product.id, self.prepare_text(title), self.prepare_text(body))
+            )
+        if not rows:
+            return 0
+
+        self.remove([row[0] for row in rows])
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, title, body) '
+                f'VALUES (%s, %s, %s)',
+                rows,
+            )
+        return len(rows)
+
+    def remove(self, product_ids: Iterable[int]) -> None:
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+                [(product_id,) for product_id in product_ids],
+            )
+
+    def clear(self) -> None:
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+
+    def get_match_query(self, text: str) -> str:
+        # каждое слово ищется как префикс основы: "дива"* "avant"*
+        return ' '.join(
+            f'"{stem}"*' for stem in stem_words(get_words(text))
+        )
+
+    def search(self, queryset: QuerySet, text: str) -> QuerySet:
+        match_query = self.get_match_query(text)
+        if not match_query:
+            return queryset
+
+        table = queryset.model._meta.db_table
+        return (
+            queryset
+            .filter(
+                id__in=RawSQL(
+                    f'SELECT rowid FROM {SEARCH_TABLE} '
+                    f'WHERE {SEARCH_TABLE} MATCH %s',
+                    (match_query,),
+                )
+            )
+            .annotate(
+                search_rank=RawSQL(
+                    f'SELECT -{self.rank_expression} FROM {SEARCH_TABLE} '
+                    f'WHERE {SEARCH_TABLE} MATCH %s '
+                    f'AND rowid = "{table}"."id"',
+                    (match_query,),
+                    output_field=FloatField(),
+                )
+            )
+        )
+
+
+class PostgresSearchBackend(SearchBackend):
+    """Поиск через tsvector (конфигурация 'russian') и индекс GIN Postgres."""
+
+    config = 'russian'
+
+    def create_table(self) -> None:
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ('
+                f'product_id bigint PRIMARY KEY '
+                f'REFERENCES myshop_product (id) ON DELETE CASCADE, '
+                f'document tsvector NOT NULL)'
+            )
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_idx '
+                f'ON {SEARCH_TABLE} USING GIN (document)'
+            )
+
+    def drop_table(self) -> None:
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def index(self, products: Iterable) -> int:
+        rows = [
+            (product.id, *get_product_documents(product))
+            for product in products
+        ]
+        if not rows:
+            return 0
+
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (product_id, document) '
+                f"VALUES (%s, setweight(to_tsvector('{self.config}', %s), 'A') "
+                f"|| setweight(to_tsvector('{self.config}', %s), 'B')) "
+                f'ON CONFLICT (product_id) DO UPDATE '
+                f'SET document = EXCLUDED.document',
+                rows,
+            )
+        return len(rows)
+
+    def remove(self, product_ids: Iterable[int]) -> None:
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE product_id = ANY(%s)',
+                (list(product_ids),),
+            )
+
+    def clear(self) -> None:
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {SEARCH_TABLE}')
+
+    def get_tsquery(self, text: str) -> str:
+        # каждое слово ищется как префикс: диван:* & avanti:*
+        return ' & '.join(f'{word}:*' for word in get_words(text))
+
+    def search(self, queryset: QuerySet, text: str) -> QuerySet:
+        tsquery = self.get_tsquery(text)
+        if not tsquery:
+            return queryset
+
+        table = queryset.model._meta.db_table
+        return (
+            queryset
+            .filter(
+                id__in=RawSQL(
+                    f'SELECT product_id FROM {SEARCH_TABLE} '
+                    f"WHERE document @@ to_tsquery('{self.config}', %s)",
+                    (tsquery,),
+                )
+            )
+            .annotate(
+                search_rank=RawSQL(
+                    f"SELECT ts_rank(document, to_tsquery('{self.config}', %s)) "
+                    f'FROM {SEARCH_TABLE} '
+                    f'WHERE product_id = "{table}"."id"',
+                    (tsquery,),
+                    output_field=FloatField(),
+                )
+            )
+        )
+
+
+SEARCH_BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend(connection=default_connection) -> SearchBackend:
+    """Возвращает поисковый бэкенд для СУБД подключения."""
+    backend_class = SEARCH_BACKENDS.get(connection.vendor, SearchBackend)
+    return backend_class(connection)
+
+
+def index_products(
+        product_ids: Iterable[int],
+        using: Optional[str] = None,
+) -> int:
+    """
+    Обновляет поисковый индекс для товаров с указанными id.
+
+    Товары читаются и индексируются в БД using (по умолчанию - default).
+    """
+    using = using or DEFAULT_DB_ALIAS
+    products = (
+        Product.objects
+        .using(using)
+        .filter(id__in=list(product_ids))
+        .prefetch_related('tags', 'specifications')
+    )
+    return get_search_backend(connections[using]).index(products)
+
+
+def remove_products(
+        product_ids: Iterable[int],
+        using: Optional[str] = None,
+) -> None:
+    """Удаляет товары с указанными id из поискового индекса БД using."""
+    get_search_backend(connections[using or DEFAULT_DB_ALIAS]).remove(
+        product_ids
+    )
@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Dict, Optional
 
 from rest_framework import serializers
 
@@ -15,16 +16,52 @@ from .models import (
     OrderProduct,
     Order,
 )
+from .thumbnails import get_thumbnail_urls
 
 
 # ОБЩИЕ СЕРИАЛИЗАТОРЫ:
 
 class ImageSerializer(serializers.ModelSerializer):
-    """Сериализатор для преобразования данных модели Image."""
+    """
+    Сериализатор для преобразования данных модели Image.
+
+    thumbnails - URL уменьшенных копий изображения и их версий WebP.
+    Если задан variant ('card', 'menu', 'full'), в src выводится
+    уменьшенная копия в формате WebP (исходное изображение, пока копии
+    не созданы); копия в исходном формате остается в thumbnails.
+    Формат не выбирается по заголовку Accept: ответы с изображениями
+    кэшируются без учета заголовков запроса.
+    """
+
+    thumbnails = serializers.SerializerMethodField()
 
     class Meta:
         model = Image
-        fields = 'src', 'alt'
+        fields = 'src', 'alt', 'thumbnails'
+
+    def __init__(self, *args, variant: Optional[str] = None, **kwargs):
+        self.variant = variant
+        super().__init__(*args, **kwargs)
+
+    def build_url(self, url: str) -> str:
+        # так же, как поле src (ImageField):
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_thumbnails(self, image: Image) -> Dict[str, Dict[str, str]]:
+        return {
+            variant: {
+                name: self.build_url(url)
+                for name, url in urls.items()
+            }
+            for variant, urls in get_thumbnail_urls(image).items()
+        }
+
+    def to_representation(self, image: Image) -> dict:
+        data = super().to_representation(image)
+        if self.variant in data['thumbnails']:
+            data['src'] = data['thumbnails'][self.variant]['webp']
+        return data
 
 
 # СЕРИАЛИЗАТОРЫ ДЛЯ ПРОФИЛЯ ПОЛЬЗОВАТЕЛЯ:
@@ -56,7 +93,7 @@ class UserPasswordSerializer(serializers.Serializer):
 class SubcategorySerializer(serializers.ModelSerializer):
     """Сериализатор для преобразования данных модели Subcategory."""
 
-    image = ImageSerializer(read_only=True)
+    image = ImageSerializer(read_only=True, variant='menu')
 
     class Meta:
         model = Subcategory
@@ -70,7 +107,7 @@ class SubcategorySerializer(serializers.ModelSerializer):
 class CategorySerializer(serializers.ModelSerializer):
     """Сериализатор для преобразования данных модели Category."""
 
-    image = ImageSerializer(read_only=True)
+    image = ImageSerializer(read_only=True, variant='menu')
     subcategories = SubcategorySerializer(read_only=True, many=True)
 
     class Meta:
@@ -93,6 +130,19 @@ class TagSerializer(serializers.ModelSerializer):
         fields = 'id', 'name',
 
 
+class TagFacetSerializer(TagSerializer):
+    """
+    Сериализатор для преобразования данных модели Tag.
+
+    Вывод тега с количеством товаров, к которым он относится.
+    """
+
+    count = serializers.IntegerField(read_only=True)
+
+    class Meta(TagSerializer.Meta):
+        fields = 'id', 'name', 'count'
+
+
 class SpecificationSerializer(serializers.ModelSerializer):
     """Сериализатор для преобразования данных модели Specification."""
 
@@ -132,14 +182,31 @@ class ProductFullSerializer(serializers.ModelSerializer):
         read_only=True,
         format='%a %b %d %Y %H:%M:%S %Z%z (Central European Standard Time)'
     )
-    images = ImageSerializer(read_only=True, many=True)
+    # цена с учетом действующей распродажи:
+    price = serializers.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        read_only=True,
+        source='effective_price',
+    )
+    images = ImageSerializer(read_only=True, many=True, variant='full')
     tags = TagSerializer(read_only=True, many=True)
-    reviews = ReviewSerializer(read_only=True, many=True)
+    # последние отзывы (см. ProductView), остальные отзывы
+    # загружаются постранично: GET /api/product/<id>/reviews
+    reviews = ReviewSerializer(
+        read_only=True,
+        many=True,
+        source='latest_reviews',
+    )
+    reviewsCount = serializers.IntegerField(
+        read_only=True,
+        source='reviews_count',
+    )
     specifications = SpecificationSerializer(read_only=True, many=True)
 
     class Meta:
         model = Product
-        fields = '__all__'
+        exclude = 'reviews_count', 'rating_sum', 'current_price'
 
 
 # СЕРИАЛИЗАТОРЫ ДЛЯ КАТАЛОГА ТОВАРОВ:
@@ -155,16 +222,28 @@ class ProductShortSerializer(serializers.ModelSerializer):
         read_only=True,
         format='%a %b %d %Y %H:%M:%S %Z%z (Central European Standard Time)'
     )
-    images = ImageSerializer(read_only=True, many=True)
+    # цена с учетом действующей распродажи:
+    price = serializers.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        read_only=True,
+        source='effective_price',
+    )
+    images = ImageSerializer(read_only=True, many=True, variant='card')
     tags = TagSerializer(read_only=True, many=True)
     reviews = serializers.IntegerField(
         read_only=True,
-        source='reviews.count',
+        source='reviews_count',
     )
 
     class Meta:
         model = Product
-        exclude = 'fullDescription',
+        exclude = (
+            'fullDescription',
+            'reviews_count',
+            'rating_sum',
+            'current_price',
+        )
 
 
 class ProductSaleSerializer(serializers.ModelSerializer):
@@ -178,22 +257,57 @@ class ProductSaleSerializer(serializers.ModelSerializer):
         read_only=True,
         format='%m-%d'
     )
-    images = ImageSerializer(read_only=True, many=True)
+    # исходная цена, название и изображения берутся из товара:
+    price = serializers.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        read_only=True,
+        source='id.price',
+    )
+    title = serializers.CharField(read_only=True, source='id.title')
+    images = ImageSerializer(
+        read_only=True,
+        many=True,
+        source='id.images',
+        variant='card',
+    )
 
     class Meta:
         model = ProductSale
-        fields = '__all__'
+        fields = (
+            'id',
+            'price',
+            'salePrice',
+            'dateFrom',
+            'dateTo',
+            'title',
+            'images',
+        )
 
 
 # СЕРИАЛИЗАТОРЫ ДЛЯ ЗАКАЗОВ:
 
 class OrderProductSerializer(serializers.ModelSerializer):
-    """Сериализатор для преобразования данных модели OrderProduct."""
+    """
+    Сериализатор для преобразования данных модели OrderProduct.
+
+    Товары заказа хранятся в таблице OrderProduct в формате
+    "товар-количество", но в заказе выводится информация о товаре
+    в соответствии с сериализатором ProductShortSerializer,
+    в которой count заменен на количество товара в заказе.
+    """
 
     class Meta:
         model = OrderProduct
         fields = '__all__'
 
+    def to_representation(self, instance: OrderProduct) -> dict:
+        data = super().to_representation(instance)
+        data.update(ProductShortSerializer(instance.product).data)
+        data['id'] = instance.product_id
+        data['count'] = instance.count
+        return data
+
 
 class OrderSerializer(serializers.ModelSerializer):
     """Сериализатор для преобразования данных модели Order."""
@@ -0,0 +1,145 @@
+import random
+import time
+from typing import List, Optional
+
+from django.conf import settings
+from django.db.models import Min
+
+from .cache import (
+    BANNER_POOL,
+    PRODUCT_RAILS,
+    bump_cache_version,
+    get_cached_payload,
+)
+from .models import Product
+
+# количество товаров на баннере главной страницы:
+BANNERS_COUNT = 3
+# количество товаров в подборках главной страницы:
+POPULAR_COUNT = 8
+LIMITED_COUNT = 16
+
+
+def get_showcase_timeout() -> int:
+    """Время (в секундах) хранения данных главной страницы в кэше."""
+    return getattr(settings, 'SHOWCASE_CACHE_TIMEOUT', 10 * 60)
+
+
+def build_banner_pool() -> List[int]:
+    """
+    Формирует пул товаров для баннеров.
+
+    Один запрос с группировкой: по одному товару в наличии
+    (с наименьшим id) из каждой непустой подкатегории.
+    """
+    return list(
+        Product.objects
+        .filter(count__gt=0)
+        .values('category')
+        .annotate(product_id=Min('id'))
+        .order_by('category')
+        .values_list('product_id', flat=True)
+    )
+
+
+def get_banner_pool() -> List[int]:
+    """
+    Возвращает пул товаров для баннеров из кэша.
+
+    Пул пересчитывается при изменении товаров (версия кэша меняется
+    сигналами) и по истечении времени SHOWCASE_CACHE_TIMEOUT.
+    """
+    return get_cached_payload(
+        BANNER_POOL,
+        'pool',
+        build_banner_pool,
+        timeout=get_showcase_timeout(),
+    )['data']
+
+
+def choose_banners(
+        pool: List[int],
+        count: int = BANNERS_COUNT,
+        slot: Optional[int] = None,
+) -> List[int]:
+    """
+    Выбирает id товаров для баннеров из пула без обращения к БД.
+
+    Выбор зависит только от пула и номера периода (slot), поэтому
+    в течение периода все процессы сервера показывают одни и те же товары.
+    """
+    if slot is None:
+        slot = int(time.time() // get_showcase_timeout())
+    return random.Random(slot).sample(pool, min(count, len(pool)))
+
+
+def build_popular_products() -> List[int]:
+    """Популярные товары - с наибольшим рейтингом (индекс по rating, id)."""
+    return list(
+        Product.objects
+        .order_by('-rating', '-id')
+        .values_list('id', flat=True)[:POPULAR_COUNT]
+    )
+
+
+def build_limited_products() -> List[int]:
+    """Товары ограниченного тиража - осталось 1-2 штуки."""
+    return list(
+        Product.objects
+        .filter(count__range=(1, 2))
+        .order_by('id')
+        .values_list('id', flat=True)[:LIMITED_COUNT]
+    )
+
+
+PRODUCT_RAIL_BUILDERS = {
+    'popular': build_popular_products,
+    'limited': build_limited_products,
+}
+
+
+def get_product_rail(name: str) -> List[int]:
+    """
+    Возвращает id товаров подборки главной страницы ('popular', 'limited').
+
+    Подборки хранятся в кэше и пересчитываются после изменения товаров,
+    отзывов и остатков на складе (версия кэша меняется сигналами)
+    или по истечении времени SHOWCASE_CACHE_TIMEOUT,
+    а также командой rebuild_showcase.
+    """
+    return get_cached_payload(
+        PRODUCT_RAILS,
+        name,
+        PRODUCT_RAIL_BUILDERS[name],
+        timeout=get_showcase_timeout(),
+    )['data']
+
+
+def load_products(product_ids: List[int], **filters) -> List[Product]:
+    """
+    Загружает товары для ProductShortSerializer в порядке product_ids.
+
+    Товары, не подходящие под фильтры (например, закончившиеся
+    после формирования подборки), пропускаются.
+    """
+    products = (
+        Product.objects
+        .with_short_info()
+        .filter(**filters)
+        .in_bulk(product_ids)
+    )
+    return [
+        products[product_id]
+        for product_id in product_ids
+        if product_id in products
+    ]
+
+
+def rebuild_showcase() -> dict:
+    """Пересчитывает пул баннеров и подборки главной страницы."""
+    bump_cache_version(BANNER_POOL)
+    bump_cache_version(PRODUCT_RAILS)
+    sizes = {'banners': len(get_banner_pool())}
+    for name in PRODUCT_RAIL_BUILDERS:
+        sizes[name] = len(get_product_rail(name))
+    return sizes
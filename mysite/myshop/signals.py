@@ -0,0 +1,302 @@
+from django.db.models.signals import (
+    post_save,
+    post_delete,
+    pre_save,
+    pre_delete,
+    m2m_changed,
+)
+from django.dispatch import receiver
+
+from .cache import (
+    CATEGORIES_MENU,
+    TAG_FACETS,
+    BANNER_POOL,
+    PRODUCT_RAILS,
+    bump_cache_version_on_commit,
+    bump_products_cache_version,
+)
+from .models import (
+    Image,
+    Category,
+    Subcategory,
+    Product,
+    Tag,
+    Specification,
+    Review,
+    ProductSale,
+)
+from .search import index_products, remove_products
+
+# поля товара со связью "многие ко многим"
+# (по промежуточной таблице и по связанной модели):
+PRODUCT_RELATIONS = {
+    Product.images.through: 'images',
+    Product.tags.through: 'tags',
+    Product.specifications.through: 'specifications',
+}
+PRODUCT_RELATED_MODELS = {
+    Image: 'images',
+    Tag: 'tags',
+    Specification: 'specifications',
+}
+
+
+# ИЗМЕНЕНИЕ СВЯЗЕЙ ТОВАРОВ:
+
+@receiver(m2m_changed, sender=Product.images.through)
+@receiver(m2m_changed, sender=Product.tags.through)
+@receiver(m2m_changed, sender=Product.specifications.through)
+def remember_cleared_products(
+        sender,
+        instance,
+        action: str,
+        reverse: bool,
+        **kwargs
+) -> None:
+    # при очистке связей со стороны тега/характеристики/изображения
+    # (например, tag.product_tag.clear()) pk_set не передается,
+    # id товаров запоминаются до удаления связей:
+    if reverse and action == 'pre_clear':
+        instance._cleared_product_ids = list(
+            Product.objects
+            .using(kwargs.get('using'))
+            .filter(**{PRODUCT_RELATIONS[sender]: instance})
+            .values_list('id', flat=True)
+        )
+
+
+def get_changed_product_ids(instance, action: str, reverse: bool, pk_set):
+    """Возвращает id товаров, связи которых изменены (m2m_changed)."""
+    if not reverse:
+        return [instance.id]
+    if action == 'post_clear':
+        return getattr(instance, '_cleared_product_ids', [])
+    return pk_set or []
+
+
+# СБРОС КЭША МЕНЮ КАТЕГОРИЙ:
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Subcategory)
+@receiver(post_delete, sender=Subcategory)
+def invalidate_categories_menu(sender, **kwargs) -> None:
+    bump_cache_version_on_commit(CATEGORIES_MENU, using=kwargs.get('using'))
+
+
+@receiver(post_save, sender=Image)
+def invalidate_categories_menu_image(sender, instance: Image, **kwargs) -> None:
+    # изображения используются не только в меню (аватары, товары),
+    # кэш сбрасывается, только если изображение относится к категории:
+    using = kwargs.get('using')
+    if (
+            Category.objects.using(using).filter(image=instance).exists()
+            or Subcategory.objects.using(using).filter(image=instance).exists()
+    ):
+        bump_cache_version_on_commit(CATEGORIES_MENU, using=using)
+
+
+@receiver(post_delete, sender=Image)
+def invalidate_categories_menu_deleted_image(sender, **kwargs) -> None:
+    # ссылки категорий на удаленное изображение к этому моменту
+    # уже очищены (SET_NULL), проверить их нельзя:
+    bump_cache_version_on_commit(CATEGORIES_MENU, using=kwargs.get('using'))
+
+
+# СБРОС КЭША ТЕГОВ С КОЛИЧЕСТВОМ ТОВАРОВ:
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(m2m_changed, sender=Product.tags.through)
+def invalidate_tag_facets(sender, **kwargs) -> None:
+    if kwargs.get('action', 'post_').startswith('post_'):
+        bump_cache_version_on_commit(TAG_FACETS, using=kwargs.get('using'))
+
+
+# СБРОС ДАННЫХ ГЛАВНОЙ СТРАНИЦЫ (БАННЕРЫ И ПОДБОРКИ ТОВАРОВ):
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_showcase(sender, **kwargs) -> None:
+    bump_cache_version_on_commit(
+        BANNER_POOL,
+        PRODUCT_RAILS,
+        using=kwargs.get('using'),
+    )
+
+
+# ОБНОВЛЕНИЕ РЕЙТИНГА И КОЛИЧЕСТВА ОТЗЫВОВ ТОВАРА:
+
+@receiver(pre_save, sender=Review)
+def remember_review_rate(sender, instance: Review, **kwargs) -> None:
+    # при изменении отзыва (админка) из рейтинга исключается
+    # прежняя оценка, в том числе при переносе отзыва на другой товар:
+    if instance.pk is None or kwargs.get('raw'):
+        return
+    instance._previous_review = (
+        Review.objects
+        .using(kwargs.get('using'))
+        .filter(pk=instance.pk)
+        .values_list('product_id', 'rate')
+        .first()
+    )
+
+
+@receiver(post_save, sender=Review)
+def count_saved_review(
+        sender,
+        instance: Review,
+        created: bool,
+        **kwargs
+) -> None:
+    if kwargs.get('raw'):
+        return
+    products = Product.objects.using(kwargs.get('using'))
+    previous = None if created else instance._previous_review
+    if previous == (instance.product_id, instance.rate):
+        return
+    if previous is not None:
+        product_id, rate = previous
+        products.filter(id=product_id).remove_review(rate)
+    products.filter(id=instance.product_id).add_review(instance.rate)
+
+
+@receiver(post_delete, sender=Review)
+def count_deleted_review(sender, instance: Review, **kwargs) -> None:
+    Product.objects.using(kwargs.get('using')).filter(
+        id=instance.product_id
+    ).remove_review(instance.rate)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_product_rails(sender, **kwargs) -> None:
+    # рейтинг товара обновляется сигналами выше
+    # в той же транзакции, что и отзыв:
+    bump_cache_version_on_commit(PRODUCT_RAILS, using=kwargs.get('using'))
+
+
+# ОБНОВЛЕНИЕ ПОИСКОВОГО ИНДЕКСА ТОВАРОВ:
+
+@receiver(post_save, sender=Product)
+def index_saved_product(sender, instance: Product, **kwargs) -> None:
+    index_products([instance.id], using=kwargs.get('using'))
+
+
+@receiver(post_delete, sender=Product)
+def remove_deleted_product(sender, instance: Product, **kwargs) -> None:
+    remove_products([instance.id], using=kwargs.get('using'))
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+@receiver(m2m_changed, sender=Product.specifications.through)
+def index_product_relations(
+        sender,
+        instance,
+        action: str,
+        reverse: bool,
+        pk_set,
+        **kwargs
+) -> None:
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        index_products(
+            get_changed_product_ids(instance, action, reverse, pk_set),
+            using=kwargs.get('using'),
+        )
+
+
+@receiver(post_save, sender=Tag)
+def index_tag_products(sender, instance: Tag, created: bool, **kwargs) -> None:
+    if not created:
+        index_products(
+            instance.product_tag.values_list('id', flat=True),
+            using=kwargs.get('using'),
+        )
+
+
+@receiver(post_save, sender=Specification)
+def index_specification_products(
+        sender,
+        instance: Specification,
+        created: bool,
+        **kwargs
+) -> None:
+    if not created:
+        index_products(
+            instance.product_specification.values_list('id', flat=True),
+            using=kwargs.get('using'),
+        )
+
+
+# ОБНОВЛЕНИЕ ЦЕНЫ ТОВАРА С УЧЕТОМ РАСПРОДАЖИ:
+
+@receiver(post_save, sender=ProductSale)
+@receiver(post_delete, sender=ProductSale)
+def update_sale_product_price(sender, instance: ProductSale, **kwargs) -> None:
+    # id распродажи совпадает с id товара; начало и окончание
+    # распродажи по времени учитывает задача update_sales:
+    Product.objects.using(kwargs.get('using')).filter(
+        id=instance.pk
+    ).update_current_price()
+
+
+# СБРОС КЭША ИНФОРМАЦИИ О ТОВАРЕ:
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductSale)
+@receiver(post_delete, sender=ProductSale)
+def invalidate_product_detail(sender, instance, **kwargs) -> None:
+    # id распродажи совпадает с id товара:
+    bump_products_cache_version([instance.pk])
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_product_detail_review(
+        sender,
+        instance: Review,
+        **kwargs
+) -> None:
+    bump_products_cache_version([instance.product_id])
+
+
+@receiver(m2m_changed, sender=Product.images.through)
+@receiver(m2m_changed, sender=Product.tags.through)
+@receiver(m2m_changed, sender=Product.specifications.through)
+def invalidate_product_detail_relations(
+        sender,
+        instance,
+        action: str,
+        reverse: bool,
+        pk_set,
+        **kwargs
+) -> None:
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_products_cache_version(
+            get_changed_product_ids(instance, action, reverse, pk_set)
+        )
+
+
+@receiver(post_save, sender=Image)
+@receiver(pre_delete, sender=Image)
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+@receiver(post_save, sender=Specification)
+@receiver(pre_delete, sender=Specification)
+def invalidate_product_detail_related_object(
+        sender,
+        instance,
+        **kwargs
+) -> None:
+    # изменено или удаляется изображение/тег/характеристика товаров
+    # (при удалении связи удаляются без сигнала m2m_changed):
+    if kwargs.get('created'):
+        return
+    bump_products_cache_version(
+        Product.objects
+        .filter(**{PRODUCT_RELATED_MODELS[sender]: instance})
+        .values_list('id', flat=True)
+    )
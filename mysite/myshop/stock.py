@@ -0,0 +1,103 @@
+from typing import Dict, List, Optional
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .cache import (
+    BANNER_POOL,
+    PRODUCT_RAILS,
+    bump_cache_version_on_commit,
+    bump_products_cache_version,
+)
+from .models import Product, Order
+
+
+class InsufficientStock(Exception):
+    """Товара в наличии меньше, чем требуется в заказе."""
+
+    def __init__(self, product_ids: List[int]):
+        self.product_ids = product_ids
+        super().__init__(f'Not enough products in stock: {product_ids}.')
+
+
+def get_required_count(products_count: Dict[int, int]) -> Case:
+    """Выражение: требуемое количество для каждого id товара."""
+    return Case(
+        *[
+            When(id=product_id, then=Value(count))
+            for product_id, count in products_count.items()
+        ],
+        output_field=IntegerField(),
+    )
+
+
+def reserve_stock(
+        products_count: Dict[int, int],
+        using: str = DEFAULT_DB_ALIAS,
+) -> None:
+    """
+    Списывает товары со склада: {id товара: количество}.
+
+    Все позиции списываются одним запросом UPDATE с условием
+    count >= требуемого количества, поэтому одновременные заказы
+    не перезаписывают изменения друг друга. Если какого-либо товара
+    не хватает, изменения отменяются и выбрасывается InsufficientStock.
+    """
+    if not products_count:
+        return
+
+    required = get_required_count(products_count)
+    products = Product.objects.using(using).filter(id__in=list(products_count))
+    try:
+        with transaction.atomic(using=using):
+            updated = (
+                products
+                .filter(count__gte=required)
+                .update(count=F('count') - required)
+            )
+            if updated != len(products_count):
+                raise InsufficientStock([])
+            # количество товара в наличии выводится в информации о товаре
+            # и учитывается в подборках главной страницы:
+            bump_products_cache_version(products_count, using=using)
+            bump_cache_version_on_commit(
+                BANNER_POOL,
+                PRODUCT_RAILS,
+                using=using,
+            )
+    except InsufficientStock:
+        available = products.filter(count__gte=required).values_list(
+            'id',
+            flat=True,
+        )
+        raise InsufficientStock(sorted(set(products_count) - set(available)))
+
+
+def reserve_order_stock(order: Order, using: Optional[str] = None) -> bool:
+    """
+    Подтверждает заказ и списывает его товары со склада.
+
+    Статус меняется запросом с условием status='created':
+    повторное (в том числе одновременное) подтверждение заказа
+    не списывает товары второй раз, в этом случае возвращается False.
+    """
+    using = using or order._state.db or DEFAULT_DB_ALIAS
+    with transaction.atomic(using=using):
+        confirmed = (
+            Order.objects.using(using)
+            .filter(id=order.id, status='created')
+            .update(status='accepted')
+        )
+        if not confirmed:
+            return False
+
+        # один товар может встречаться в заказе несколько раз:
+        products_count = dict()
+        for product_id, count in (
+                order.products.using(using).values_list('product_id', 'count')
+        ):
+            products_count[product_id] = products_count.get(product_id, 0) + count
+        reserve_stock(products_count, using=using)
+
+    order.status = 'accepted'
+    return True
@@ -1,3 +1,1950 @@
-from django.test import TestCase
+import base64
+import csv
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image as PILImage
+
+from .models import (
+    Image,
+    Category,
+    Subcategory,
+    Tag,
+    Specification,
+    Product,
+    Review,
+    OrderProduct,
+    Order,
+    Profile,
+    ProductSale,
+    CatalogImport,
+)
+from .cache import (
+    CATEGORIES_MENU,
+    get_cache_version,
+    get_cached_payload,
+    get_version_key,
+)
+from .images import (
+    build_image_index,
+    normalize_image_name,
+    register_directory_images,
+)
+from .imports import run_import
+from .management.commands.upload_categories_to_db import create_category
+from .management.commands.upload_products_to_db import create_product
+from .management.commands.upload_sales_to_db import (
+    SaleImportError,
+    create_sales,
+)
+from .sales import update_sales
+from .serializers import ImageSerializer
+from .search import get_search_backend
+from .stock import InsufficientStock, reserve_stock
+from .thumbnails import generate_missing_thumbnails
+
+def create_products(subcategory: Subcategory, amount: int) -> list:
+    """
+    Вспомогательная функция.
+
+    Создает товары подкатегории с изображением, тегами и отзывами.
+    """
+    tags = [Tag.objects.create(name=f'тег {i}') for i in range(2)]
+    products = list()
+    for i in range(amount):
+        product = Product.objects.create(
+            category=subcategory,
+            price=100 + i,
+            count=5,
+            title=f'Товар {i}',
+            description='Описание товара',
+            rating=4,
+        )
+        product.images.add(Image.objects.create(src=f'images/{i}.png'))
+        product.tags.add(*tags)
+        for rate in range(1, 3):
+            Review.objects.create(
+                author='Иван',
+                email='ivan@example.com',
+                rate=rate,
+                product=product,
+            )
+        product.refresh_from_db()
+        products.append(product)
+    return products
+
+
+class CatalogViewTestCase(TestCase):
+    """Тесты представления CatalogView."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Диваны и кресла')
+        cls.subcategory = Subcategory.objects.create(
+            title='Прямые диваны',
+            categories=category,
+        )
+        create_products(cls.subcategory, 20)
+
+    def get_catalog(self, limit: int, current_page: int = 1, **params):
+        return self.client.get(
+            '/api/catalog',
+            {
+                'filter[name]': '',
+                'filter[minPrice]': 0,
+                'filter[maxPrice]': 1000,
+                'filter[freeDelivery]': 'false',
+                'filter[available]': 'true',
+                'currentPage': current_page,
+                'category': self.subcategory.id,
+                'sort': 'price',
+                'sortType': 'dec',
+                'limit': limit,
+                **params,
+            },
+        )
+
+    def test_catalog_items(self):
+        response = self.get_catalog(limit=5)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['items']), 5)
+        self.assertEqual(response.data['lastPage'], 4)
+
+        item = response.data['items'][0]
+        self.assertEqual(item['reviews'], 2)
+        self.assertEqual(len(item['images']), 1)
+        self.assertEqual(len(item['tags']), 2)
+
+    def test_catalog_query_count_does_not_depend_on_page_size(self):
+        with CaptureQueriesContext(connection) as small_page:
+            self.get_catalog(limit=2)
+        with CaptureQueriesContext(connection) as large_page:
+            self.get_catalog(limit=20)
+
+        self.assertEqual(len(small_page), len(large_page))
+
+    def test_catalog_pagination_with_tags(self):
+        tag = Tag.objects.first()
+        with self.assertNumQueries(4):
+            response = self.get_catalog(
+                limit=6,
+                current_page=2,
+                **{'tags[]': [tag.id]},
+            )
+
+        self.assertEqual(len(response.data['items']), 6)
+        self.assertEqual(response.data['currentPage'], 2)
+        self.assertEqual(response.data['lastPage'], 4)
+
+    def test_catalog_page_out_of_range(self):
+        response = self.get_catalog(limit=5, current_page=10)
+
+        self.assertEqual(response.data['items'], [])
+        self.assertEqual(response.data['currentPage'], 10)
+        self.assertEqual(response.data['lastPage'], 4)
+
+    def test_catalog_cursor_pagination(self):
+        for sort in ('rating', 'price', 'reviews', 'date'):
+            for sort_type in ('inc', 'dec'):
+                ids = list()
+                cursor = ''
+                while cursor is not None:
+                    response = self.get_catalog(
+                        limit=6,
+                        sort=sort,
+                        sortType=sort_type,
+                        cursor=cursor,
+                    )
+                    ids.extend(item['id'] for item in response.data['items'])
+                    cursor = response.data['nextCursor']
+
+                self.assertEqual(len(ids), 20)
+                self.assertEqual(len(set(ids)), 20)
+                if sort == 'price':
+                    # цены товаров возрастают вместе с id:
+                    self.assertEqual(
+                        ids,
+                        sorted(ids, reverse=sort_type == 'inc'),
+                    )
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite query plan')
+    def test_catalog_price_sort_uses_index(self):
+        response = self.get_catalog(limit=5)
+        queryset = response.renderer_context['view'].get_queryset()
+
+        plan = queryset[:5].explain()
+        self.assertIn('product_category_price_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_catalog_invalid_cursor(self):
+        response = self.get_catalog(limit=5, cursor='invalid')
+
+        self.assertEqual(response.status_code, 404)
+
+
+class ReviewViewTestCase(TestCase):
+    """Тесты представления ReviewView."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Диваны и кресла')
+        subcategory = Subcategory.objects.create(
+            title='Прямые диваны',
+            categories=category,
+        )
+        cls.product, = create_products(subcategory, 1)
+
+    def test_review_updates_reviews_count(self):
+        response = self.client.post(
+            f'/api/product/{self.product.id}/reviews',
+            {
+                'author': 'Иван',
+                'email': 'ivan@example.com',
+                'text': 'Отличный диван',
+                'rate': 5,
+            },
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reviews_count, 3)
+        # рейтинг - средняя оценка отзывов: (1 + 2 + 5) / 3
+        self.assertEqual(self.product.rating_sum, 8)
+        self.assertEqual(self.product.rating, Decimal('2.7'))
+
+    def test_invalid_review(self):
+        response = self.client.post(
+            f'/api/product/{self.product.id}/reviews',
+            {'author': 'Иван', 'rate': 10},
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reviews_count, 2)
+
+    def test_reviews_changed_outside_view_update_rating(self):
+        review = Review.objects.filter(product=self.product).first()
+        review.rate = 5
+        review.save()
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reviews_count, 2)
+        self.assertEqual(self.product.rating_sum, 7)
+        self.assertEqual(self.product.rating, Decimal('3.5'))
+
+        review.delete()
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reviews_count, 1)
+        self.assertEqual(self.product.rating_sum, 2)
+        self.assertEqual(self.product.rating, Decimal('2.0'))
+
+    def test_first_review_replaces_imported_rating(self):
+        product = Product.objects.create(
+            category=self.product.category,
+            price=100,
+            title='Кресло',
+            description='Описание товара',
+            rating=Decimal('4.9'),
+        )
+        review = Review.objects.create(
+            author='Иван',
+            email='ivan@example.com',
+            rate=3,
+            product=product,
+        )
+        product.refresh_from_db()
+        self.assertEqual(product.rating, Decimal('3.0'))
+
+        # после удаления последнего отзыва рейтинг не меняется:
+        review.delete()
+        product.refresh_from_db()
+        self.assertEqual(product.reviews_count, 0)
+        self.assertEqual(product.rating_sum, 0)
+        self.assertEqual(product.rating, Decimal('3.0'))
+
+    def test_recompute_ratings(self):
+        Product.objects.filter(id=self.product.id).update(
+            reviews_count=10,
+            rating_sum=0,
+            rating=1,
+        )
+
+        call_command('recompute_ratings', stdout=StringIO())
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.reviews_count, 2)
+        self.assertEqual(self.product.rating_sum, 3)
+        self.assertEqual(self.product.rating, Decimal('1.5'))
+
+
+class ProductReviewsTestCase(TestCase):
+    """Тесты вывода отзывов о товаре (ProductView и ReviewView)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Диваны и кресла')
+        subcategory = Subcategory.objects.create(
+            title='Прямые диваны',
+            categories=category,
+        )
+        cls.product, = create_products(subcategory, 1)
+        for i in range(20):
+            Review.objects.create(
+                author=f'Автор {i}',
+                email='ivan@example.com',
+                rate=5,
+                product=cls.product,
+            )
+        Product.objects.filter(id=cls.product.id).update(reviews_count=22)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_product_contains_latest_reviews(self):
+        response = self.client.get(f'/api/product/{self.product.id}')
+
+        self.assertEqual(response.data['reviewsCount'], 22)
+        self.assertEqual(
+            [review['author'] for review in response.data['reviews']],
+            [f'Автор {i}' for i in range(19, 14, -1)],
+        )
+
+    def test_reviews_pagination(self):
+        authors = list()
+        cursor = None
+        while True:
+            params = {'limit': 8}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get(
+                f'/api/product/{self.product.id}/reviews',
+                params,
+            )
+            self.assertLessEqual(len(response.data['items']), 8)
+            authors.extend(review['author'] for review in response.data['items'])
+            cursor = response.data['nextCursor']
+            if cursor is None:
+                break
+
+        self.assertEqual(
+            authors,
+            [f'Автор {i}' for i in range(19, -1, -1)] + ['Иван', 'Иван'],
+        )
+
+    def test_reviews_invalid_cursor(self):
+        cursor = base64.urlsafe_b64encode(b'["not a date", 1]').decode()
+
+        response = self.client.get(
+            f'/api/product/{self.product.id}/reviews',
+            {'cursor': cursor},
+        )
+
+        self.assertEqual(response.status_code, 404)
+
+
+class ProductViewCacheTestCase(TestCase):
+    """Тесты кэширования информации о товаре (ProductView)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Диваны и кресла')
+        cls.subcategory = Subcategory.objects.create(
+            title='Прямые диваны',
+            categories=category,
+        )
+        cls.product, cls.other_product = create_products(cls.subcategory, 2)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_product(self, product: Product, **headers):
+        return self.client.get(f'/api/product/{product.id}', **headers)
+
+    def test_product_is_cached(self):
+        with self.assertNumQueries(5):
+            self.get_product(self.product)
+        with self.assertNumQueries(0):
+            response = self.get_product(self.product)
+
+        self.assertEqual(response.data['title'], self.product.title)
+
+    def test_conditional_get(self):
+        etag = self.get_product(self.product)['ETag']
+
+        response = self.get_product(self.product, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_product_change_invalidates_only_its_cache(self):
+        self.get_product(self.product)
+        self.get_product(self.other_product)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.title = 'Новый диван'
+            self.product.save()
+
+        with self.assertNumQueries(0):
+            self.get_product(self.other_product)
+        self.assertEqual(
+            self.get_product(self.product).data['title'],
+            'Новый диван',
+        )
+
+    def test_review_invalidates_cache(self):
+        self.get_product(self.product)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                f'/api/product/{self.product.id}/reviews',
+                {'author': 'Петр', 'email': 'petr@example.com', 'rate': 5},
+            )
+
+        response = self.get_product(self.product)
+        self.assertEqual(response.data['reviewsCount'], 3)
+        self.assertEqual(response.data['reviews'][0]['author'], 'Петр')
+
+    def test_relations_change_invalidates_cache(self):
+        self.get_product(self.product)
+        tag = Tag.objects.create(name='Новинка')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.product_tag.add(self.product)
+        self.assertIn(
+            'Новинка',
+            [tag['name'] for tag in self.get_product(self.product).data['tags']],
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.delete()
+        self.assertNotIn(
+            'Новинка',
+            [tag['name'] for tag in self.get_product(self.product).data['tags']],
+        )
+
+
+class ProductBannersSaleViewTestCase(TestCase):
+    """Тесты представления ProductBannersSaleView."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Диваны и кресла')
+        subcategories = [
+            Subcategory.objects.create(
+                title=f'Подкатегория {i}',
+                categories=category,
+            )
+            for i in range(4)
+        ]
+        cls.products = list()
+        for subcategory in subcategories[:2]:
+            cls.products.extend(create_products(subcategory, 2))
+        # товары подкатегории закончились:
+        out_of_stock = create_products(subcategories[2], 1)
+        Product.objects.filter(
+            id__in=[product.id for product in out_of_stock]
+        ).update(count=0)
+        # подкатегория subcategories[3] - без товаров
+
+    def setUp(self):
+        cache.clear()
+
+    def test_banners_from_non_empty_subcategories(self):
+        response = self.client.get('/api/banners')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(product['id'] for product in response.data),
+            [self.products[0].id, self.products[2].id],
+        )
+
+    def test_banners_query_count(self):
+        self.client.get('/api/banners')
+
+        # пул товаров в кэше: выбираются только сами товары
+        # (и их изображения, теги, характеристики):
+        with self.assertNumQueries(4):
+            self.client.get('/api/banners')
+
+
+class ProductRailsTestCase(TestCase):
+    """Тесты подборок товаров главной страницы (популярные, ограниченные)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Диваны и кресла')
+        subcategory = Subcategory.objects.create(
+            title='Прямые диваны',
+            categories=category,
+        )
+        cls.products = create_products(subcategory, 10)
+        for rating, product in enumerate(cls.products):
+            Product.objects.filter(id=product.id).update(
+                rating=rating % 5,
+                count=rating % 3,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_popular_products(self):
+        response = self.client.get('/api/products/popular')
+
+        self.assertEqual(
+            [product['id'] for product in response.data],
+            [
+                product.id
+                for product in sorted(
+                    self.products,
+                    key=lambda product: (
+                        -(self.products.index(product) % 5),
+                        -product.id,
+                    ),
+                )
+            ][:8],
+        )
+
+    def test_limited_products(self):
+        response = self.client.get('/api/products/limited')
+
+        self.assertEqual(
+            [product['id'] for product in response.data],
+            [
+                product.id
+                for i, product in enumerate(self.products)
+                if i % 3 in (1, 2)
+            ],
+        )
+
+    def test_rails_are_not_rebuilt_per_request(self):
+        self.client.get('/api/products/popular')
+
+        # товары загружаются по id из подборки (без сортировки каталога):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/products/popular')
+        self.assertEqual(len(queries), 4)
+        self.assertNotIn('ORDER BY', queries[0]['sql'])
+
+    def test_review_rebuilds_popular_products(self):
+        self.client.get('/api/products/popular')
+        product = self.products[0]
+        Product.objects.filter(id=product.id).update(
+            rating_sum=40,
+            reviews_count=8,
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                f'/api/product/{product.id}/reviews',
+                {'author': 'Петр', 'email': 'petr@example.com', 'rate': 5},
+            )
+
+        response = self.client.get('/api/products/popular')
+        self.assertEqual(response.data[0]['id'], product.id)
+
+    def test_rebuild_showcase_command(self):
+        stdout = StringIO()
+
+        call_command('rebuild_showcase', stdout=stdout)
+
+        self.assertIn('popular: 8', stdout.getvalue())
+        self.assertIn('limited: 6', stdout.getvalue())
+
+
+class ProductSaleTestCase(TestCase):
+    """Тесты распродаж: цена со скидкой применяется при чтении."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Диваны и кресла')
+        cls.subcategory = Subcategory.objects.create(
+            title='Прямые диваны',
+            categories=category,
+        )
+        cls.product, cls.future_product, cls.expired_product = (
+            create_products(cls.subcategory, 3)
+        )
+        now = timezone.now()
+        cls.sale = ProductSale.objects.create(
+            id=cls.product,
+            salePrice=50,
+            dateFrom=now - timedelta(days=1),
+            dateTo=now + timedelta(days=1),
+        )
+        ProductSale.objects.create(
+            id=cls.future_product,
+            salePrice=50,
+            dateFrom=now + timedelta(days=1),
+            dateTo=now + timedelta(days=2),
+        )
+        ProductSale.objects.create(
+            id=cls.expired_product,
+            salePrice=50,
+            dateFrom=now - timedelta(days=2),
+            dateTo=now - timedelta(days=1),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_sale_does_not_change_base_price(self):
+        self.product.refresh_from_db()
+
+        self.assertEqual(self.product.price, 100)
+        self.assertEqual(self.product.effective_price, 50)
+
+    def test_effective_price_in_catalog(self):
+        response = self.client.get(
+            '/api/catalog',
+            {
+                'filter[name]': '',
+                'filter[minPrice]': 0,
+                'filter[maxPrice]': 1000,
+                'filter[freeDelivery]': 'false',
+                'filter[available]': 'false',
+                'currentPage': 1,
+                'category': self.subcategory.id,
+                'sort': 'price',
+                'sortType': 'dec',
+                'limit': 20,
+            },
+        )
+
+        prices = {
+            product['id']: float(product['price'])
+            for product in response.data['items']
+        }
+        self.assertEqual(prices[self.product.id], 50)
+        self.assertEqual(prices[self.future_product.id], 101)
+        self.assertEqual(prices[self.expired_product.id], 102)
+
+    def test_catalog_filters_by_sale_price(self):
+        response = self.client.get(
+            '/api/catalog',
+            {
+                'filter[minPrice]': 40,
+                'filter[maxPrice]': 60,
+                'category': self.subcategory.id,
+                'sort': 'price',
+            },
+        )
+
+        self.assertEqual(
+            [product['id'] for product in response.data['items']],
+            [self.product.id],
+        )
+
+    def test_catalog_sorts_by_sale_price(self):
+        self.sale.salePrice = 150
+        self.sale.save()
+
+        response = self.client.get(
+            '/api/catalog',
+            {
+                'filter[minPrice]': 0,
+                'filter[maxPrice]': 1000,
+                'category': self.subcategory.id,
+                'sort': 'price',
+            },
+        )
+
+        self.assertEqual(
+            [product['id'] for product in response.data['items']],
+            [self.future_product.id, self.expired_product.id, self.product.id],
+        )
+
+    def test_effective_price_in_product_detail(self):
+        response = self.client.get(f'/api/product/{self.product.id}')
+
+        self.assertEqual(float(response.data['price']), 50)
+
+    def test_active_sales(self):
+        response = self.client.get('/api/sales')
+
+        sale, = response.data['items']
+        self.assertEqual(sale['id'], self.product.id)
+        self.assertEqual(sale['title'], self.product.title)
+        self.assertEqual(float(sale['price']), 100)
+        self.assertEqual(float(sale['salePrice']), 50)
+        self.assertEqual(len(sale['images']), 1)
+
+    def test_sales_query_count(self):
+        ProductSale.objects.update(
+            dateFrom=timezone.now() - timedelta(days=1),
+            dateTo=timezone.now() + timedelta(days=1),
+        )
+
+        # товары распродажи загружаются в том же запросе,
+        # изображения - одним дополнительным запросом:
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/sales')
+        self.assertEqual(len(response.data['items']), 3)
+
+    def test_create_sales_from_csv(self):
+        rows = [
+            {
+                'id': str(self.product.id),
+                'salePrice': '70',
+                'dateFrom': '2020-01-01',
+                'dateTo': '2020-01-10 12:00',
+            },
+            {
+                'id': str(self.future_product.id),
+                'salePrice': '80',
+                'dateFrom': '2020-01-01',
+                'dateTo': '2020-01-10',
+            },
+        ]
+
+        with self.assertNumQueries(5):
+            created = create_sales(rows)
+
+        self.assertEqual(created, 2)
+        self.sale.refresh_from_db()
+        self.assertEqual(self.sale.salePrice, 70)
+        self.assertEqual(self.sale.dateTo.hour, 12)
+        self.assertEqual(ProductSale.objects.count(), 3)
+        # распродажа закончилась - в каталоге снова полная цена:
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.current_price, 100)
+
+    def test_create_sales_unknown_product(self):
+        with self.assertRaises(ValueError):
+            create_sales([{
+                'id': '100500',
+                'salePrice': '70',
+                'dateFrom': '2020-01-01',
+                'dateTo': '2020-01-10',
+            }])
+
+    def test_create_sales_reports_invalid_rows(self):
+        row = {
+            'id': str(self.product.id),
+            'salePrice': '70',
+            'dateFrom': '2020-01-01',
+            'dateTo': '2020-01-10',
+        }
+        rows = [
+            {**row, 'salePrice': 'abc'},
+            {**row, 'salePrice': '0'},
+            {**row, 'dateFrom': '2020-02-01'},
+            {**row, 'id': str(self.future_product.id), 'salePrice': '500'},
+            {'id': str(self.product.id)},
+        ]
+
+        with self.assertRaises(SaleImportError) as context:
+            create_sales(rows)
+
+        self.assertEqual(
+            [error.split(':')[0] for error in context.exception.errors],
+            ['Row 1', 'Row 2', 'Row 3', 'Row 5', 'Row 4'],
+        )
+        self.sale.refresh_from_db()
+        self.assertEqual(self.sale.salePrice, 50)
+
+    def test_admin_sales_import_shows_row_errors(self):
+        admin = User.objects.create_superuser('admin', password='admin')
+        self.client.force_login(admin)
+        content = (
+            'id,salePrice,dateFrom,dateTo\n'
+            f'{self.product.id},1.2.3,2020-01-01,2020-01-10\n'
+        ).encode()
+
+        response = self.client.post(
+            reverse('admin:import_sale_csv'),
+            {'csv_file': SimpleUploadedFile('sales.csv', content)},
+            follow=True,
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Row 1: Invalid salePrice')
+
+    def test_order_uses_sale_price(self):
+        user = User.objects.create_user(username='ivan', password='Qwerty123')
+        Profile.objects.create(id=user, fullName='Иван')
+        self.client.force_login(user)
+
+        response = self.client.post(
+            '/api/orders',
+            [{'id': self.product.id, 'count': 2}],
+            content_type='application/json',
+        )
+
+        order = Order.objects.get(id=response.data['orderId'])
+        self.assertEqual(order.totalCost, 100)
+
+    def test_update_sales(self):
+        self.client.get(f'/api/product/{self.future_product.id}')
+        now = timezone.now()
+        update_sales(now)
+
+        # распродажа начинается - кэш информации о товаре сбрасывается:
+        with self.captureOnCommitCallbacks(execute=True):
+            result = update_sales(now + timedelta(days=1, hours=1))
+
+        self.assertEqual(result, {'changed': 2, 'expired': 2})
+        # закончившиеся распродажи сохраняются, но не действуют:
+        self.assertTrue(
+            ProductSale.objects.filter(id=self.product.id).exists()
+        )
+        self.assertEqual(
+            list(
+                ProductSale.objects
+                .active(now + timedelta(days=1, hours=1))
+                .values_list('id', flat=True)
+            ),
+            [self.future_product.id],
+        )
+        # цена для каталога обновлена у начавшейся и закончившейся распродаж:
+        self.assertEqual(
+            dict(
+                Product.objects
+                .filter(id__in=[self.product.id, self.future_product.id])
+                .values_list('id', 'current_price')
+            ),
+            {self.product.id: 100, self.future_product.id: 50},
+        )
+        with self.assertNumQueries(5):
+            self.client.get(f'/api/product/{self.future_product.id}')
+
+
+class ProductImportTestCase(TestCase):
+    """Тесты массовой загрузки товаров (create_product)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Диваны и кресла')
+        cls.subcategory = Subcategory.objects.create(
+            title='Прямые диваны',
+            categories=category,
+        )
+        cls.image = Image.objects.create(src='images/Диван_Avanti.png')
+        cls.tag = Tag.objects.create(name='гостиная')
+
+    def get_rows(self, amount: int) -> list:
+        return [
+            {
+                'category': 'Прямые диваны',
+                'price': 1000 + i,
+                'count': 10,
+                'title': 'Диван Avanti' if i == 0 else f'Диван {i}',
+                'description': 'Компактный и стильный диван.',
+                'fullDescription': '',
+                'freeDelivery': 'True',
+                'tags': 'гостиная,дерево',
+                'specifications': f'цвет-голубой,ширина-{90 + i % 2}',
+                'rating': 4.5,
+            }
+            for i in range(amount)
+        ]
+
+    def test_import_products(self):
+        result = create_product(self.get_rows(5), chunk_size=2)
+
+        self.assertEqual(result['rows'], 5)
+        self.assertEqual(Product.objects.count(), 5)
+        self.assertEqual(
+            result['unmatched'],
+            ['Диван 1', 'Диван 2', 'Диван 3', 'Диван 4'],
+        )
+        product = Product.objects.get(title='Диван Avanti')
+        self.assertEqual(list(product.images.all()), [self.image])
+        self.assertEqual(
+            sorted(product.tags.values_list('name', flat=True)),
+            ['гостиная', 'дерево'],
+        )
+        self.assertEqual(
+            sorted(product.specifications.values_list('name', 'value')),
+            [('цвет', 'голубой'), ('ширина', '90')],
+        )
+        # теги и характеристики не дублируются:
+        self.assertEqual(Tag.objects.count(), 2)
+        self.assertEqual(Specification.objects.count(), 3)
+        # товары попадают в поисковый индекс:
+        found = get_search_backend().search(Product.objects.all(), 'avanti')
+        self.assertEqual(list(found), [product])
+
+    def test_import_query_count_does_not_depend_on_rows(self):
+        with CaptureQueriesContext(connection) as small_import:
+            create_product(self.get_rows(10))
+        with CaptureQueriesContext(connection) as large_import:
+            create_product(self.get_rows(100))
+
+        self.assertLessEqual(len(large_import), len(small_import))
+
+
+class ImageMatchingTestCase(TestCase):
+    """Тесты поиска изображений по названиям при загрузке каталога."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sofa_image = Image.objects.create(src='images/Диван_Avanti.png')
+        cls.category_image = Image.objects.create(
+            src='images/Категория_диваны_и_кресла.jpg',
+        )
+        cls.subcategory_image = Image.objects.create(
+            src='images/Подкатегория_шкафы_купе.png',
+        )
+
+    def test_normalize_image_name(self):
+        self.assertEqual(normalize_image_name('Диван_Avanti'), 'диван avanti')
+        self.assertEqual(normalize_image_name('Диван Avanti'), 'диван avanti')
+        self.assertEqual(normalize_image_name('Шкафы-купе'), 'шкафы купе')
+
+    def test_build_image_index_with_prefix(self):
+        images = Image.objects.order_by('id')
+
+        self.assertEqual(
+            build_image_index(images, prefix='Категория'),
+            {'диваны и кресла': self.category_image},
+        )
+        self.assertEqual(
+            build_image_index(images, prefix='Подкатегория'),
+            {'шкафы купе': self.subcategory_image},
+        )
+        self.assertEqual(
+            build_image_index(images)['диван avanti'],
+            self.sofa_image,
+        )
+
+    def test_import_categories_reports_unmatched(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = create_category([
+                {
+                    'category': 'Диваны и кресла',
+                    'subcategories': 'Шкафы-купе,Кровати',
+                },
+                {'category': 'Тумбы', 'subcategories': []},
+            ])
+
+        self.assertEqual(result['unmatched'], ['Кровати', 'Тумбы'])
+        category = Category.objects.get(title='Диваны и кресла')
+        self.assertEqual(category.image, self.category_image)
+        self.assertEqual(
+            Subcategory.objects.get(title='Шкафы-купе').image,
+            self.subcategory_image,
+        )
+        self.assertIsNone(Subcategory.objects.get(title='Кровати').image)
+        # изображения загружаются одним запросом:
+        image_queries = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('SELECT')
+            and '"myshop_image"' in query['sql']
+        ]
+        self.assertEqual(len(image_queries), 1)
+
+
+class ImageRegistrationTestCase(TestCase):
+    """Тесты пакетной регистрации изображений."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.images_dir = Path(self.media_root) / 'images'
+        self.images_dir.mkdir()
+
+    def test_register_directory_images(self):
+        (self.images_dir / 'Диван_Avanti.png').write_bytes(b'sofa')
+        (self.images_dir / 'Диван_Avanti_copy.png').write_bytes(b'sofa')
+        (self.images_dir / 'Кресло_Sei.png').write_bytes(b'chair')
+        # другое изображение с тем же названием:
+        (self.images_dir / 'кресло_sei.jpg').write_bytes(b'other chair')
+        (self.images_dir / 'nested').mkdir()
+
+        with self.assertNumQueries(2):
+            result = register_directory_images('images')
+
+        self.assertEqual(
+            result,
+            {'created': 2, 'skipped': 1, 'conflicts': ['кресло_sei.jpg']},
+        )
+        self.assertEqual(
+            sorted(Image.objects.values_list('src', 'alt')),
+            [
+                ('images/Диван_Avanti.png', 'Диван_Avanti'),
+                ('images/Кресло_Sei.png', 'Кресло_Sei'),
+            ],
+        )
+        # повторный запуск не дублирует изображения:
+        output = StringIO()
+        call_command('upload_images_to_db', stdout=output)
+        self.assertIn('Добавлено изображений: 0, пропущено: 3', output.getvalue())
+        self.assertIn(
+            'Имя занято другим изображением: кресло_sei.jpg',
+            output.getvalue(),
+        )
+        self.assertEqual(Image.objects.count(), 2)
+
+    def test_admin_import_images(self):
+        admin = User.objects.create_superuser('admin', password='admin')
+        self.client.force_login(admin)
+        url = reverse('admin:import_images')
+
+        response = self.client.post(url, {'file_field': [
+            SimpleUploadedFile('Диван_Avanti.png', b'sofa'),
+            SimpleUploadedFile('Кресло_Sei.png', b'chair'),
+        ]})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            (self.images_dir / 'Диван_Avanti.png').read_bytes(),
+            b'sofa',
+        )
+        self.assertEqual(Image.objects.count(), 2)
+
+        # файлы с тем же содержимым не загружаются повторно:
+        self.client.post(url, {'file_field': [
+            SimpleUploadedFile('Диван_Avanti.png', b'sofa'),
+            SimpleUploadedFile('Диван_Berry.png', b'sofa'),
+        ]})
+        self.assertEqual(Image.objects.count(), 2)
+        self.assertEqual(len(list(self.images_dir.iterdir())), 2)
+
+        # файл с другим содержимым и занятым именем не сохраняется
+        # под новым именем, а выводится в предупреждении:
+        response = self.client.post(url, {'file_field': [
+            SimpleUploadedFile('Диван-Avanti.png', b'other sofa'),
+        ]}, follow=True)
+        self.assertContains(response, 'Диван-Avanti.png')
+        self.assertEqual(Image.objects.count(), 2)
+        self.assertEqual(len(list(self.images_dir.iterdir())), 2)
+
+
+class ThumbnailsTestCase(TestCase):
+    """Тесты создания уменьшенных копий изображений."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        (Path(self.media_root) / 'images').mkdir()
+
+    def create_png(self, name: str, size=(1600, 800)) -> Image:
+        PILImage.new('RGBA', size, (0, 128, 255, 255)).save(
+            Path(self.media_root) / 'images' / name,
+        )
+        return Image.objects.create(src=f'images/{name}', alt=name)
+
+    def test_generate_missing_thumbnails(self):
+        image = self.create_png('Диван_Avanti.png')
+        broken = Image.objects.create(src='images/missing.png')
+
+        result = generate_missing_thumbnails(workers=1)
+
+        self.assertEqual(result, {'created': 1, 'failed': 1})
+        image.refresh_from_db()
+        broken.refresh_from_db()
+        self.assertTrue(image.has_thumbnails)
+        self.assertFalse(broken.has_thumbnails)
+        thumbnails = Path(self.media_root) / 'thumbnails'
+        with PILImage.open(thumbnails / 'card/images/Диван_Avanti.png') as card:
+            self.assertEqual(card.size, (400, 200))
+        with PILImage.open(thumbnails / 'menu/images/Диван_Avanti.webp') as menu:
+            self.assertEqual((menu.format, menu.size), ('WEBP', (96, 48)))
+        # изображения с копиями повторно не обрабатываются:
+        self.assertEqual(
+            generate_missing_thumbnails(workers=1),
+            {'created': 0, 'failed': 1},
+        )
+
+    def test_image_serializer_variant(self):
+        image = self.create_png('Диван_Avanti.png')
+        self.assertEqual(
+            ImageSerializer(image, variant='card').data['src'],
+            '/media/images/%D0%94%D0%B8%D0%B2%D0%B0%D0%BD_Avanti.png',
+        )
+
+        generate_missing_thumbnails(workers=1)
+        image.refresh_from_db()
+
+        data = ImageSerializer(image, variant='card').data
+        # в src - копия WebP:
+        self.assertEqual(data['src'], data['thumbnails']['card']['webp'])
+        self.assertTrue(data['src'].startswith('/media/thumbnails/card/'))
+        self.assertTrue(data['src'].endswith('.webp'))
+        self.assertEqual(set(data['thumbnails']), {'card', 'menu', 'full'})
+        self.assertTrue(data['thumbnails']['full']['webp'].endswith('.webp'))
+        # без variant выводится исходное изображение:
+        self.assertTrue(
+            ImageSerializer(image).data['src'].startswith('/media/images/')
+        )
+
+    def test_upload_registers_images_without_thumbnails(self):
+        admin = User.objects.create_superuser('admin', password='admin')
+        self.client.force_login(admin)
+        content = BytesIO()
+        PILImage.new('RGB', (800, 800)).save(content, format='JPEG')
+
+        self.client.post(reverse('admin:import_images'), {'file_field': [
+            SimpleUploadedFile('Кресло_Sei.jpg', content.getvalue()),
+        ]})
+
+        # копии создаются не в запросе, а командой generate_thumbnails:
+        self.assertFalse(Image.objects.get().has_thumbnails)
+        call_command('generate_thumbnails', '--workers', '1', stdout=StringIO())
+        self.assertTrue(Image.objects.get().has_thumbnails)
+        self.assertTrue(
+            (Path(self.media_root) / 'thumbnails/card/images/Кресло_Sei.jpg')
+            .exists()
+        )
+
+
+class CatalogImportTestCase(TestCase):
+    """Тесты загрузки каталога порциями с сохранением прогресса (run_import)."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Диваны и кресла')
+        Subcategory.objects.create(title='Прямые диваны', categories=category)
+
+    def get_csv(
+            self,
+            amount: int,
+            bad_row: int = None,
+            description: str = 'Компактный и стильный диван.',
+    ) -> bytes:
+        output = StringIO()
+        writer = csv.DictWriter(output, fieldnames=[
+            'category', 'price', 'count', 'title', 'description',
+            'fullDescription', 'freeDelivery', 'tags', 'specifications',
+            'rating',
+        ])
+        writer.writeheader()
+        for i in range(amount):
+            writer.writerow({
+                'category': 'Нет такой' if i == bad_row else 'Прямые диваны',
+                'price': 1000 + i,
+                'count': 10,
+                'title': f'Диван {i}',
+                'description': description,
+                'fullDescription': '',
+                'freeDelivery': 'True',
+                'tags': 'гостиная',
+                'specifications': 'цвет-голубой',
+                'rating': 4.5,
+            })
+        return output.getvalue().encode('utf-8')
+
+    def create_job(self, content: bytes) -> CatalogImport:
+        job = CatalogImport(kind=CatalogImport.KIND_PRODUCTS)
+        job.file.save('products.csv', ContentFile(content))
+        return job
+
+    def test_resume_interrupted_import(self):
+        job = self.create_job(self.get_csv(7))
+
+        run_import(job, chunk_size=3, max_chunks=1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, CatalogImport.STATUS_RUNNING)
+        self.assertEqual((job.rows_done, job.total_rows), (3, 7))
+        self.assertEqual(Product.objects.count(), 3)
+
+        # загрузка продолжается с сохраненного места, строки не дублируются:
+        run_import(CatalogImport.objects.get(id=job.id), chunk_size=3)
+        job.refresh_from_db()
+        self.assertEqual(job.status, CatalogImport.STATUS_DONE)
+        self.assertEqual(job.rows_done, 7)
+        self.assertEqual(job.unmatched, [f'Диван {i}' for i in range(7)])
+        self.assertEqual(
+            sorted(Product.objects.values_list('title', flat=True)),
+            [f'Диван {i}' for i in range(7)],
+        )
+
+    def test_resume_from_file_offset(self):
+        # BOM и перенос строки внутри поля:
+        content = b'\xef\xbb\xbf' + self.get_csv(
+            5,
+            description='Диван\nв гостиную',
+        )
+        job = self.create_job(content)
+
+        run_import(job, chunk_size=2, max_chunks=1)
+        job.refresh_from_db()
+        self.assertEqual(job.rows_done, 2)
+        # позиция - после заголовка и двух строк (по две строки файла):
+        self.assertEqual(
+            job.offset,
+            len(b''.join(content.splitlines(keepends=True)[:5])),
+        )
+
+        run_import(job, chunk_size=2)
+        self.assertEqual(job.status, CatalogImport.STATUS_DONE)
+        self.assertEqual(job.offset, len(content))
+        self.assertEqual(
+            sorted(Product.objects.values_list('title', 'description')),
+            [(f'Диван {i}', 'Диван\nв гостиную') for i in range(5)],
+        )
+
+    def test_resume_import_without_offset(self):
+        # загрузка, прерванная до сохранения позиции в файле:
+        job = self.create_job(self.get_csv(4))
+        run_import(job, chunk_size=2, max_chunks=1)
+        CatalogImport.objects.filter(id=job.id).update(offset=0)
+
+        job = run_import(CatalogImport.objects.get(id=job.id), chunk_size=2)
+
+        self.assertEqual(job.status, CatalogImport.STATUS_DONE)
+        self.assertEqual(
+            sorted(Product.objects.values_list('title', flat=True)),
+            [f'Диван {i}' for i in range(4)],
+        )
+
+    def test_failed_chunk_is_rolled_back(self):
+        job = self.create_job(self.get_csv(6, bad_row=4))
+
+        with self.assertRaises(KeyError), self.assertLogs('myshop.imports'):
+            run_import(job, chunk_size=3)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, CatalogImport.STATUS_FAILED)
+        self.assertEqual(job.rows_done, 3)
+        self.assertEqual(Product.objects.count(), 3)
+
+    def test_stale_checkpoint_does_not_duplicate_rows(self):
+        job = self.create_job(self.get_csv(4))
+        stale_job = CatalogImport.objects.get(id=job.id)
+        run_import(job, chunk_size=2, max_chunks=1)
+
+        # другой процесс с устаревшим прогрессом не загружает порцию повторно:
+        run_import(stale_job, chunk_size=2, max_chunks=1)
+        self.assertEqual(stale_job.rows_done, 2)
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_import_catalog_command(self):
+        path = Path(self.media_root) / 'command.csv'
+        path.write_bytes(self.get_csv(5))
+        output = StringIO()
+
+        call_command(
+            'import_catalog', 'products', str(path),
+            '--chunk-size', '2',
+            stdout=output,
+        )
+
+        self.assertEqual(Product.objects.count(), 5)
+        self.assertIn('5/5', output.getvalue())
+        self.assertEqual(
+            CatalogImport.objects.get().status,
+            CatalogImport.STATUS_DONE,
+        )
+
+    def test_admin_resumes_failed_import(self):
+        admin = User.objects.create_superuser('admin', password='admin')
+        self.client.force_login(admin)
+        job = self.create_job(self.get_csv(4, bad_row=2))
+        status_url = reverse('admin:import_product_csv_status', args=[job.id])
+
+        # в файле неизвестная подкатегория:
+        with self.assertLogs('myshop.imports', level='ERROR'):
+            data = self.client.post(status_url).json()
+        self.assertEqual(data['status'], CatalogImport.STATUS_FAILED)
+        self.assertIn('Нет такой', data['error'])
+        self.assertEqual(data['rows_done'], 0)
+
+        # после исправления данных загрузка продолжается с места остановки:
+        Subcategory.objects.create(
+            title='Нет такой',
+            categories=Category.objects.get(),
+        )
+        data = self.client.post(status_url).json()
+        self.assertEqual(data['status'], CatalogImport.STATUS_DONE)
+        self.assertEqual(data['rows_done'], 4)
+        self.assertEqual(Product.objects.count(), 4)
+
+    def test_admin_import_progress(self):
+        admin = User.objects.create_superuser('admin', password='admin')
+        self.client.force_login(admin)
+
+        response = self.client.post(
+            reverse('admin:import_product_csv'),
+            {'csv_file': SimpleUploadedFile('products.csv', self.get_csv(3))},
+        )
+        job = CatalogImport.objects.get()
+        progress_url = reverse(
+            'admin:import_product_csv_progress',
+            args=[job.id],
+        )
+        self.assertRedirects(response, progress_url)
+        self.assertContains(self.client.get(progress_url), 'import-progress')
+
+        status_url = reverse('admin:import_product_csv_status', args=[job.id])
+        data = self.client.post(status_url).json()
+        self.assertEqual(data['status'], CatalogImport.STATUS_DONE)
+        self.assertEqual((data['rows_done'], data['total_rows']), (3, 3))
+        self.assertEqual(Product.objects.count(), 3)
+
+
+class ProductSearchTestCase(TestCase):
+    """Тесты полнотекстового поиска товаров в каталоге."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Диваны и кресла')
+        cls.subcategory = Subcategory.objects.create(
+            title='Прямые диваны',
+            categories=category,
+        )
+        cls.sofa = Product.objects.create(
+            category=cls.subcategory,
+            price=1000,
+            count=5,
+            title='Диван Avanti',
+            description='Компактный и стильный диван.',
+            rating=4,
+        )
+        cls.chair = Product.objects.create(
+            category=cls.subcategory,
+            price=500,
+            count=5,
+            title='Кресло Sei',
+            description='Удобное кресло, подходит к любому дивану.',
+            fullDescription='Каркас из массива дуба.',
+            rating=4,
+        )
+        cls.chair.tags.add(Tag.objects.create(name='гостиная'))
+
+    def search(self, text: str, sort: str = 'relevance') -> list:
+        response = self.client.get(
+            '/api/catalog',
+            {
+                'filter[name]': text,
+                'filter[minPrice]': 0,
+                'filter[maxPrice]': 10000,
+                'filter[available]': 'false',
+                'currentPage': 1,
+                'sort': sort,
+                'sortType': 'inc',
+                'limit': 20,
+            },
+        )
+        return [item['id'] for item in response.data['items']]
+
+    def test_search_with_russian_stemming(self):
+        self.assertEqual(self.search('диваны'), [self.sofa.id, self.chair.id])
+        self.assertEqual(self.search('кресла'), [self.chair.id])
+
+    def test_search_by_description_and_tags(self):
+        self.assertEqual(self.search('массив дуба'), [self.chair.id])
+        self.assertEqual(self.search('гостиная'), [self.chair.id])
+        self.assertEqual(self.search('avant'), [self.sofa.id])
+
+    def test_search_index_updated_on_save(self):
+        self.sofa.title = 'Диван Berry'
+        self.sofa.save()
+
+        self.assertEqual(self.search('avanti'), [])
+        self.assertEqual(self.search('berry'), [self.sofa.id])
+
+    def test_search_index_uses_signal_database(self):
+        with mock.patch('myshop.signals.index_products') as index_products:
+            self.sofa.save(using='default')
+        index_products.assert_called_once_with(
+            [self.sofa.id],
+            using='default',
+        )
+
+    def test_search_with_sort_by_price(self):
+        self.assertEqual(
+            self.search('диван', sort='price'),
+            [self.sofa.id, self.chair.id],
+        )
+
+
+class CacheVersionTestCase(TestCase):
+    """Тесты версий кэшируемых данных."""
+
+    def test_lost_version_does_not_serve_stale_data(self):
+        get_cached_payload(CATEGORIES_MENU, 'menu', lambda: 'старые данные')
+        version = get_cache_version(CATEGORIES_MENU)
+
+        # счетчик версии вытеснен из кэша, данные остались:
+        cache.delete(get_version_key(CATEGORIES_MENU))
+
+        self.assertGreater(get_cache_version(CATEGORIES_MENU), version)
+        payload = get_cached_payload(
+            CATEGORIES_MENU,
+            'menu',
+            lambda: 'новые данные',
+        )
+        self.assertEqual(payload['data'], 'новые данные')
+
+
+class CategoriesViewTestCase(TestCase):
+    """Тесты кэширования меню категорий (CategoriesView)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(3):
+            category = Category.objects.create(
+                title=f'Категория {i}',
+                image=Image.objects.create(src=f'images/category_{i}.png'),
+            )
+            for j in range(3):
+                Subcategory.objects.create(
+                    title=f'Подкатегория {i}.{j}',
+                    categories=category,
+                    image=Image.objects.create(src=f'images/sub_{i}_{j}.png'),
+                )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_categories_menu_is_cached(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/categories')
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(len(response.data[0]['subcategories']), 3)
+
+        with self.assertNumQueries(0):
+            cached_response = self.client.get('/api/categories')
+        self.assertEqual(cached_response.data, response.data)
+
+    def test_categories_menu_not_modified(self):
+        response = self.client.get('/api/categories')
+
+        not_modified = self.client.get(
+            '/api/categories',
+            HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_categories_menu_invalidation(self):
+        response = self.client.get('/api/categories')
+
+        subcategory = Subcategory.objects.first()
+        subcategory.title = 'Новое название'
+        with self.captureOnCommitCallbacks(execute=True):
+            subcategory.save()
+
+        new_response = self.client.get(
+            '/api/categories',
+            HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(new_response.status_code, 200)
+        self.assertEqual(
+            new_response.data[0]['subcategories'][0]['title'],
+            'Новое название',
+        )
+
+        image = Category.objects.first().image
+        image.alt = 'Категория'
+        with self.captureOnCommitCallbacks(execute=True):
+            image.save()
+
+        response = self.client.get('/api/categories')
+        self.assertEqual(response.data[0]['image']['alt'], 'Категория')
+
+
+class TagViewTestCase(TestCase):
+    """Тесты представления TagView."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Диваны и кресла')
+        cls.sofas = Subcategory.objects.create(
+            title='Прямые диваны',
+            categories=category,
+        )
+        cls.chairs = Subcategory.objects.create(
+            title='Кресла на ножках',
+            categories=category,
+        )
+        create_products(cls.sofas, 3)
+        cls.chair, = create_products(cls.chairs, 1)
+        cls.chair.tags.set([Tag.objects.create(name='кресло')])
+
+    def setUp(self):
+        cache.clear()
+
+    def get_tags(self, category: int) -> dict:
+        response = self.client.get('/api/tags', {'category': category})
+        return {tag['name']: tag['count'] for tag in response.data}
+
+    def test_tags_scoped_by_category(self):
+        with self.assertNumQueries(1):
+            tags = self.get_tags(self.sofas.id)
+        self.assertEqual(tags, {'тег 0': 3, 'тег 1': 3})
+        self.assertEqual(self.get_tags(self.chairs.id), {'кресло': 1})
+
+    def test_tags_cache_invalidation(self):
+        self.assertEqual(self.get_tags(self.chairs.id), {'кресло': 1})
+        with self.assertNumQueries(0):
+            self.get_tags(self.chairs.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chair.tags.add(Tag.objects.filter(name='тег 0').first())
+
+        self.assertEqual(
+            self.get_tags(self.chairs.id),
+            {'кресло': 1, 'тег 0': 1},
+        )
+
+
+@override_settings(BASKET_STORAGE='myshop.basket.SessionBasketStorage')
+class BasketViewTestCase(TestCase):
+    """Тесты представления BasketView."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Диваны и кресла')
+        subcategory = Subcategory.objects.create(
+            title='Прямые диваны',
+            categories=category,
+        )
+        cls.products = create_products(subcategory, 200)
+
+    def set_basket(self, basket: list) -> None:
+        session = self.client.session
+        session['basket'] = basket
+        session.save()
+
+    def test_basket_counts(self):
+        sold_out = self.products[2]
+        sold_out.count = 0
+        sold_out.save()
+        # корзина в прежнем формате (список словарей):
+        self.set_basket([
+            {'id': self.products[0].id, 'count': 2},
+            {'id': self.products[1].id, 'count': 10},
+            {'id': sold_out.id, 'count': 1},
+        ])
+
+        response = self.client.get('/api/basket')
+
+        self.assertEqual(
+            [(item['id'], item['count']) for item in response.data],
+            [(self.products[0].id, 2), (self.products[1].id, 5)],
+        )
+
+    def test_basket_query_count_does_not_depend_on_size(self):
+        query_counts = list()
+        for size in (1, 50, 200):
+            self.set_basket({
+                str(product.id): 1
+                for product in self.products[:size]
+            })
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/basket')
+            self.assertEqual(len(response.data), size)
+            query_counts.append(len(queries))
+
+        self.assertEqual(len(set(query_counts)), 1)
+
+
+class BasketStorageTestCase(TestCase):
+    """Тесты хранилищ корзины."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Диваны и кресла')
+        subcategory = Subcategory.objects.create(
+            title='Прямые диваны',
+            categories=category,
+        )
+        cls.first, cls.second = create_products(subcategory, 2)
+
+    def check_basket_flow(self) -> None:
+        self.client.post(
+            '/api/basket',
+            {'id': self.first.id, 'count': 2},
+            content_type='application/json',
+        )
+        self.client.post(
+            '/api/basket',
+            {'id': self.second.id, 'count': 1},
+            content_type='application/json',
+        )
+        self.client.post(
+            '/api/basket',
+            {'id': self.first.id, 'count': 1},
+            content_type='application/json',
+        )
+        response = self.client.delete(
+            '/api/basket',
+            {'id': self.second.id, 'count': 1},
+            content_type='application/json',
+        )
+        self.assertEqual(
+            [(item['id'], item['count']) for item in response.data],
+            [(self.first.id, 3)],
+        )
+
+        response = self.client.get('/api/basket')
+        self.assertEqual(
+            [(item['id'], item['count']) for item in response.data],
+            [(self.first.id, 3)],
+        )
+
+    def test_cache_storage_does_not_write_sessions(self):
+        with override_settings(BASKET_STORAGE='myshop.basket.CacheBasketStorage'):
+            with CaptureQueriesContext(connection) as queries:
+                self.check_basket_flow()
+
+        self.assertFalse(
+            any('django_session' in query['sql'] for query in queries)
+        )
+
+    def test_signed_cookie_storage(self):
+        with override_settings(
+                BASKET_STORAGE='myshop.basket.SignedCookieBasketStorage'
+        ):
+            self.check_basket_flow()
+
+    def test_session_storage(self):
+        with override_settings(
+                BASKET_STORAGE='myshop.basket.SessionBasketStorage'
+        ):
+            self.check_basket_flow()
+
+    def test_default_storage_does_not_write_sessions(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.check_basket_flow()
+
+        self.assertFalse(
+            any('django_session' in query['sql'] for query in queries)
+        )
+        self.assertIn('basket', self.client.cookies)
+
+    def check_session_basket_migration(self) -> None:
+        session = self.client.session
+        session['basket'] = {str(self.first.id): 2}
+        session.save()
+
+        response = self.client.get('/api/basket')
+        self.assertEqual(
+            [(item['id'], item['count']) for item in response.data],
+            [(self.first.id, 2)],
+        )
+
+        self.client.post(
+            '/api/basket',
+            {'id': self.second.id, 'count': 1},
+            content_type='application/json',
+        )
+        self.assertNotIn('basket', self.client.session)
+
+        response = self.client.get('/api/basket')
+        self.assertEqual(
+            [(item['id'], item['count']) for item in response.data],
+            [(self.first.id, 2), (self.second.id, 1)],
+        )
+
+    def test_cache_storage_migrates_session_basket(self):
+        with override_settings(BASKET_STORAGE='myshop.basket.CacheBasketStorage'):
+            self.check_session_basket_migration()
+
+    def test_signed_cookie_storage_migrates_session_basket(self):
+        with override_settings(
+                BASKET_STORAGE='myshop.basket.SignedCookieBasketStorage'
+        ):
+            self.check_session_basket_migration()
+
+
+class OrdersViewTestCase(TestCase):
+    """Тесты представлений OrdersView и OrderView."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Диваны и кресла')
+        subcategory = Subcategory.objects.create(
+            title='Прямые диваны',
+            categories=category,
+        )
+        cls.products = create_products(subcategory, 5)
+        cls.user = User.objects.create_user(
+            username='ivan',
+            password='Qwerty123',
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_orders(self, amount: int) -> list:
+        orders = list()
+        for _ in range(amount):
+            order = Order.objects.create(user=self.user, totalCost=100)
+            for count, product in enumerate(self.products, start=1):
+                order.products.add(
+                    OrderProduct.objects.create(product=product, count=count)
+                )
+            orders.append(order)
+        return orders
+
+    def test_order_products(self):
+        order, = self.create_orders(1)
+
+        response = self.client.get(f'/api/order/{order.id}')
+
+        products = response.data['products']
+        self.assertEqual(
+            [(product['id'], product['count']) for product in products],
+            [
+                (product.id, count)
+                for count, product in enumerate(self.products, start=1)
+            ],
+        )
+        self.assertEqual(products[0]['title'], self.products[0].title)
+        self.assertEqual(len(products[0]['images']), 1)
+        self.assertEqual(products[0]['reviews'], 2)
+
+    def test_orders_query_count_does_not_depend_on_history_size(self):
+        self.create_orders(1)
+        with CaptureQueriesContext(connection) as small_history:
+            response = self.client.get('/api/orders')
+        self.assertEqual(len(response.data), 1)
+
+        self.create_orders(10)
+        with CaptureQueriesContext(connection) as large_history:
+            response = self.client.get('/api/orders')
+        self.assertEqual(len(response.data), 11)
+
+        self.assertEqual(len(small_history), len(large_history))
+
+    def test_create_order_uses_server_prices(self):
+        Profile.objects.create(id=self.user, fullName='Иван')
+        data = [
+            {'id': product.id, 'count': 2, 'price': 1}
+            for product in self.products
+        ]
+
+        response = self.client.post(
+            '/api/orders',
+            data,
+            content_type='application/json',
+        )
+
+        order = Order.objects.get(id=response.data['orderId'])
+        self.assertEqual(
+            order.totalCost,
+            sum(product.price * 2 for product in self.products),
+        )
+        self.assertEqual(order.fullName, 'Иван')
+        self.assertEqual(
+            sorted(order.products.values_list('product_id', 'count')),
+            [(product.id, 2) for product in self.products],
+        )
+
+    def test_create_order_query_count_does_not_depend_on_size(self):
+        self.client.logout()
+        with CaptureQueriesContext(connection) as small_order:
+            self.client.post(
+                '/api/orders',
+                [{'id': self.products[0].id, 'count': 1}],
+                content_type='application/json',
+            )
+        with CaptureQueriesContext(connection) as large_order:
+            self.client.post(
+                '/api/orders',
+                [{'id': product.id, 'count': 1} for product in self.products],
+                content_type='application/json',
+            )
+        self.assertEqual(len(small_order), len(large_order))
+        self.assertEqual(OrderProduct.objects.count(), 6)
+
+    def test_create_order_without_returning_bulk_insert(self):
+        Profile.objects.create(id=self.user, fullName='Иван')
+        features = type(connection.features)
+        with mock.patch.object(
+                features,
+                'can_return_rows_from_bulk_insert',
+                False,
+        ):
+            response = self.client.post(
+                '/api/orders',
+                [{'id': product.id, 'count': 1} for product in self.products],
+                content_type='application/json',
+            )
+
+        order = Order.objects.get(id=response.data['orderId'])
+        self.assertEqual(
+            sorted(order.products.values_list('product_id', flat=True)),
+            [product.id for product in self.products],
+        )
+
+    def test_create_order_with_unknown_product(self):
+        response = self.client.post(
+            '/api/orders',
+            [
+                {'id': self.products[0].id, 'count': 1},
+                {'id': 100500, 'count': 1},
+            ],
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def confirm_order(self, order: Order):
+        return self.client.post(
+            f'/api/order/{order.id}',
+            {
+                'fullName': 'Иван',
+                'deliveryType': 'ordinary',
+                'paymentType': 'online',
+            },
+            content_type='application/json',
+        )
+
+    def test_confirm_order_decrements_stock(self):
+        order, = self.create_orders(1)
+
+        response = self.confirm_order(order)
+        # повторное подтверждение не списывает товары второй раз:
+        self.confirm_order(order)
+
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'accepted')
+        self.assertEqual(order.fullName, 'Иван')
+        self.assertEqual(
+            list(
+                Product.objects
+                .filter(id__in=[product.id for product in self.products])
+                .order_by('id')
+                .values_list('count', flat=True)
+            ),
+            [4, 3, 2, 1, 0],
+        )
+
+    def test_confirm_order_with_insufficient_stock(self):
+        order, = self.create_orders(1)
+        Product.objects.filter(id=self.products[-1].id).update(count=4)
+
+        response = self.confirm_order(order)
+
+        self.assertEqual(response.status_code, 400)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'created')
+        self.assertEqual(
+            set(
+                Product.objects
+                .filter(id__in=[product.id for product in self.products])
+                .values_list('count', flat=True)
+            ),
+            {5, 4},
+        )
+
+
+STRESS_DATABASE = 'stock_stress'
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite only')
+class StockReservationStressTestCase(TransactionTestCase):
+    """
+    Одновременное списание товаров из нескольких потоков.
+
+    Используется отдельная файловая БД SQLite в режиме WAL
+    (тестовая БД SQLite по умолчанию находится в памяти).
+    """
+
+    threads_count = 16
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # БД подключается после настройки тестового класса,
+        # поэтому ограничения TransactionTestCase на нее не действуют:
+        cls.temp_dir = tempfile.mkdtemp()
+        connections.settings[STRESS_DATABASE] = {
+            **connections.settings['default'],
+            'NAME': str(Path(cls.temp_dir) / 'stress.sqlite3'),
+            'OPTIONS': {'timeout': 30},
+        }
+        call_command('migrate', database=STRESS_DATABASE, verbosity=0)
+        with connections[STRESS_DATABASE].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[STRESS_DATABASE].close()
+        del connections[STRESS_DATABASE]
+        del connections.settings[STRESS_DATABASE]
+        shutil.rmtree(cls.temp_dir, ignore_errors=True)
+        super().tearDownClass()
+
+    def run_threads(self, target) -> None:
+        barrier = threading.Barrier(self.threads_count)
+
+        def run():
+            try:
+                barrier.wait()
+                target()
+            finally:
+                connections[STRESS_DATABASE].close()
+
+        threads = [
+            threading.Thread(target=run)
+            for _ in range(self.threads_count)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_concurrent_reservations_do_not_oversell(self):
+        category = Category.objects.using(STRESS_DATABASE).create(
+            title='Диваны и кресла',
+        )
+        subcategory = Subcategory.objects.using(STRESS_DATABASE).create(
+            title='Прямые диваны',
+            categories=category,
+        )
+        product = Product.objects.using(STRESS_DATABASE).create(
+            category=subcategory,
+            price=100,
+            count=10,
+            title='Товар',
+            description='Описание товара',
+            rating=4,
+        )
+        results = list()
+
+        def reserve():
+            try:
+                reserve_stock({product.id: 1}, using=STRESS_DATABASE)
+                results.append(True)
+            except InsufficientStock:
+                results.append(False)
+
+        self.run_threads(reserve)
+
+        product.refresh_from_db(using=STRESS_DATABASE)
+        self.assertEqual(product.count, 0)
+        self.assertEqual(results.count(True), 10)
+        self.assertEqual(results.count(False), self.threads_count - 10)
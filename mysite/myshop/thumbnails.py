@@ -0,0 +1,186 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Dict, List, Optional
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image as PILImage, ImageOps, UnidentifiedImageError
+
+from .cache import (
+    CATEGORIES_MENU,
+    bump_cache_version_on_commit,
+    bump_products_cache_version,
+)
+from .models import Image, Product
+
+# каталог с уменьшенными копиями внутри MEDIA_ROOT:
+THUMBNAILS_DIRECTORY = 'thumbnails'
+# размеры уменьшенных копий (ширина, высота), пропорции сохраняются:
+THUMBNAIL_SIZES = {
+    'card': (400, 400),
+    'menu': (96, 96),
+    'full': (1200, 1200),
+}
+THUMBNAIL_QUALITY = 85
+# количество изображений, обрабатываемых за одну порцию:
+CHUNK_SIZE = 100
+
+
+def get_thumbnail_sizes() -> Dict[str, tuple]:
+    """Размеры уменьшенных копий (настройка THUMBNAIL_SIZES)."""
+    return getattr(settings, 'THUMBNAIL_SIZES', THUMBNAIL_SIZES)
+
+
+def get_storage():
+    return Image._meta.get_field('src').storage
+
+
+def get_thumbnail_name(name: str, variant: str, webp: bool = False) -> str:
+    """
+    Путь уменьшенной копии изображения.
+
+    'images/Диван_Avanti.png' -> 'thumbnails/card/images/Диван_Avanti.png'
+    (или '.webp' для копии в формате WebP).
+    """
+    if webp:
+        name = f'{os.path.splitext(name)[0]}.webp'
+    return f'{THUMBNAILS_DIRECTORY}/{variant}/{name}'
+
+
+def get_thumbnail_urls(image: Image) -> Dict[str, Dict[str, str]]:
+    """
+    URL уменьшенных копий: {вариант: {'src': ..., 'webp': ...}}.
+
+    URL вычисляются по пути изображения без обращения к хранилищу,
+    пока копии не созданы, возвращается пустой словарь.
+    """
+    if not image.has_thumbnails or not image.src:
+        return dict()
+    storage = get_storage()
+    return {
+        variant: {
+            'src': storage.url(get_thumbnail_name(image.src.name, variant)),
+            'webp': storage.url(
+                get_thumbnail_name(image.src.name, variant, webp=True)
+            ),
+        }
+        for variant in get_thumbnail_sizes()
+    }
+
+
+def save_thumbnail(storage, name: str, thumbnail: PILImage.Image, **params) -> None:
+    buffer = BytesIO()
+    thumbnail.save(buffer, **params)
+    # копия пересоздается под тем же именем:
+    if storage.exists(name):
+        storage.delete(name)
+    storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def generate_thumbnails(name: str) -> bool:
+    """
+    Создает уменьшенные копии изображения (THUMBNAIL_SIZES)
+    в исходном формате и в формате WebP.
+
+    Изображения меньше заданного размера не увеличиваются.
+    Возвращает False, если файл отсутствует или не является изображением.
+    """
+    storage = get_storage()
+    try:
+        with storage.open(name, 'rb') as file, PILImage.open(file) as original:
+            original = ImageOps.exif_transpose(original)
+    except (FileNotFoundError, UnidentifiedImageError, OSError):
+        return False
+
+    extension = os.path.splitext(name)[1].lower()
+    image_format = PILImage.registered_extensions().get(extension, 'PNG')
+    for variant, size in get_thumbnail_sizes().items():
+        thumbnail = original.copy()
+        thumbnail.thumbnail(size, PILImage.LANCZOS)
+        if image_format == 'JPEG' and thumbnail.mode not in ('RGB', 'L'):
+            fallback = thumbnail.convert('RGB')
+        else:
+            fallback = thumbnail
+        save_thumbnail(
+            storage,
+            get_thumbnail_name(name, variant),
+            fallback,
+            format=image_format,
+            quality=THUMBNAIL_QUALITY,
+            optimize=True,
+        )
+        save_thumbnail(
+            storage,
+            get_thumbnail_name(name, variant, webp=True),
+            thumbnail,
+            format='WEBP',
+            quality=THUMBNAIL_QUALITY,
+            method=6,
+        )
+    return True
+
+
+def mark_thumbnails(image_ids: List[int]) -> None:
+    """
+    Отмечает изображения с созданными копиями.
+
+    Массовое обновление не вызывает сигналы, поэтому кэш меню категорий
+    и информации о товарах с этими изображениями сбрасывается здесь же.
+    """
+    if not image_ids:
+        return
+    Image.objects.filter(id__in=image_ids).update(has_thumbnails=True)
+    bump_products_cache_version(
+        Product.images.through.objects
+        .filter(image_id__in=image_ids)
+        .values_list('product_id', flat=True)
+        .distinct()
+    )
+    bump_cache_version_on_commit(CATEGORIES_MENU)
+
+
+def generate_missing_thumbnails(
+        force: bool = False,
+        workers: Optional[int] = None,
+        chunk_size: int = CHUNK_SIZE,
+) -> dict:
+    """
+    Создает уменьшенные копии изображений в пуле процессов.
+
+    Обрабатываются изображения без копий (или все при force=True),
+    порциями по chunk_size: после каждой порции изображения отмечаются
+    в БД, поэтому прерванную обработку можно продолжить.
+    Возвращает количество обработанных изображений и ошибок.
+    """
+    images = Image.objects.exclude(src='').exclude(src__isnull=True)
+    if not force:
+        images = images.filter(has_thumbnails=False)
+    images = images.order_by('id').values_list('id', 'src')
+
+    result = {'created': 0, 'failed': 0}
+    last_id = 0
+    # в дочерних процессах Django настраивается заново
+    # (при запуске процессов методом spawn):
+    with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=django.setup,
+    ) as executor:
+        # порции выбираются по id (обработанные изображения
+        # изменяются в БД и не должны сдвигать выборку):
+        while chunk := list(images.filter(id__gt=last_id)[:chunk_size]):
+            image_ids, names = zip(*chunk)
+            last_id = image_ids[-1]
+            created = [
+                image_id
+                for image_id, done in zip(
+                    image_ids,
+                    executor.map(generate_thumbnails, names),
+                )
+                if done
+            ]
+            mark_thumbnails(created)
+            result['created'] += len(created)
+            result['failed'] += len(chunk) - len(created)
+    return result
@@ -1,10 +1,9 @@
-import math
-import random
 from datetime import datetime
 from typing import List, Optional
 
 from django.contrib.auth.models import User
-from django.db.models import Max
+from django.db import connection, transaction
+from django.db.models import Count, Prefetch
 from django.db.models.query import QuerySet
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import (
@@ -31,29 +30,52 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.views import APIView
 
+from .basket import Basket, get_basket_storage
+from .cache import (
+    CATEGORIES_MENU,
+    TAG_FACETS,
+    get_cached_payload,
+    get_conditional_cached_response,
+    get_product_cache_name,
+)
 from .models import (
     Image,
     Profile,
     Category,
     Tag,
     Product,
+    Review,
     Subcategory,
     ProductSale,
     Order,
     OrderProduct,
 )
+from .pagination import (
+    CurrentPagePagination,
+    ProductSalePagination,
+    KeysetPagination,
+    ReviewPagination,
+)
+from .search import get_search_backend
 from .serializers import (
     ImageSerializer,
     ProfileSerializer,
     UserPasswordSerializer,
     CategorySerializer,
-    TagSerializer,
+    TagFacetSerializer,
     ReviewSerializer,
     ProductFullSerializer,
     ProductShortSerializer,
     ProductSaleSerializer,
     OrderSerializer,
 )
+from .showcase import (
+    choose_banners,
+    get_banner_pool,
+    get_product_rail,
+    load_products,
+)
+from .stock import InsufficientStock, reserve_order_stock
 
 
 # ПРЕДСТАВЛЕНИЯ ДЛЯ РАБОТЫ С ПРОФИЛЕМ ПОЛЬЗОВАТЕЛЯ:
@@ -159,11 +181,36 @@ class AvatarView(CreateAPIView):
     },
 )
 class CategoriesView(ListAPIView):
-    """Представление для вывода категорий товаров."""
+    """
+    Представление для вывода категорий товаров.
+
+    Меню категорий запрашивается на каждой странице сайта,
+    поэтому готовый ответ хранится в кэше и сбрасывается сигналами
+    при изменении категорий, подкатегорий и их изображений.
+    """
 
-    queryset = Category.objects.all()
+    queryset = (
+        Category.objects
+        .select_related('image')
+        .prefetch_related(
+            Prefetch(
+                'subcategories',
+                queryset=Subcategory.objects.select_related('image'),
+            )
+        )
+    )
     serializer_class = CategorySerializer
 
+    def list(self, request: Request, *args, **kwargs) -> Response:
+        # адреса изображений в ответе абсолютные,
+        # поэтому ответ кэшируется отдельно для каждого хоста:
+        payload = get_cached_payload(
+            CATEGORIES_MENU,
+            request.build_absolute_uri('/'),
+            lambda: super(CategoriesView, self).list(request).data,
+        )
+        return get_conditional_cached_response(request, payload)
+
 
 # ПРЕДСТАВЛЕНИЯ ДЛЯ РАБОТЫ С ТОВАРОМ И ЕГО ПАРАМЕТРАМИ:
 
@@ -179,14 +226,50 @@ class CategoriesView(ListAPIView):
         ),
     ],
     responses={
-        200: OpenApiResponse(description="successful operation"),
+        200: OpenApiResponse(
+            response=TagFacetSerializer(many=True),
+            description="successful operation",
+        ),
     },
 )
 class TagView(ListAPIView):
-    """Представление для вывода тегов товаров."""
+    """
+    Представление для вывода тегов товаров.
+
+    Если передана подкатегория, выводятся только теги ее товаров.
+    Для каждого тега выводится количество товаров (одним запросом
+    с агрегацией); ответ кэшируется и сбрасывается сигналами
+    при изменении товаров и их тегов.
+    """
+
+    serializer_class = TagFacetSerializer
+
+    def get_category(self) -> Optional[int]:
+        try:
+            return int(self.request.query_params.get('category'))
+        except (TypeError, ValueError):
+            return None
+
+    def get_queryset(self) -> QuerySet:
+        queryset = Tag.objects.all()
+
+        category = self.get_category()
+        if category is not None:
+            queryset = queryset.filter(product_tag__category=category)
 
-    queryset = Tag.objects.all()
-    serializer_class = TagSerializer
+        return (
+            queryset
+            .annotate(count=Count('product_tag'))
+            .order_by('-count', 'id')
+        )
+
+    def list(self, request: Request, *args, **kwargs) -> Response:
+        payload = get_cached_payload(
+            TAG_FACETS,
+            f'category={self.get_category()}',
+            lambda: super(TagView, self).list(request).data,
+        )
+        return get_conditional_cached_response(request, payload)
 
 
 @extend_schema(
@@ -197,41 +280,103 @@ class TagView(ListAPIView):
     },
 )
 class ProductView(RetrieveAPIView):
-    """Представление для вывода информации о товаре."""
+    """
+    Представление для вывода информации о товаре.
+
+    Выводятся только последние отзывы о товаре и их общее количество.
+    """
 
     serializer_class = ProductFullSerializer
+    # количество последних отзывов в информации о товаре:
+    reviews_limit = 5
+
+    def retrieve(self, request: Request, *args, **kwargs) -> Response:
+        # у каждого товара своя версия кэша, она меняется сигналами
+        # при изменении товара, отзывов, распродажи и связей товара;
+        # адреса изображений абсолютные - ответ кэшируется для каждого хоста:
+        payload = get_cached_payload(
+            get_product_cache_name(self.kwargs.get('id')),
+            request.build_absolute_uri('/'),
+            lambda: super(ProductView, self).retrieve(request).data,
+        )
+        return get_conditional_cached_response(request, payload)
 
     def get_object(self) -> Product:
         product_id = self.kwargs.get('id')
-        return Product.objects.get(id=product_id)
+        latest_reviews = Review.objects.order_by('-date', '-id')
+        return (
+            Product.objects
+            .with_sale_price()
+            .prefetch_related(
+                'images',
+                'tags',
+                'specifications',
+                Prefetch(
+                    'reviews',
+                    queryset=latest_reviews[:self.reviews_limit],
+                    to_attr='latest_reviews',
+                ),
+            )
+            .get(id=product_id)
+        )
 
 
 @extend_schema(
     tags=['product'],
-    description='post product review',
     responses={
         200: OpenApiResponse(description="successful operation"),
     },
 )
-class ReviewView(APIView):
-    """Представление для добавления отзыва о товаре."""
+class ReviewView(ListAPIView):
+    """
+    Представление для вывода и добавления отзывов о товаре.
+
+    Отзывы выводятся от новых к старым постранично по курсору.
+    """
 
     serializer_class = ReviewSerializer
+    pagination_class = ReviewPagination
 
+    def get_queryset(self) -> QuerySet:
+        return (
+            Review.objects
+            .filter(product_id=self.kwargs.get('id'))
+            .order_by('-date', '-id')
+        )
+
+    @extend_schema(
+        description='get product reviews',
+        parameters=[
+            OpenApiParameter(
+                name='cursor',
+                description='cursor of the next page',
+                type=OpenApiTypes.STR,
+            ),
+            OpenApiParameter(
+                name='limit',
+                description='reviews per page',
+                default=10,
+                type=OpenApiTypes.NUMBER,
+            ),
+        ],
+    )
+    def get(self, request: Request, *args, **kwargs) -> Response:
+        return super().get(request, *args, **kwargs)
+
+    @extend_schema(description='post product review')
     def post(self, request: Request, id: int) -> Response:
         product = Product.objects.get(id=id)
 
         serializer = ReviewSerializer(data=request.data)
-        if serializer.is_valid():
-            serializer.save(product=product)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST)
 
-        # обновление рейтинга товара после добавления нового отзыва:
-        new_product_rating = round(
-            float(product.rating) * 0.8 + serializer.data.get('rate') * 0.2,
-            1
-        )
-        product.rating = new_product_rating
-        product.save()
+        # рейтинг и количество отзывов товара обновляются
+        # сигналом в той же транзакции (myshop.signals):
+        with transaction.atomic():
+            serializer.save(product=product)
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -266,7 +411,8 @@ class ReviewView(APIView):
         ),
         OpenApiParameter(
             name='sort',
-            enum=('rating', 'price', 'reviews', 'date'),
+            description='relevance - only together with filter[name]',
+            enum=('rating', 'price', 'reviews', 'date', 'relevance'),
             default='price',
         ),
         OpenApiParameter(
@@ -285,15 +431,56 @@ class ReviewView(APIView):
             default=20,
             type=OpenApiTypes.NUMBER,
         ),
+        OpenApiParameter(
+            name='cursor',
+            description='keyset pagination cursor: pass an empty value '
+                        'for the first page, then nextCursor from the response '
+                        '(currentPage is ignored in this mode)',
+            type=OpenApiTypes.STR,
+        ),
     ],
     responses={
         200: OpenApiResponse(description="successful operation"),
     },
 )
 class CatalogView(ListAPIView):
-    """Представление для вывода каталога товаров."""
+    """
+    Представление для вывода каталога товаров.
+
+    По умолчанию вывод постраничный по номеру страницы (currentPage).
+    Если в запросе передан параметр cursor, вывод идет по курсору:
+    товары сортируются по паре (ключ сортировки, id), и страница
+    выбирается без OFFSET на любой глубине каталога.
+    """
 
     serializer_class = ProductShortSerializer
+    pagination_class = CurrentPagePagination
+    cursor_pagination_class = KeysetPagination
+
+    # поля модели для сортировки (цена - с учетом распродажи,
+    # столбец Product.current_price с индексами):
+    sort_fields = {
+        'rating': 'rating',
+        'price': 'current_price',
+        'reviews': 'reviews_count',
+        'date': 'date',
+        'relevance': 'search_rank',
+    }
+
+    def is_cursor_mode(self) -> bool:
+        return (
+            self.cursor_pagination_class.cursor_query_param
+            in self.request.query_params
+        )
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.is_cursor_mode():
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     def get_queryset(self) -> QuerySet:
         filter_parameters = self.request.query_params
@@ -310,7 +497,6 @@ class CatalogView(ListAPIView):
         else:
             self.available = False
 
-        self.currentPage = int(filter_parameters.get('currentPage'))
         self.category = filter_parameters.get('category')
         self.sort = filter_parameters.get('sort')
 
@@ -323,58 +509,55 @@ class CatalogView(ListAPIView):
         self.tags = filter_parameters.getlist('tags[]')
         self.tags = [tag for tag in self.tags]
 
-        self.limit = int(filter_parameters.get('limit'))
-
-        self.queryset_all = (
+        queryset = (
             Product.objects
-            .annotate(sort=Max(self.sort))
+            .with_short_info()
             .filter(
-                title__icontains=self.title,
-                price__range=(self.minPrice, self.maxPrice),
+                current_price__range=(self.minPrice, self.maxPrice),
                 count__gte=self.available,
             )
-            .order_by(f'{self.sortType}sort')
+        )
+
+        # поиск по названию, описаниям, тегам и характеристикам товара;
+        # ранг релевантности доступен только при поиске:
+        if self.title:
+            queryset = get_search_backend().search(queryset, self.title)
+
+        sort_field = self.sort_fields.get(self.sort, 'current_price')
+        if (
+                sort_field == 'search_rank'
+                and sort_field not in queryset.query.annotations
+        ):
+            sort_field = 'current_price'
+
+        queryset = queryset.order_by(
+            f'{self.sortType}{sort_field}',
+            f'{self.sortType}id',
         )
 
         if self.freeDelivery == 'true':
-            self.queryset_all = self.queryset_all.filter(
+            queryset = queryset.filter(
                 freeDelivery=True
             )
 
         if self.category:
-            self.queryset_all = self.queryset_all.filter(
+            queryset = queryset.filter(
                 category=self.category
             )
 
+        # фильтр по тегам через подзапрос: соединение с таблицей тегов
+        # размножило бы строки товаров и потребовало DISTINCT:
         if self.tags:
-            self.queryset_all = (
-                self.queryset_all.filter(tags__in=self.tags)
-                .distinct()
+            queryset = queryset.filter(
+                id__in=(
+                    Product.tags.through.objects
+                    .filter(tag__in=self.tags)
+                    .values('product')
+                )
             )
 
-        queryset = (
-            self.queryset_all
-            [self.limit * (self.currentPage - 1):self.limit * self.currentPage]
-        )
-
         return queryset
 
-    def get(self, request: Request, *args, **kwargs) -> Response:
-        response = super().get(request, *args, **kwargs)
-
-        lastPage = math.ceil(
-            self.queryset_all.count() / self.limit
-        )
-
-        return Response(
-            {
-                'items': response.data,
-                'currentPage': self.currentPage,
-                'lastPage': lastPage,
-            },
-            status=status.HTTP_200_OK
-        )
-
 
 @extend_schema(
     tags=['catalog'],
@@ -384,11 +567,17 @@ class CatalogView(ListAPIView):
     },
 )
 class ProductsPopularView(ListAPIView):
-    """Представление для вывода популярных товаров."""
+    """
+    Представление для вывода популярных товаров.
+
+    Список товаров берется из подборки в кэше (см. myshop.showcase).
+    """
 
-    queryset = Product.objects.order_by('-rating')[:8]
     serializer_class = ProductShortSerializer
 
+    def get_queryset(self) -> List[Product]:
+        return load_products(get_product_rail('popular'))
+
 
 @extend_schema(
     tags=['catalog'],
@@ -398,11 +587,20 @@ class ProductsPopularView(ListAPIView):
     },
 )
 class ProductsLimitedView(ListAPIView):
-    """Представление для вывода товаров с ограниченным тиражом."""
+    """
+    Представление для вывода товаров с ограниченным тиражом.
+
+    Список товаров берется из подборки в кэше (см. myshop.showcase).
+    """
 
-    queryset = Product.objects.filter(count__range=(1, 2))[:16]
     serializer_class = ProductShortSerializer
 
+    def get_queryset(self) -> List[Product]:
+        return load_products(
+            get_product_rail('limited'),
+            count__range=(1, 2),
+        )
+
 
 @extend_schema(
     tags=['catalog'],
@@ -420,38 +618,17 @@ class ProductsLimitedView(ListAPIView):
     },
 )
 class ProductSaleView(ListAPIView):
-    """Представление для вывода товаров, участвующих в распродаже."""
+    """
+    Представление для вывода товаров, участвующих в распродаже.
+
+    Выводятся только действующие распродажи (dateFrom <= сейчас <= dateTo).
+    """
 
     serializer_class = ProductSaleSerializer
-    limit = 5
+    pagination_class = ProductSalePagination
 
     def get_queryset(self) -> QuerySet:
-        self.currentPage = int(self.request.query_params.get('currentPage'))
-
-        self.queryset_all = ProductSale.objects.all()
-
-        queryset = (
-            self.queryset_all
-            [self.limit * (self.currentPage - 1):self.limit * self.currentPage]
-        )
-
-        return queryset
-
-    def get(self, request: Request, *args, **kwargs) -> Response:
-        response = super().get(request, *args, **kwargs)
-
-        lastPage = math.ceil(
-            self.queryset_all.count() / self.limit
-        )
-
-        return Response(
-            {
-                'items': response.data,
-                'currentPage': self.currentPage,
-                'lastPage': lastPage,
-            },
-            status=status.HTTP_200_OK
-        )
+        return ProductSale.objects.active().with_product().order_by('pk')
 
 
 @extend_schema(
@@ -465,24 +642,19 @@ class ProductBannersSaleView(ListAPIView):
     """
     Представление для вывода товаров на баннере главной страницы.
 
-    Выводит три товара из случайных категорий.
+    Выводит три товара в наличии из разных подкатегорий.
     После клика на эти товары переход в раздел категории.
+    Товары выбираются из заранее сформированного пула (см. myshop.showcase).
     """
 
     serializer_class = ProductShortSerializer
 
     def get_queryset(self) -> List[Product]:
-        category_count = (
-            Subcategory.objects.all()
-            .aggregate(category_count=Max('id'))['category_count'])
-        categories = random.sample(range(1, category_count + 1), 3)
-
-        return [
-            Product.objects
-            .filter(category=category)
-            .first()
-            for category in categories
-        ]
+        # товар мог закончиться после формирования пула:
+        return load_products(
+            choose_banners(get_banner_pool()),
+            count__gt=0,
+        )
 
 
 # ПРЕДСТАВЛЕНИЯ ДЛЯ РАБОТЫ С КОРЗИНОЙ:
@@ -494,48 +666,64 @@ class ProductBannersSaleView(ListAPIView):
     },
 )
 class BasketView(ListAPIView):
-    """Представление для работы с корзиной."""
+    """
+    Представление для работы с корзиной.
 
-    serializer_class = ProductShortSerializer
+    Корзина хранится в хранилище из настройки BASKET_STORAGE
+    (см. myshop.basket).
+    """
 
-    def get_queryset(self) -> Optional[List[Product]]:
-        self.basket = self.request.session.get('basket')
+    serializer_class = ProductShortSerializer
 
-        if self.basket:
-            queryset = list()
-            for position in self.basket:
-                product = Product.objects.get(id=position['id'])
-                # проверка наличия товара:
-                if product.count > 0:
-                    queryset.append(product)
-                    # невозможно добавить в корзину товаров больше,
-                    # чем имеется в наличии:
-                    if product.count < position['count']:
-                        position['count'] = product.count
-            return queryset
+    def get_basket(self) -> Basket:
+        if not hasattr(self, 'basket'):
+            self.basket_storage = get_basket_storage()
+            self.basket = self.basket_storage.load(self.request)
+        return self.basket
 
-        self.request.session['basket'] = list()
+    def get_queryset(self) -> List[Product]:
+        basket = self.get_basket()
+        if not basket:
+            return list()
+
+        # все товары корзины загружаются одним запросом
+        # (проверка наличия товара - count > 0):
+        products = {
+            product.id: product
+            for product in (
+                Product.objects
+                .with_short_info()
+                .filter(id__in=basket.product_ids(), count__gt=0)
+            )
+        }
+        return [
+            products[product_id]
+            for product_id in basket
+            if product_id in products
+        ]
 
     @extend_schema(
         description='Get items in basket',
     )
     def get(self, request: Request, *args, **kwargs) -> Response:
         response = super().get(request, *args, **kwargs)
+        basket = self.get_basket()
 
-        if self.basket:
-            basket_id = [position['id'] for position in self.basket]
-
-        # меняем количество товаров в соответствии с корзиной:
+        # меняем количество товаров в соответствии с корзиной
+        # (невозможно добавить в корзину товаров больше,
+        # чем имеется в наличии):
         for product in response.data:
-            product_id = product.get('id')
-
-            index = basket_id.index(product_id)
-            product_count = self.basket[index]['count']
-
-            product['count'] = product_count
+            product['count'] = min(
+                basket.get(product.get('id')),
+                product['count'],
+            )
 
         return Response(response.data, status=status.HTTP_200_OK)
 
+    def save_basket(self, response: Response) -> Response:
+        self.basket_storage.save(self.request, response, self.basket)
+        return response
+
     @extend_schema(
         description='Add item to basket',
         examples=[
@@ -549,21 +737,12 @@ class BasketView(ListAPIView):
         ],
     )
     def post(self, request: Request, *args, **kwargs) -> Response:
-        basket = self.request.session.get('basket')
-
-        product_id = request.data.get('id')
-        product_count = request.data.get('count')
-
-        basket_id = [position['id'] for position in basket]
-        if product_id in basket_id:
-            index = basket_id.index(product_id)
-            basket[index]['count'] += product_count
-        else:
-            basket.append(dict(id=product_id, count=product_count))
-
-        self.request.session['basket'] = basket
+        self.get_basket().add(
+            int(request.data.get('id')),
+            int(request.data.get('count')),
+        )
 
-        return self.get(request, *args, **kwargs)
+        return self.save_basket(self.get(request, *args, **kwargs))
 
     @extend_schema(
         description='Remove item from basket',
@@ -578,21 +757,12 @@ class BasketView(ListAPIView):
         ],
     )
     def delete(self, request: Request, *args, **kwargs) -> Response:
-        basket = self.request.session.get('basket')
-
-        product_id = request.data.get('id')
-        product_count = request.data.get('count')
-
-        basket_id = [position['id'] for position in basket]
-        index = basket_id.index(product_id)
-        basket[index]['count'] -= product_count
-
-        if basket[index]['count'] == 0:
-            basket.pop(index)
-
-        self.request.session['basket'] = basket
+        self.get_basket().remove(
+            int(request.data.get('id')),
+            int(request.data.get('count')),
+        )
 
-        return self.get(request, *args, **kwargs)
+        return self.save_basket(self.get(request, *args, **kwargs))
 
 
 # ПРЕДСТАВЛЕНИЯ ДЛЯ РАБОТЫ С ЗАКАЗАМИ:
@@ -610,74 +780,94 @@ class OrdersView(ListCreateAPIView):
 
     def get_queryset(self) -> QuerySet:
         user = self.request.user
-        return Order.objects.filter(user=user)
+        return Order.objects.with_products().filter(user=user)
 
     @extend_schema(description='Get active order')
     def get(self, request: Request, *args, ** kwargs) -> Response:
-        response = super().get(request, *args, ** kwargs)
-
-        # Товары заказа хранятся в таблице OrderProduct
-        # в формате "товар-количество", но каждом заказе необходимо
-        # выводить информацию о товаре в соответствии с
-        # сериализатором ProductShortSerializer.
-        # Поэтому в сериализаторе каждого товара заменим параметры:
-        # count - на количество товара в заказе
-        # price - на общую стоимость товаров в заказе:
-        for order in response.data:
-            for product in order.get('products'):
-                product_id = product.get('product')
-                product_count = product.get('count')
-
-                product_obj = Product.objects.get(id=product_id)
-                serializer = ProductShortSerializer(product_obj).data
-
-                serializer['id'] = product_id
-                serializer['count'] = product_count
-                product.update(serializer)
-
-        return Response(response.data, status=status.HTTP_200_OK)
+        # товары заказов загружаются предварительно (with_products)
+        # и выводятся сериализатором OrderProductSerializer:
+        return super().get(request, *args, ** kwargs)
 
     @extend_schema(description='Create order')
     def post(self, request: Request) -> Response:
+        # количество каждого товара в заказе
+        # (один товар может встретиться в запросе несколько раз):
+        products_count = dict()
+        try:
+            for product in request.data:
+                product_id = int(product.get('id'))
+                product_count = int(product.get('count'))
+                if product_count <= 0:
+                    raise ValidationError(
+                        f'Invalid count of product #{product_id}.'
+                    )
+                products_count[product_id] = (
+                    products_count.get(product_id, 0) + product_count
+                )
+
+            # все товары заказа проверяются одним запросом:
+            products = (
+                Product.objects
+                .with_sale_price()
+                .in_bulk(list(products_count))
+            )
+            missing = set(products_count) - set(products)
+            if not products_count or missing:
+                raise ValidationError(
+                    f'Products not found: {sorted(missing)}.'
+                )
+        except (TypeError, ValueError, AttributeError, ValidationError) as error:
+            return Response(
+                {"unsuccessful operation": str(error)},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        # стоимость заказа считается по ценам из БД (с учетом распродаж),
+        # а не по ценам, переданным клиентом:
         totalCost = sum(
-            [
-                product.get('price') * product.get('count')
-                for product in request.data
-            ]
+            products[product_id].effective_price * product_count
+            for product_id, product_count in products_count.items()
         )
 
         user = request.user
 
-        # если пользователь не авторизован, создается заказ
-        # без привязки к пользователю:
-        if not user.is_authenticated:
-            order = Order.objects.create(
-                totalCost=totalCost,
-            )
-        else:
-            profile = Profile.objects.get(id=user)
-            fullName = profile.fullName
-            email = profile.email
-            phone = profile.phone
-
-            order = Order.objects.create(
-                user=user,
-                fullName=fullName,
-                email=email,
-                phone=phone,
-                totalCost=totalCost,
-            )
-
-        for product in request.data:
-            product_id = product.get('id')
-            product_count = product.get('count')
-
-            order_product = OrderProduct.objects.create(
-                product=Product.objects.get(id=product_id),
-                count=product_count,
-            )
-
-            order.products.add(order_product)
+        with transaction.atomic():
+            # если пользователь не авторизован, создается заказ
+            # без привязки к пользователю:
+            if not user.is_authenticated:
+                order = Order.objects.create(
+                    totalCost=totalCost,
+                )
+            else:
+                profile = Profile.objects.get(id=user)
+                fullName = profile.fullName
+                email = profile.email
+                phone = profile.phone
+
+                order = Order.objects.create(
+                    user=user,
+                    fullName=fullName,
+                    email=email,
+                    phone=phone,
+                    totalCost=totalCost,
+                )
+
+            order_products = [
+                OrderProduct(product_id=product_id, count=product_count)
+                for product_id, product_count in products_count.items()
+            ]
+            if connection.features.can_return_rows_from_bulk_insert:
+                OrderProduct.objects.bulk_create(order_products)
+            else:
+                # СУБД не возвращает id добавленных строк:
+                for order_product in order_products:
+                    order_product.save()
+            Order.products.through.objects.bulk_create([
+                Order.products.through(
+                    order_id=order.id,
+                    orderproduct_id=order_product.id,
+                )
+                for order_product in order_products
+            ])
 
         # если пользователь не авторизован, при оформлении
         # заказа он будет перекинут либо на страницу с
@@ -708,31 +898,11 @@ class OrderView(RetrieveAPIView):
 
     def get_object(self):
         order_id = self.kwargs.get('id')
-        return Order.objects.get(id=order_id)
+        return Order.objects.with_products().get(id=order_id)
 
     @extend_schema(description="Get order")
     def get(self, request: Request, id: int) -> Response:
-        response = super().get(request, id)
-
-        # Товары заказа хранятся в таблице OrderProduct
-        # в формате "товар-количество", но необходимо выводить
-        # информацию о товаре в соответствии с
-        # сериализатором ProductShortSerializer.
-        # Поэтому в сериализаторе каждого товара заменим параметры:
-        # count - на количество товара в заказе
-        # price - на общую стоимость товаров в заказе:
-        for product in response.data.get('products'):
-            product_id = product.get('product')
-            product_count = product.get('count')
-
-            product_obj = Product.objects.get(id=product_id)
-            serializer = ProductShortSerializer(product_obj).data
-
-            serializer['id'] = product_id
-            serializer['count'] = product_count
-            product.update(serializer)
-
-        return Response(response.data, status=status.HTTP_200_OK)
+        return super().get(request, id)
 
     @extend_schema(description="Confirm order")
     def post(self, request: Request, id: int) -> Response:
@@ -764,23 +934,29 @@ class OrderView(RetrieveAPIView):
 
         order.deliveryType = new_deliveryType
 
-        if order.status == 'created':
-            order.status = 'accepted'
-
-            # при подтверждении заказа меняем количество товара
-            # в наличии в БД:
-            products_in_order = request.data.get('products')
-            products_id = [product['id'] for product in products_in_order]
-            for order_product in order.products.all():
-                product_id = order_product.product.id
-                index = products_id.index(product_id)
-                product_count = products_in_order[index]['count']
-
-                product_obj = Product.objects.get(id=product_id)
-                product_obj.count = product_count
-                product_obj.save()
-
-        order.save()
+        with transaction.atomic():
+            if order.status == 'created':
+                # при подтверждении заказа товары списываются со склада
+                # по количеству из заказа:
+                try:
+                    reserve_order_stock(order)
+                except InsufficientStock as error:
+                    return Response(
+                        {"unsuccessful operation": str(error)},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+            # статус сохраняется только в reserve_order_stock,
+            # чтобы не перезаписать результат одновременного подтверждения:
+            order.save(update_fields=[
+                'fullName',
+                'phone',
+                'email',
+                'paymentType',
+                'city',
+                'address',
+                'deliveryType',
+                'totalCost',
+            ])
 
         return Response({'orderId': id}, status=status.HTTP_200_OK)
 
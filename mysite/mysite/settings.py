@@ -98,6 +98,50 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# файловый кэш общий для всех процессов сервера,
+# поэтому сброс кэша сигналами действует сразу во всех процессах:
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': getenv('DJANGO_CACHE_DIR', BASE_DIR / 'cache'),
+        # при достижении MAX_ENTRIES файловый кэш удаляет случайные записи
+        # (1/CULL_FREQUENCY от всех), в том числе счетчики версий:
+        # предел выбирается с запасом, устаревшие записи удаляются
+        # по истечении времени хранения
+        'OPTIONS': {
+            'MAX_ENTRIES': int(getenv('DJANGO_CACHE_MAX_ENTRIES', 1_000_000)),
+            'CULL_FREQUENCY': int(getenv('DJANGO_CACHE_CULL_FREQUENCY', 10)),
+        },
+    }
+}
+
+
+# тесты выполняются с кэшем в памяти (mysite.test_runner.TEST_CACHES):
+TEST_RUNNER = 'mysite.test_runner.TestRunner'
+
+
+# хранилище корзины: myshop.basket.SignedCookieBasketStorage (корзина
+# в cookie, без записи сессии), myshop.basket.SessionBasketStorage
+# или myshop.basket.CacheBasketStorage (для него нужен кэш
+# BASKET_CACHE_ALIAS без вытеснения записей, например Redis
+# без политики вытеснения); корзины из сессии переносятся
+# в cookie и кэш при первом изменении
+BASKET_STORAGE = getenv(
+    'BASKET_STORAGE',
+    'myshop.basket.SignedCookieBasketStorage',
+)
+BASKET_CACHE_ALIAS = getenv('BASKET_CACHE_ALIAS', 'default')
+
+
+# время (в секундах), в течение которого данные главной страницы
+# (баннеры, популярные товары, товары ограниченного тиража)
+# берутся из кэша без пересчета:
+SHOWCASE_CACHE_TIMEOUT = int(getenv('SHOWCASE_CACHE_TIMEOUT', 10 * 60))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
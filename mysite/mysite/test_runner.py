@@ -0,0 +1,23 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+# кэш в памяти процесса: тесты не изменяют файловый кэш
+# разработчика и не зависят от его содержимого
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+class TestRunner(DiscoverRunner):
+    """Запуск тестов с кэшем в памяти (TEST_CACHES) вместо CACHES."""
+
+    def setup_test_environment(self, **kwargs) -> None:
+        super().setup_test_environment(**kwargs)
+        self.cache_settings = override_settings(CACHES=TEST_CACHES)
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs) -> None:
+        self.cache_settings.disable()
+        super().teardown_test_environment(**kwargs)